@@ -5,7 +5,7 @@ from __future__ import annotations
 ALGO_VERSION = 2
 
 try:
-    from .essentia_backend import check_env, analyze  # noqa: F401
+    from .essentia_backend import check_env, analyze, analyze_many  # noqa: F401
 except Exception:  # pragma: no cover
     # Keep package importable even if backend has missing deps at import time
     def check_env() -> dict:
@@ -14,8 +14,12 @@ except Exception:  # pragma: no cover
     def analyze(*_, **__):
         raise RuntimeError("Audio backend unavailable. Install Essentia or use --check-env.")
 
+    def analyze_many(*_, **__):
+        raise RuntimeError("Audio backend unavailable. Install Essentia or use --check-env.")
+
 __all__ = [
     "ALGO_VERSION",
     "check_env",
     "analyze",
+    "analyze_many",
 ]
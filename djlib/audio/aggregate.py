@@ -0,0 +1,91 @@
+"""Agregacja statystyk ramkowych (MFCC, HPCP, serie widmowe) w jednym przebiegu.
+
+Macierz ramek (``n_frames × n_coeffs``) jest rzutowana na float64 raz; średnia,
+odchylenie oraz skośność/kurtoza kolumn liczone są wektorowo (``axis=0``) z tych
+samych odchyleń od średniej – bez pętli po kolumnach. Momenty jak w
+``scipy.stats.skew``/``kurtosis`` z domyślnymi ``bias=True`` i ``fisher=True``,
+więc wyniki zgadzają się z dotychczasowymi (a scipy nie jest potrzebne).
+
+Serie skalarne (centroid, rolloff, flux, …) mają różne długości, więc są
+sklejane w jeden wektor i redukowane przez ``np.add.reduceat`` po segmentach.
+Wyniki trafiają do prealokowanego wektora, który na końcu zamieniany jest na
+słownik ``nazwa → float``. Benchmark: ``scripts/bench_frame_aggregation.py``.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Mapping
+
+import numpy as np
+
+MFCC_COEFFS = 13
+CHROMA_BINS = 12
+
+
+def _as_frames(frames: Any) -> np.ndarray:
+    return np.asarray(frames, dtype=np.float64)
+
+
+def matrix_names(prefix: str, n: int, skew: bool = True) -> List[str]:
+    """Nazwy cech z ``aggregate_matrix`` w kolejności wektora wyników."""
+    names = [f"{prefix}_{i}" for i in range(n)] + [f"{prefix}_std_{i}" for i in range(n)]
+    names.append(f"{prefix}_kurtosis_mean")
+    if skew:
+        names.append(f"{prefix}_skew_mean")
+    return names
+
+
+def aggregate_matrix(prefix: str, frames: Any, n: int, skew: bool = True) -> Dict[str, float]:
+    """Średnia/std pierwszych ``n`` kolumn oraz średnia kurtozy (i skośności) kolumn.
+
+    Momenty są pomijane, gdy ramek jest mniej niż dwie. Macierz z mniej niż ``n``
+    kolumnami daje pusty wynik.
+    """
+    m = _as_frames(frames)
+    if m.ndim != 2 or m.shape[0] == 0 or m.shape[1] < n:
+        return {}
+    m = m[:, :n]
+    names = matrix_names(prefix, n, skew)
+    out = np.empty(len(names), dtype=np.float64)
+    mean = m.mean(axis=0)
+    centered = m - mean
+    sq = centered * centered
+    m2 = sq.mean(axis=0)
+    out[:n] = mean
+    out[n:2 * n] = np.sqrt(m2)
+    if m.shape[0] < 2:
+        return dict(zip(names[:2 * n], out[:2 * n].tolist()))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        m4 = (sq * sq).mean(axis=0)
+        out[2 * n] = np.mean(m4 / (m2 * m2) - 3.0)
+        if skew:
+            m3 = (sq * centered).mean(axis=0)
+            out[2 * n + 1] = np.mean(m3 / m2 ** 1.5)
+    return dict(zip(names, out.tolist()))
+
+
+def aggregate_series(series: Mapping[str, Any]) -> Dict[str, float]:
+    """``{nazwa}_mean``/``{nazwa}_std`` każdej serii (wielowymiarowe są spłaszczane).
+
+    Puste serie są pomijane; wszystkie pozostałe liczone są jednym ``reduceat``.
+    """
+    names: List[str] = []
+    parts: List[np.ndarray] = []
+    for name, values in series.items():
+        arr = _as_frames(values).ravel()
+        if arr.size:
+            names.append(name)
+            parts.append(arr)
+    if not parts:
+        return {}
+    counts = np.fromiter((p.size for p in parts), dtype=np.int64, count=len(parts))
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    flat = np.concatenate(parts)
+    mean = np.add.reduceat(flat, starts) / counts
+    dev = flat - np.repeat(mean, counts)
+    std = np.sqrt(np.add.reduceat(dev * dev, starts) / counts)
+    out = np.empty(2 * len(names), dtype=np.float64)
+    out[0::2] = mean
+    out[1::2] = std
+    keys = [f"{name}_{stat}" for name in names for stat in ("mean", "std")]
+    return dict(zip(keys, out.tolist()))
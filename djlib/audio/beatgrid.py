@@ -0,0 +1,146 @@
+"""Beatgrid: pozycje beatów, downbeaty i krzywa tempa zapisane obok analizy.
+
+Analiza rytmu i tak wyznacza pozycje beatów, ale do cache trafiał tylko skalar
+``bpm``. Teraz ``build_grid`` robi z nich:
+
+- ``beats`` – pozycje beatów w jednostkach ``1 / RESOLUTION`` s,
+- ``downbeats`` – indeksy beatów będących pierwszą miarą taktu (4/4; faza
+  wybierana wg głośności beatów, bez niej – od pierwszego beatu),
+- ``tempo`` – lokalne tempo (mediana ``TEMPO_WINDOW`` odstępów) próbkowane co
+  ``TEMPO_HOP`` s, w setnych BPM,
+
+a ``pack``/``unpack`` koduje je jako delty int32 skompresowane zlib (siatka
+z równymi odstępami to kilkadziesiąt bajtów). Wiersze leżą w tabeli
+``beatgrids`` cache (``CacheStore.beatgrid``/``get_beatgrid``) i da się je
+odczytać bez dekodowania audio.
+
+``tempo_drift`` – rozrzut lokalnego tempa (percentyl 90 − 10, w % mediany) –
+odróżnia nagrania na żywo / ze zmiennym tempem (``VARIABLE_TEMPO_DRIFT``) od
+kwantyzowanych produkcji.
+"""
+
+from __future__ import annotations
+
+import zlib
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+RESOLUTION = 10000  # jednostki na sekundę (0.1 ms)
+TEMPO_HOP = 1.0
+TEMPO_WINDOW = 8
+BEATS_PER_BAR = 4
+VARIABLE_TEMPO_DRIFT = 2.0  # % – powyżej: nagranie live / zmienne tempo
+
+
+def pack(values: Sequence[int]) -> bytes:
+    """Rosnące liczby całkowite → delty int32 (little endian) skompresowane zlib."""
+    arr = np.asarray(values, dtype=np.int64)
+    deltas = np.diff(arr, prepend=0).astype("<i4")
+    return zlib.compress(deltas.tobytes(), 9)
+
+
+def unpack(blob: Optional[bytes]) -> np.ndarray:
+    if not blob:
+        return np.zeros(0, dtype=np.int64)
+    return np.cumsum(np.frombuffer(zlib.decompress(blob), dtype="<i4").astype(np.int64))
+
+
+def local_tempo(beats: np.ndarray) -> np.ndarray:
+    """Tempo (BPM) przy każdym beacie z mediany ``TEMPO_WINDOW`` sąsiednich odstępów."""
+    ibi = np.diff(np.asarray(beats, dtype=np.float64))
+    ibi = ibi[ibi > 0]
+    if ibi.size == 0:
+        return np.zeros(0)
+    w = min(TEMPO_WINDOW, ibi.size)
+    padded = np.pad(ibi, (w // 2, w - 1 - w // 2), mode="edge")
+    med = np.median(np.lib.stride_tricks.sliding_window_view(padded, w), axis=1)
+    return 60.0 / med
+
+
+def tempo_drift(bpms: np.ndarray) -> Optional[float]:
+    """Rozrzut lokalnego tempa (p90 − p10) w % mediany; ``None`` przy zbyt krótkiej siatce."""
+    bpms = np.asarray(bpms, dtype=np.float64)
+    bpms = bpms[bpms > 0]
+    if bpms.size < TEMPO_WINDOW:
+        return None
+    p10, p50, p90 = np.percentile(bpms, [10, 50, 90])
+    return float((p90 - p10) / p50 * 100.0)
+
+
+def downbeat_phase(n_beats: int, strength: Optional[Sequence[float]] = None) -> int:
+    """Faza (0..3) pierwszego downbeatu: ta z największą średnią głośnością beatów (NaN pomijane)."""
+    if strength is None or len(strength) != n_beats or n_beats < BEATS_PER_BAR:
+        return 0
+    s = np.asarray(strength, dtype=np.float64)
+    means = np.full(BEATS_PER_BAR, -np.inf)
+    for p in range(BEATS_PER_BAR):
+        known = s[p::BEATS_PER_BAR]
+        known = known[np.isfinite(known)]
+        if known.size:
+            means[p] = known.mean()
+    return int(np.argmax(means)) if np.isfinite(means).any() else 0
+
+
+def beat_strength(es: Any, audio: np.ndarray, beats_s: Sequence[float], sr: int) -> Optional[List[float]]:
+    """Głośność każdego beatu (``BeatsLoudness``) – do wyboru fazy downbeatów; ``None`` gdy się nie da."""
+    if len(beats_s) < BEATS_PER_BAR:
+        return None
+    try:
+        loudness = es.BeatsLoudness(sampleRate=sr, beats=[float(b) for b in beats_s])(audio)[0]
+    except Exception:
+        return None
+    return [float(x) for x in loudness]
+
+
+def build_grid(beats_s: Sequence[float], strength: Optional[Sequence[float]] = None) -> Optional[Dict[str, Any]]:
+    """Siatka z pozycji beatów (s): ``beats``, ``downbeats``, ``tempo`` (tablice int), ``tempo_drift``."""
+    beats = np.unique(np.asarray(beats_s, dtype=np.float64))
+    beats = beats[beats >= 0]
+    if beats.size < 2:
+        return None
+    if strength is not None and len(strength) != beats.size:
+        strength = None
+    bpm_at = local_tempo(beats)  # jedna wartość na odstęp → przypisana do środka odstępu
+    mids = (beats[:-1] + beats[1:]) / 2
+    mids = mids[: bpm_at.size]
+    times = np.arange(0.0, beats[-1] + TEMPO_HOP / 2, TEMPO_HOP)
+    curve = np.interp(times, mids, bpm_at) if bpm_at.size else np.zeros(0)
+    phase = downbeat_phase(beats.size, strength)
+    return {
+        "beats": np.round(beats * RESOLUTION).astype(np.int64),
+        "downbeats": np.arange(phase, beats.size, BEATS_PER_BAR, dtype=np.int64),
+        "tempo": np.round(curve * 100).astype(np.int64),
+        "tempo_drift": tempo_drift(bpm_at),
+    }
+
+
+def encode(grid: Dict[str, Any]) -> Dict[str, Any]:
+    """Siatka → wiersz tabeli ``beatgrids`` (bloby + metadane)."""
+    return {
+        "resolution": RESOLUTION,
+        "tempo_hop": TEMPO_HOP,
+        "beats": pack(grid["beats"]),
+        "downbeats": pack(grid["downbeats"]),
+        "tempo": pack(grid["tempo"]),
+    }
+
+
+def decode(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Wiersz ``beatgrids`` → ``beats``/``downbeats`` (s), ``tempo`` (BPM), ``bpm`` (mediana), ``tempo_drift``, ``variable_tempo``."""
+    res = float(row.get("resolution") or RESOLUTION)
+    beats = unpack(row.get("beats")) / res
+    idx = unpack(row.get("downbeats"))
+    idx = idx[(idx >= 0) & (idx < beats.size)]
+    tempo = unpack(row.get("tempo")) / 100.0
+    drift = tempo_drift(local_tempo(beats))
+    return {
+        "beats": beats,
+        "downbeats": beats[idx],
+        "tempo": tempo,
+        "bpm": float(np.median(tempo)) if tempo.size else None,
+        "tempo_hop": float(row.get("tempo_hop") or TEMPO_HOP),
+        "tempo_drift": drift,
+        "variable_tempo": drift is not None and drift > VARIABLE_TEMPO_DRIFT,
+        "updated_at": row.get("updated_at"),
+    }
@@ -1,10 +1,15 @@
 from __future__ import annotations
 
+import atexit
 import json
+import os
+import re
 import sqlite3
-from datetime import datetime
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
 try:
     import numpy as _np  # type: ignore
@@ -13,9 +18,12 @@ except Exception:  # pragma: no cover - optional dependency
 
 
 _EXTRA_FEATURES_KEY = "features_ext"
+# Klucz payloadu z zakodowaną siatką beatów (``beatgrid.encode``) – zapisywany do tabeli beatgrids
+BEATGRID_KEY = "beatgrid"
+_BEATGRID_COLUMNS = ("resolution", "beats", "downbeats", "tempo", "tempo_hop", "updated_at")
 
 from djlib.config import LOGS_DIR
-from djlib.fingerprint import file_sha256
+from djlib.hashing import audio_ids
 
 
 def db_path() -> Path:
@@ -23,156 +31,735 @@ def db_path() -> Path:
     return LOGS_DIR / "audio_analysis.sqlite"
 
 
-def init_db() -> None:
-    p = db_path()
-    conn = sqlite3.connect(p)
-    try:
-        cur = conn.cursor()
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS audio_analysis (
-                audio_id TEXT PRIMARY KEY,
-                algo_version INTEGER,
-                config_hash TEXT,
-                bpm REAL,
-                bpm_conf REAL,
-                bpm_corr REAL,
-                key_camelot TEXT,
-                key_strength REAL,
-                lufs REAL,
-                dyn_complex REAL,
-                onset_rate REAL,
-                spec_centroid REAL,
-                spec_rolloff REAL,
-                energy REAL,
-                energy_var REAL,
-                analyzed_at TEXT,
-                source TEXT,
-                extras TEXT
-            )
-            """
+_COLUMNS = [
+    "algo_version", "config_hash",
+    "bpm", "bpm_conf", "bpm_corr",
+    "key_camelot", "key_strength",
+    "lufs", "dyn_complex", "onset_rate", "spec_centroid", "spec_rolloff",
+    "energy", "energy_var",
+    "analyzed_at", "source", "extras",
+]
+
+_UPSERT_SQL = (
+    "INSERT INTO audio_analysis (audio_id, " + ", ".join(_COLUMNS) + ") VALUES ("
+    + ", ".join("?" * (len(_COLUMNS) + 1)) + ") ON CONFLICT(audio_id) DO UPDATE SET "
+    + ", ".join(f"{c}=excluded.{c}" for c in _COLUMNS)
+)
+
+# Limit parametrów w jednym zapytaniu IN (...) – bezpiecznie poniżej SQLITE_MAX_VARIABLE_NUMBER.
+_IN_CHUNK = 500
+
+# Liczniki odczytów trafiają do cache_stats co tyle zapytań (i przy zamknięciu procesu).
+_STATS_FLUSH_EVERY = 1000
+
+# PRAGMA user_version: 1 = cechy w extras.features_ext (JSON), 2 = tabela audio_features
+SCHEMA_VERSION = 2
+
+# Cechy liczbowe trafiają do kolumn REAL tabeli audio_features (dodawanych w miarę
+# potrzeby); nazwa (po ``.lower()``) musi być bezpiecznym identyfikatorem SQL.
+_FEATURE_NAME_RE = re.compile(r"^[a-z_][a-z0-9_]{0,62}$")
+
+
+def _create_schema(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS audio_analysis (
+            audio_id TEXT PRIMARY KEY,
+            algo_version INTEGER,
+            config_hash TEXT,
+            bpm REAL,
+            bpm_conf REAL,
+            bpm_corr REAL,
+            key_camelot TEXT,
+            key_strength REAL,
+            lufs REAL,
+            dyn_complex REAL,
+            onset_rate REAL,
+            spec_centroid REAL,
+            spec_rolloff REAL,
+            energy REAL,
+            energy_var REAL,
+            analyzed_at TEXT,
+            source TEXT,
+            extras TEXT
+        )
+        """
+    )
+    # file_hash (SHA-256 całego pliku, jak w CSV/XLSX) → audio_id (hash payloadu audio)
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS audio_alias (
+            file_hash TEXT PRIMARY KEY,
+            audio_id TEXT NOT NULL
+        )
+        """
+    )
+    conn.execute("CREATE TABLE IF NOT EXISTS audio_features (audio_id TEXT PRIMARY KEY)")
+    # dzienne liczniki odczytów cache (hit rate dla `cache gc`)
+    conn.execute("CREATE TABLE IF NOT EXISTS cache_stats (day TEXT PRIMARY KEY, lookups INTEGER NOT NULL, hits INTEGER NOT NULL)")
+    # dziennik zmian audio_features – przyrostowe odświeżanie snapshotu .npy (djlib.audio.snapshot)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS feature_changes (seq INTEGER PRIMARY KEY AUTOINCREMENT, audio_id TEXT NOT NULL)"
+    )
+    # siatka beatów (djlib.audio.beatgrid): delty int32 + zlib, osobno od cech skalarnych
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS beatgrids (
+            audio_id TEXT PRIMARY KEY,
+            resolution INTEGER NOT NULL,
+            beats BLOB,
+            downbeats BLOB,
+            tempo BLOB,
+            tempo_hop REAL,
+            updated_at TEXT
+        )
+        """
+    )
+    for event, ids in (("INSERT", ("NEW",)), ("DELETE", ("OLD",)), ("UPDATE", ("OLD", "NEW"))):
+        body = " ".join(f"INSERT INTO feature_changes (audio_id) VALUES ({r}.audio_id);" for r in ids)
+        conn.execute(
+            f"CREATE TRIGGER IF NOT EXISTS audio_features_{event.lower()} AFTER {event} ON audio_features "
+            f"BEGIN {body} END"
+        )
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version < 2:
+        _migrate_features_v2(conn)
+    conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+    conn.commit()
+
+
+def _is_feature(name: str, value: Any) -> bool:
+    return (
+        bool(_FEATURE_NAME_RE.match(name))
+        and name not in _COLUMNS
+        and name != "audio_id"
+        and isinstance(value, (int, float))
+        and not isinstance(value, bool)
+    )
+
+
+def _split_features(extras: Dict[str, Any]) -> Dict[str, float]:
+    """Wyjmij liczbowe cechy z ``extras[features_ext]`` (modyfikuje ``extras``)."""
+    bucket = extras.get(_EXTRA_FEATURES_KEY)
+    if not isinstance(bucket, dict):
+        return {}
+    feats: Dict[str, float] = {}
+    rest: Dict[str, Any] = {}
+    for k, v in bucket.items():
+        # kolumny SQLite nie rozróżniają wielkości liter – nazwy cech są normalizowane do małych
+        if _is_feature(k.lower(), v):
+            feats[k.lower()] = float(v)
+        else:
+            rest[k] = v
+    if rest:
+        extras[_EXTRA_FEATURES_KEY] = rest
+    else:
+        extras.pop(_EXTRA_FEATURES_KEY, None)
+    return feats
+
+
+def _feature_columns(conn: sqlite3.Connection) -> List[str]:
+    return [c[1] for c in conn.execute("PRAGMA table_info(audio_features)").fetchall() if c[1] != "audio_id"]
+
+
+def _ensure_feature_columns(conn: sqlite3.Connection, names: Iterable[str]) -> None:
+    have = set(_feature_columns(conn))
+    for name in names:
+        if name not in have:
+            conn.execute(f'ALTER TABLE audio_features ADD COLUMN "{name}" REAL')
+            have.add(name)
+
+
+def _write_features(conn: sqlite3.Connection, rows: Sequence[Tuple[str, Dict[str, float]]]) -> None:
+    """Zastąp cechy podanych audio_id (wiersze bez cech są usuwane)."""
+    _ensure_feature_columns(conn, dict.fromkeys(k for _, feats in rows for k in feats))
+    conn.executemany("DELETE FROM audio_features WHERE audio_id=?", [(aid,) for aid, _ in rows])
+    groups: Dict[Tuple[str, ...], List[List[Any]]] = {}
+    for aid, feats in rows:
+        if feats:
+            names = tuple(feats)
+            groups.setdefault(names, []).append([aid] + [feats[n] for n in names])
+    for names, params in groups.items():
+        cols = ", ".join(f'"{n}"' for n in names)
+        conn.executemany(
+            f"INSERT INTO audio_features (audio_id, {cols}) VALUES ({', '.join('?' * (len(names) + 1))})",
+            params,
         )
-        conn.commit()
-    finally:
-        conn.close()
+
+
+def _migrate_features_v2(conn: sqlite3.Connection) -> None:
+    """Przenieś liczbowe cechy z JSON-a ``extras.features_ext`` do ``audio_features``."""
+    moved: List[Tuple[str, Dict[str, float]]] = []
+    rewritten: List[Tuple[Optional[str], str]] = []
+    for audio_id, extras in conn.execute(
+        "SELECT audio_id, extras FROM audio_analysis WHERE extras LIKE ?", (f'%"{_EXTRA_FEATURES_KEY}"%',)
+    ).fetchall():
+        try:
+            extras_dict = json.loads(extras)
+        except Exception:
+            continue
+        if not isinstance(extras_dict, dict):
+            continue
+        feats = _split_features(extras_dict)
+        if feats:
+            moved.append((audio_id, feats))
+            rewritten.append((json.dumps(extras_dict) if extras_dict else None, audio_id))
+    if moved:
+        _write_features(conn, moved)
+        conn.executemany("UPDATE audio_analysis SET extras=? WHERE audio_id=?", rewritten)
+
+
+def _decode_row(cols: List[str], row: Sequence[Any], feature_cols: Sequence[str] = ()) -> Dict[str, Any]:
+    data = dict(zip(cols, row))
+    for name, value in zip(feature_cols, row[len(cols):]):
+        if value is not None:
+            data.setdefault(name, value)
+    # decode extras JSON if present
+    extras = data.get("extras")
+    if extras:
+        try:
+            extras_dict = json.loads(extras)  # type: ignore
+        except Exception:
+            extras_dict = extras
+        if isinstance(extras_dict, dict):
+            data["extras"] = extras_dict
+            features_ext = extras_dict.get(_EXTRA_FEATURES_KEY)
+            if isinstance(features_ext, dict):
+                for k, v in features_ext.items():
+                    data.setdefault(k, v)
+    return data
+
+
+def _encode_payload(payload: Dict[str, Any]) -> Tuple[List[Any], Dict[str, float]]:
+    """Payload analizy → (wartości kolumn ``_COLUMNS``, cechy do ``audio_features``).
+
+    Nadmiarowe metryki liczbowe idą do tabeli cech, pozostałe do extras.
+    """
+    payload = dict(payload)
+    # ensure analyzed_at
+    payload.setdefault("analyzed_at", datetime.utcnow().isoformat())
+
+    extras_obj = payload.get("extras")
+    extras_dict: Dict[str, Any] = {}
+    if isinstance(extras_obj, dict):
+        extras_dict = dict(extras_obj)
+    elif extras_obj is not None and not isinstance(extras_obj, str):
+        # Preserve non-dict payload for debugging
+        extras_dict["legacy_extras"] = extras_obj
+
+    extra_metrics = {
+        k: _to_jsonable(payload.get(k))
+        for k in payload.keys()
+        if k not in _COLUMNS and k not in {"extras", "audio_id"}
+    }
+    if extra_metrics:
+        feat_bucket = extras_dict.get(_EXTRA_FEATURES_KEY)
+        if not isinstance(feat_bucket, dict):
+            feat_bucket = {}
+        for k, v in extra_metrics.items():
+            if v is not None:
+                feat_bucket[k] = v
+        extras_dict[_EXTRA_FEATURES_KEY] = feat_bucket
+    features = _split_features(extras_dict)
+
+    extras_json: str | None = None
+    if extras_dict:
+        try:
+            extras_json = json.dumps(extras_dict)
+        except Exception:
+            extras_json = json.dumps({"error": "failed to encode extras"})
+    payload["extras"] = extras_json
+    return [payload.get(c) for c in _COLUMNS], features
+
+
+class CacheStore:
+    """Cache analizy audio na jednym, długo żyjącym połączeniu (WAL) na proces.
+
+    Schemat tworzony jest raz przy otwarciu, lista kolumn jest zapamiętana, a
+    ``get_many``/``upsert_many`` działają w pojedynczej transakcji. Instancję
+    współdzieloną w procesie zwraca ``get_store()``.
+
+    Cechy liczbowe leżą w kolumnach REAL tabeli ``audio_features`` (1 wiersz na
+    audio_id) i są dołączane LEFT JOIN-em; listę tych kolumn odświeżamy, gdy
+    zmieni się ``PRAGMA schema_version`` (kolumny mógł dodać inny proces).
+    """
+
+    def __init__(self, path: Path | None = None) -> None:
+        self.path = Path(path) if path else db_path()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        _create_schema(self._conn)
+        self._cols = [c[1] for c in self._conn.execute("PRAGMA table_info(audio_analysis)").fetchall()]
+        self._schema_version = -1
+        self._feature_cols: List[str] = []
+        self._lookups = 0
+        self._hits = 0
+
+    def close(self) -> None:
+        with self._lock:
+            self.flush_stats()
+            self._conn.close()
+
+    def flush_stats(self) -> None:
+        """Zapisz zebrane w pamięci liczniki odczytów do ``cache_stats``."""
+        with self._lock:
+            if not self._lookups:
+                return
+            lookups, hits = self._lookups, self._hits
+            self._lookups = self._hits = 0
+            try:
+                with self.transaction() as conn:
+                    conn.execute(
+                        "INSERT INTO cache_stats (day, lookups, hits) VALUES (?, ?, ?) ON CONFLICT(day) DO UPDATE "
+                        "SET lookups = lookups + excluded.lookups, hits = hits + excluded.hits",
+                        (datetime.utcnow().date().isoformat(), lookups, hits),
+                    )
+            except sqlite3.Error:
+                pass
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            try:
+                yield self._conn
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+
+    # --- odczyt ---
+
+    def feature_columns(self) -> List[str]:
+        """Nazwy kolumn cech w ``audio_features`` (w kolejności dodania)."""
+        with self._lock:
+            version = self._conn.execute("PRAGMA schema_version").fetchone()[0]
+            if version != self._schema_version:
+                self._feature_cols = _feature_columns(self._conn)
+                self._schema_version = version
+            return list(self._feature_cols)
+
+    def _select_sql(self) -> str:
+        feats = "".join(f', f."{n}"' for n in self.feature_columns())
+        return f"SELECT a.*{feats} FROM audio_analysis a LEFT JOIN audio_features f ON f.audio_id = a.audio_id"
+
+    def _select(self, ids: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+        out: Dict[str, Dict[str, Any]] = {}
+        sql = self._select_sql()
+        for i in range(0, len(ids), _IN_CHUNK):
+            chunk = ids[i:i + _IN_CHUNK]
+            q = ",".join("?" * len(chunk))
+            for row in self._conn.execute(f"{sql} WHERE a.audio_id IN ({q})", chunk):
+                data = _decode_row(self._cols, row, self._feature_cols)
+                out[data["audio_id"]] = data
+        return out
+
+    def _aliases(self, ids: Sequence[str]) -> Dict[str, str]:
+        out: Dict[str, str] = {}
+        for i in range(0, len(ids), _IN_CHUNK):
+            chunk = ids[i:i + _IN_CHUNK]
+            q = ",".join("?" * len(chunk))
+            out.update(self._conn.execute(
+                f"SELECT file_hash, audio_id FROM audio_alias WHERE file_hash IN ({q})", chunk
+            ).fetchall())
+        return out
+
+    def get_many(self, ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """``{id: analiza}`` dla znalezionych id; id może być też file_hash (alias)."""
+        wanted = list(dict.fromkeys(i for i in ids if i))
+        with self._lock:
+            found = self._select(wanted)
+            missing = [i for i in wanted if i not in found]
+            if missing:
+                # audio_id może być file_hash z CSV/XLSX – spróbuj aliasu
+                aliases = self._aliases(missing)
+                targets = self._select(list(set(aliases.values()) - set(found)))
+                targets.update({k: v for k, v in found.items()})
+                for src, dst in aliases.items():
+                    if dst in targets:
+                        found[src] = targets[dst]
+            self._lookups += len(wanted)
+            self._hits += len(found)
+            if self._lookups >= _STATS_FLUSH_EVERY:
+                self.flush_stats()
+        return found
+
+    def get(self, audio_id: str) -> Optional[Dict[str, Any]]:
+        return self.get_many([audio_id]).get(audio_id)
+
+    def beatgrid(self, audio_id: str) -> Optional[Dict[str, Any]]:
+        """Surowy wiersz ``beatgrids`` (bloby) dla audio_id albo file_hash (alias)."""
+        sql = f"SELECT {', '.join(_BEATGRID_COLUMNS)} FROM beatgrids WHERE audio_id=?"
+        with self._lock:
+            row = self._conn.execute(sql, (audio_id,)).fetchone()
+            if row is None:
+                target = self._aliases([audio_id]).get(audio_id)
+                if target is not None:
+                    row = self._conn.execute(sql, (target,)).fetchone()
+        return dict(zip(_BEATGRID_COLUMNS, row)) if row is not None else None
+
+    # --- eksport (bulk join) ---
+
+    def _load_ids(self, ids: Sequence[str], keep: Optional[Sequence[bool]]) -> None:
+        self._conn.execute("DROP TABLE IF EXISTS temp.bulk_ids")
+        self._conn.execute("CREATE TEMP TABLE bulk_ids (ord INTEGER PRIMARY KEY, aid TEXT, keep INTEGER)")
+        flags = keep if keep is not None else [True] * len(ids)
+        self._conn.executemany(
+            "INSERT INTO temp.bulk_ids (ord, aid, keep) VALUES (?, ?, ?)",
+            ((i, aid, int(bool(k))) for i, (aid, k) in enumerate(zip(ids, flags))),
+        )
+
+    # id z arkusza → audio_id w cache (bezpośrednio albo przez alias file_hash)
+    _RESOLVED_CTE = """
+        WITH r AS (
+            SELECT b.ord AS ord, b.keep AS keep,
+                   CASE WHEN EXISTS (SELECT 1 FROM audio_analysis x WHERE x.audio_id = b.aid) THEN b.aid
+                        ELSE (SELECT al.audio_id FROM audio_alias al WHERE al.file_hash = b.aid) END AS rid
+            FROM temp.bulk_ids b
+        )
+    """
+
+    def feature_keys(self, ids: Sequence[str], keep: Optional[Sequence[bool]] = None) -> List[str]:
+        """Kolumny wyniku ``iter_join`` dla wierszy z ``keep``: kolumny tabeli, kolumny
+        cech, potem pozostałe klucze ``features_ext`` w kolejności wystąpienia (json_each)."""
+        with self._lock:
+            self._load_ids(ids, keep)
+            try:
+                extra = [k for (k,) in self._conn.execute(
+                    self._RESOLVED_CTE + """
+                    SELECT key FROM (
+                        SELECT j.key AS key, ROW_NUMBER() OVER (ORDER BY r.ord, j.id) AS pos
+                        FROM r JOIN audio_analysis a ON a.audio_id = r.rid,
+                             json_each(a.extras, '$.""" + _EXTRA_FEATURES_KEY + """') j
+                        WHERE r.keep AND json_valid(a.extras)
+                    ) GROUP BY key ORDER BY MIN(pos)
+                    """
+                )]
+            finally:
+                self._conn.execute("DROP TABLE IF EXISTS temp.bulk_ids")
+        return list(dict.fromkeys(self._cols + self.feature_columns() + extra))
+
+    def iter_join(self, ids: Sequence[str]) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """Jedno zapytanie JOIN dla listy id; zwraca ``(indeks w ids, analiza)`` rosnąco.
+
+        Wiersze bez analizy są pomijane. Wyniki są strumieniowane z kursora.
+        """
+        with self._lock:
+            feats = self.feature_columns()
+            self._load_ids(ids, None)
+            try:
+                cur = self._conn.execute(
+                    self._RESOLVED_CTE
+                    + "SELECT r.ord, a.*" + "".join(f', f."{n}"' for n in feats)
+                    + " FROM r JOIN audio_analysis a ON a.audio_id = r.rid"
+                    + " LEFT JOIN audio_features f ON f.audio_id = a.audio_id ORDER BY r.ord"
+                )
+                for row in cur:
+                    yield row[0], _decode_row(self._cols, row[1:], feats)
+            finally:
+                self._conn.execute("DROP TABLE IF EXISTS temp.bulk_ids")
+
+    def feature_matrix(
+        self, ids: Optional[Sequence[str]] = None, features: Optional[Sequence[str]] = None
+    ) -> Tuple[List[str], List[str], Any]:
+        """``(audio_ids, nazwy cech, macierz float32 n_tracks × n_features)`` jednym zapytaniem.
+
+        Bez ``ids`` – wszystkie wiersze ``audio_features``; id może być też file_hash
+        (alias). Brakujące wartości to NaN, nieznane id są pomijane.
+        """
+        if _np is None:
+            raise RuntimeError("feature_matrix wymaga numpy")
+        with self._lock:
+            names = list(features) if features is not None else self.feature_columns()
+            known = set(self.feature_columns())
+            sel = ", ".join(f'f."{n}"' if n in known else "NULL" for n in names) or "NULL"
+            if ids is None:
+                rows = self._conn.execute(f"SELECT f.audio_id, {sel} FROM audio_features f ORDER BY f.rowid").fetchall()
+            else:
+                self._load_ids(ids, None)
+                try:
+                    rows = self._conn.execute(
+                        self._RESOLVED_CTE
+                        + f"SELECT b.aid, {sel} FROM r JOIN temp.bulk_ids b ON b.ord = r.ord"
+                        + " JOIN audio_features f ON f.audio_id = r.rid ORDER BY r.ord"
+                    ).fetchall()
+                finally:
+                    self._conn.execute("DROP TABLE IF EXISTS temp.bulk_ids")
+        matrix = _np.array([r[1:1 + len(names)] for r in rows], dtype=_np.float32).reshape(len(rows), len(names))
+        return [r[0] for r in rows], names, matrix
+
+    def feature_changes(self, since: int = 0) -> Tuple[int, List[str]]:
+        """``(ostatni seq, audio_id zmienione po since)`` z dziennika ``feature_changes``."""
+        with self._lock:
+            # sqlite_sequence (AUTOINCREMENT) pamięta ostatni seq także po prune_feature_changes
+            row = self._conn.execute("SELECT seq FROM sqlite_sequence WHERE name='feature_changes'").fetchone()
+            last = row[0] if row else 0
+            ids = [r[0] for r in self._conn.execute(
+                "SELECT DISTINCT audio_id FROM feature_changes WHERE seq > ? AND seq <= ?", (since, last)
+            )]
+        return int(last), ids
+
+    def prune_feature_changes(self, upto: int) -> None:
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM feature_changes WHERE seq <= ?", (upto,))
+
+    # --- zapis ---
+
+    def upsert_many(self, rows: Iterable[Tuple[str, Dict[str, Any]]]) -> int:
+        params: List[List[Any]] = []
+        features: List[Tuple[str, Dict[str, float]]] = []
+        grids: List[Tuple[Any, ...]] = []
+        for audio_id, payload in rows:
+            grid = payload.get(BEATGRID_KEY)
+            if grid is not None:
+                payload = {k: v for k, v in payload.items() if k != BEATGRID_KEY}
+                if isinstance(grid, dict):
+                    grids.append((audio_id,) + tuple(
+                        grid.get(c) if c != "updated_at" else datetime.utcnow().isoformat() for c in _BEATGRID_COLUMNS
+                    ))
+            values, feats = _encode_payload(payload)
+            params.append([audio_id] + values)
+            features.append((audio_id, feats))
+        if params:
+            with self.transaction() as conn:
+                conn.executemany(_UPSERT_SQL, params)
+                _write_features(conn, features)
+                if grids:
+                    conn.executemany(
+                        f"INSERT OR REPLACE INTO beatgrids (audio_id, {', '.join(_BEATGRID_COLUMNS)}) "
+                        f"VALUES ({', '.join('?' * (len(_BEATGRID_COLUMNS) + 1))})",
+                        grids,
+                    )
+        return len(params)
+
+    def upsert(self, audio_id: str, payload: Dict[str, Any]) -> None:
+        self.upsert_many([(audio_id, payload)])
+
+    def record_aliases(self, pairs: Iterable[Tuple[str, str]]) -> None:
+        rows = [(fh, aid) for fh, aid in pairs if fh and aid and fh != aid]
+        if rows:
+            with self.transaction() as conn:
+                conn.executemany("INSERT OR REPLACE INTO audio_alias (file_hash, audio_id) VALUES (?, ?)", rows)
+
+
+_STORES: Dict[Tuple[int, str], CacheStore] = {}
+_STORES_LOCK = threading.Lock()
+
+
+def get_store() -> CacheStore:
+    """Współdzielony ``CacheStore`` bieżącego procesu (osobny po ``fork``)."""
+    key = (os.getpid(), str(db_path()))
+    with _STORES_LOCK:
+        store = _STORES.get(key)
+        if store is None:
+            store = _STORES[key] = CacheStore(Path(key[1]))
+            atexit.register(store.flush_stats)
+        return store
+
+
+def init_db() -> None:
+    get_store()
 
 
 def compute_audio_id(path: Path) -> str:
-    """Stable identifier for the audio file. Uses full SHA256 of the file contents.
-    This is slower than partial hashing but robust and already available in the project.
+    """Stable identifier for the audio content: SHA-256 of the audio frames only.
+
+    Tag containers (ID3/APE/Vorbis comments/MP4 metadata atoms) are skipped, so
+    writing tags (``apply``, ``sync-audio-metrics --write-tags``) keeps the id
+    and the cached analysis valid.
     """
-    return file_sha256(path)
+    return audio_ids(path)[1]
+
+
+def compute_audio_ids(path: Path) -> tuple[str, str]:
+    """Return ``(file_hash, audio_id)`` computed in a single read of the file."""
+    return audio_ids(path)
+
+
+def record_alias(file_hash: str, audio_id: str) -> None:
+    """Remember that a library/staging ``file_hash`` refers to ``audio_id``."""
+    get_store().record_aliases([(file_hash, audio_id)])
 
 
 def get_analysis(audio_id: str) -> Optional[Dict[str, Any]]:
-    conn = sqlite3.connect(db_path())
-    try:
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM audio_analysis WHERE audio_id=?", (audio_id,))
-        row = cur.fetchone()
-        if not row:
-            return None
-        cols = [c[1] for c in cur.execute("PRAGMA table_info(audio_analysis)").fetchall()]
-        data = dict(zip(cols, row))
-        # decode extras JSON if present
-        extras = data.get("extras")
-        if extras:
-            try:
-                extras_dict = json.loads(extras)  # type: ignore
-            except Exception:
-                extras_dict = extras
-            if isinstance(extras_dict, dict):
-                data["extras"] = extras_dict
-                features_ext = extras_dict.get(_EXTRA_FEATURES_KEY)
-                if isinstance(features_ext, dict):
-                    for k, v in features_ext.items():
-                        data.setdefault(k, v)
-        return data
-    finally:
-        conn.close()
+    return get_store().get(audio_id)
+
+
+def get_analyses(audio_ids_: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    return get_store().get_many(audio_ids_)
 
 
 def upsert_analysis(audio_id: str, payload: Dict[str, Any]) -> None:
-    init_db()
-    conn = sqlite3.connect(db_path())
-    try:
+    get_store().upsert(audio_id, payload)
+
+
+def get_beatgrid(audio_id: str) -> Optional[Dict[str, Any]]:
+    """Zapisana siatka beatów (``beatgrid.decode``) bez dekodowania audio; ``None`` gdy brak."""
+    from djlib.audio.beatgrid import decode
+
+    row = get_store().beatgrid(audio_id)
+    return decode(row) if row is not None else None
+
+
+def feature_matrix(
+    ids: Optional[Sequence[str]] = None, features: Optional[Sequence[str]] = None
+) -> Tuple[List[str], List[str], Any]:
+    return get_store().feature_matrix(ids, features)
+
+
+def migrate_audio_ids(paths_by_hash: Dict[str, Path]) -> Dict[str, int]:
+    """Re-key rows stored under a whole-file SHA-256 to the audio payload id.
+
+    ``paths_by_hash`` maps legacy ``file_hash`` values (library.csv/unsorted.xlsx)
+    to existing files. Rows whose file cannot be found are left untouched and
+    stay reachable by their old key. An alias is recorded for every re-keyed row.
+    """
+    stats = {"checked": 0, "rekeyed": 0, "merged": 0, "missing_file": 0, "unchanged": 0}
+    with get_store().transaction() as conn:
         cur = conn.cursor()
-        # ensure analyzed_at
-        payload = dict(payload)
-        payload.setdefault("analyzed_at", datetime.utcnow().isoformat())
-
-        extras_obj = payload.get("extras")
-        extras_dict: Dict[str, Any] = {}
-        if isinstance(extras_obj, dict):
-            extras_dict = dict(extras_obj)
-        elif extras_obj is not None and not isinstance(extras_obj, str):
-            # Preserve non-dict payload for debugging
-            extras_dict["legacy_extras"] = extras_obj
-
-        cols = [
-            "algo_version", "config_hash",
-            "bpm", "bpm_conf", "bpm_corr",
-            "key_camelot", "key_strength",
-            "lufs", "dyn_complex", "onset_rate", "spec_centroid", "spec_rolloff",
-            "energy", "energy_var",
-            "analyzed_at", "source", "extras",
-        ]
-        extra_metrics = {
-            k: _to_jsonable(payload.get(k))
-            for k in payload.keys()
-            if k not in cols and k not in {"extras"}
-        }
-        if extra_metrics:
-            feat_bucket = extras_dict.get(_EXTRA_FEATURES_KEY)
-            if not isinstance(feat_bucket, dict):
-                feat_bucket = {}
-            for k, v in extra_metrics.items():
-                if v is not None:
-                    feat_bucket[k] = v
-            extras_dict[_EXTRA_FEATURES_KEY] = feat_bucket
-
-        extras_json: str | None = None
-        if extras_dict:
+        ids = [r[0] for r in cur.execute("SELECT audio_id FROM audio_analysis").fetchall()]
+        for old_id in ids:
+            path = paths_by_hash.get(old_id)
+            if path is None:
+                continue
+            stats["checked"] += 1
+            if not path.exists():
+                stats["missing_file"] += 1
+                continue
             try:
-                extras_json = json.dumps(extras_dict)
+                _, new_id = audio_ids(path)
             except Exception:
-                extras_json = json.dumps({"error": "failed to encode extras"})
-        payload["extras"] = extras_json
-
-        values = [payload.get(c) for c in cols]
-        cur.execute(
-            """
-            INSERT INTO audio_analysis (
-                audio_id, algo_version, config_hash, bpm, bpm_conf, bpm_corr, key_camelot, key_strength,
-                lufs, dyn_complex, onset_rate, spec_centroid, spec_rolloff, energy, energy_var,
-                analyzed_at, source, extras
-            ) VALUES (
-                ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?
+                stats["missing_file"] += 1
+                continue
+            if new_id == old_id:
+                stats["unchanged"] += 1
+                continue
+            exists = cur.execute("SELECT 1 FROM audio_analysis WHERE audio_id=?", (new_id,)).fetchone()
+            if exists:
+                # analiza pod nowym kluczem już istnieje (nowsza) – usuń starą kopię
+                cur.execute("DELETE FROM audio_analysis WHERE audio_id=?", (old_id,))
+                cur.execute("DELETE FROM audio_features WHERE audio_id=?", (old_id,))
+                cur.execute("DELETE FROM beatgrids WHERE audio_id=?", (old_id,))
+                stats["merged"] += 1
+            else:
+                cur.execute("UPDATE audio_analysis SET audio_id=? WHERE audio_id=?", (new_id, old_id))
+                cur.execute("UPDATE audio_features SET audio_id=? WHERE audio_id=?", (new_id, old_id))
+                cur.execute("UPDATE beatgrids SET audio_id=? WHERE audio_id=?", (new_id, old_id))
+                stats["rekeyed"] += 1
+            cur.execute(
+                "INSERT OR REPLACE INTO audio_alias (file_hash, audio_id) VALUES (?, ?)", (old_id, new_id)
             )
-            ON CONFLICT(audio_id) DO UPDATE SET
-                algo_version=excluded.algo_version,
-                config_hash=excluded.config_hash,
-                bpm=excluded.bpm,
-                bpm_conf=excluded.bpm_conf,
-                bpm_corr=excluded.bpm_corr,
-                key_camelot=excluded.key_camelot,
-                key_strength=excluded.key_strength,
-                lufs=excluded.lufs,
-                dyn_complex=excluded.dyn_complex,
-                onset_rate=excluded.onset_rate,
-                spec_centroid=excluded.spec_centroid,
-                spec_rolloff=excluded.spec_rolloff,
-                energy=excluded.energy,
-                energy_var=excluded.energy_var,
-                analyzed_at=excluded.analyzed_at,
-                source=excluded.source,
-                extras=excluded.extras
-            """,
-            [audio_id] + values,
+    return stats
+
+
+def _db_size(path: Path) -> int:
+    return sum(p.stat().st_size for p in (path, Path(f"{path}-wal")) if p.exists())
+
+
+def cache_stats(days: int = 30) -> Dict[str, Any]:
+    """Rozmiar bazy, liczba wpisów i hit rate odczytów z ostatnich ``days`` dni."""
+    store = get_store()
+    store.flush_stats()
+    since = (datetime.utcnow().date() - timedelta(days=days)).isoformat()
+    with store.transaction() as conn:
+        rows = conn.execute("SELECT COUNT(*) FROM audio_analysis").fetchone()[0]
+        aliases = conn.execute("SELECT COUNT(*) FROM audio_alias").fetchone()[0]
+        lookups, hits = conn.execute(
+            "SELECT COALESCE(SUM(lookups), 0), COALESCE(SUM(hits), 0) FROM cache_stats WHERE day >= ?", (since,)
+        ).fetchone()
+    return {
+        "rows": rows,
+        "aliases": aliases,
+        "size_bytes": _db_size(store.path),
+        "lookups": lookups,
+        "hits": hits,
+        "hit_rate": (hits / lookups) if lookups else None,
+        "days": days,
+    }
+
+
+def collect_garbage(
+    live_keys: Iterable[str],
+    *,
+    keep_days: int = 30,
+    min_algo_version: int = 0,
+    dry_run: bool = False,
+) -> Dict[str, Any]:
+    """Usuń wpisy cache bez żywego właściciela i zrób przyrostowy VACUUM.
+
+    ``live_keys`` to file_hash/audio_id plików, które wciąż istnieją w arkuszach
+    (library.csv, unsorted.xlsx) i na dysku; file_hash rozwiązywany jest przez
+    ``audio_alias``. Polityka retencji:
+
+    - wpis bez właściciela jest usuwany, gdy ``analyzed_at`` jest starszy niż
+      ``keep_days`` dni (świeże wpisy czekają, aż plik trafi do arkusza),
+    - wpis z ``algo_version < min_algo_version`` jest usuwany zawsze,
+    - aliasy wskazujące na usunięte (lub nieistniejące) wpisy są usuwane.
+    """
+    store = get_store()
+    before = cache_stats()
+    cutoff = (datetime.utcnow() - timedelta(days=max(0, keep_days))).isoformat()
+    with store.transaction() as conn:
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS gc_live (key TEXT PRIMARY KEY)")
+        conn.execute("DELETE FROM temp.gc_live")
+        conn.executemany("INSERT OR IGNORE INTO temp.gc_live (key) VALUES (?)", ((k,) for k in live_keys if k))
+        conn.execute(
+            "INSERT OR IGNORE INTO temp.gc_live (key) "
+            "SELECT al.audio_id FROM audio_alias al JOIN temp.gc_live l ON l.key = al.file_hash"
         )
-        conn.commit()
-    finally:
-        conn.close()
+        orphan = [r[0] for r in conn.execute(
+            "SELECT a.audio_id FROM audio_analysis a WHERE a.audio_id NOT IN (SELECT key FROM temp.gc_live) "
+            "AND (a.analyzed_at IS NULL OR a.analyzed_at < ?)",
+            (cutoff,),
+        )]
+        outdated = [r[0] for r in conn.execute(
+            "SELECT audio_id FROM audio_analysis WHERE COALESCE(algo_version, 0) < ?", (min_algo_version,)
+        )] if min_algo_version > 0 else []
+        evict = list(dict.fromkeys(orphan + outdated))
+        if not dry_run:
+            params = [(aid,) for aid in evict]
+            conn.executemany("DELETE FROM audio_analysis WHERE audio_id=?", params)
+            conn.executemany("DELETE FROM audio_features WHERE audio_id=?", params)
+            conn.executemany("DELETE FROM beatgrids WHERE audio_id=?", params)
+            dead_aliases = conn.execute(
+                "DELETE FROM audio_alias WHERE audio_id NOT IN (SELECT audio_id FROM audio_analysis)"
+            ).rowcount
+        else:
+            dead_aliases = conn.execute(
+                "SELECT COUNT(*) FROM audio_alias WHERE audio_id NOT IN (SELECT audio_id FROM audio_analysis)"
+            ).fetchone()[0]
+        conn.execute("DROP TABLE IF EXISTS temp.gc_live")
+
+    if not dry_run:
+        _vacuum(store)
+    after = cache_stats()
+    return {
+        "orphaned": len(orphan),
+        "outdated": len(outdated),
+        "evicted": len(evict),
+        "aliases_removed": dead_aliases,
+        "rows_before": before["rows"],
+        "rows_after": after["rows"],
+        "size_before": before["size_bytes"],
+        "size_after": after["size_bytes"],
+        "hit_rate": after["hit_rate"],
+        "lookups": after["lookups"],
+        "dry_run": dry_run,
+    }
+
+
+def _vacuum(store: CacheStore) -> None:
+    """Przyrostowy VACUUM; przy pierwszym razie przełącz bazę na auto_vacuum=INCREMENTAL."""
+    with store._lock:
+        conn = store._conn
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")  # jednorazowa przebudowa – potem wystarcza incremental_vacuum
+        else:
+            conn.execute("PRAGMA incremental_vacuum").fetchall()
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
 
 
 def _to_jsonable(value: Any) -> Any:
@@ -0,0 +1,149 @@
+"""Grupy deskryptorów audio i ich wersje.
+
+Zamiast jednego ``ALGO_VERSION`` dla całej analizy każda grupa deskryptorów
+(rytm, tonacja, głośność, MFCC, chroma, widmo) ma własną wersję. Wersje, z
+którymi policzono wpis, trafiają do ``extras["descriptor_versions"]``; przy
+ponownej analizie z wyniku brane są tylko grupy nieaktualne, a pozostałe
+wartości przepisywane są z cache. Oszczędza to obliczeń tylko w profilu lean i
+w trybie strumieniowym (liczą wyłącznie nieaktualne grupy); profil full
+(``MusicExtractor``) i ścieżka CLI/Docker uruchamiają cały ekstraktor nawet dla
+jednej nieaktualnej grupy.
+
+Zmiana sposobu liczenia albo nowy deskryptor = podbicie wersji jednej grupy
+w ``DESCRIPTOR_VERSIONS`` (i dopisanie pola do ``GROUP_FIELDS``).
+"""
+
+from __future__ import annotations
+
+from collections import Counter
+from typing import Any, Dict, Iterable, Mapping, Optional, Set
+
+GROUPS = ("rhythm", "tonal", "loudness", "mfcc", "chroma", "spectral")
+
+DESCRIPTOR_VERSIONS: Dict[str, int] = {
+    "rhythm": 2,  # 2: tempo_drift + siatka beatów (djlib.audio.beatgrid); w profilu full = pełna ponowna analiza
+    "tonal": 1,
+    "loudness": 1,
+    "mfcc": 1,
+    "chroma": 1,
+    "spectral": 1,
+}
+
+VERSIONS_KEY = "descriptor_versions"
+
+# Wpis z analizy podglądowej (``analyze-audio --preview``): tylko BPM/tonacja z
+# kilku fragmentów. Każda grupa jest dla niego nieaktualna; pełna analiza go
+# zastępuje, a wartości podglądu zostają w ``extras["preview"]``.
+PROVISIONAL_KEY = "provisional"
+PREVIEW_KEY = "preview"
+PREVIEW_FIELDS = ("bpm", "key_camelot")
+
+GROUP_FIELDS: Dict[str, tuple[str, ...]] = {
+    "rhythm": ("bpm", "bpm_conf", "bpm_corr", "onset_rate", "danceability", "tempo_drift"),
+    "tonal": (
+        "key_camelot", "key_strength", "chords_changes_rate", "tuning_diatonic_strength",
+        "tonnetz_mean", "tonnetz_std",
+    ),
+    "loudness": ("lufs", "dyn_complex", "energy", "energy_var"),
+    "mfcc": tuple(
+        [f"mfcc_{i}" for i in range(13)] + [f"mfcc_std_{i}" for i in range(13)]
+        + ["mfcc_kurtosis_mean", "mfcc_skew_mean"]
+    ),
+    "chroma": tuple(
+        [f"chroma_{i}" for i in range(12)] + [f"chroma_std_{i}" for i in range(12)] + ["chroma_kurtosis_mean"]
+    ),
+    "spectral": (
+        "spec_centroid", "spec_rolloff", "zero_crossing_rate",
+        "spec_centroid_std", "spec_rolloff_std", "spec_bandwidth_mean", "spec_bandwidth_std",
+        "spec_contrast_mean", "spec_contrast_std", "spec_flux_mean", "spec_flux_std",
+        "spec_flatness_mean", "spec_flatness_std", "hfc_mean", "hfc_std",
+    ),
+}
+
+_FIELD_GROUP = {field: group for group, fields in GROUP_FIELDS.items() for field in fields}
+
+# Wpisy sprzed wersjonowania grup: algo_version 2 dodało MFCC/chroma/rozszerzone widmo.
+_LEGACY_VERSIONS: Dict[int, Dict[str, int]] = {
+    1: {"rhythm": 1, "tonal": 1, "loudness": 1},
+    2: {g: 1 for g in GROUPS},
+}
+
+
+def group_of(field: str) -> Optional[str]:
+    return _FIELD_GROUP.get(field)
+
+
+def is_provisional(cached: Optional[Mapping[str, Any]]) -> bool:
+    extras = (cached or {}).get("extras")
+    return isinstance(extras, dict) and bool(extras.get(PROVISIONAL_KEY))
+
+
+def stored_versions(cached: Mapping[str, Any]) -> Dict[str, int]:
+    """Wersje grup zapisane we wpisie cache (dla starych wpisów – wg ``algo_version``)."""
+    extras = cached.get("extras")
+    if isinstance(extras, dict) and isinstance(extras.get(VERSIONS_KEY), dict):
+        out: Dict[str, int] = {}
+        for group, ver in extras[VERSIONS_KEY].items():
+            try:
+                out[str(group)] = int(ver)
+            except (TypeError, ValueError):
+                continue
+        return out
+    try:
+        algo = int(cached.get("algo_version") or 0)
+    except (TypeError, ValueError):
+        algo = 0
+    return dict(_LEGACY_VERSIONS.get(algo, {}))
+
+
+def stale_groups(cached: Optional[Mapping[str, Any]], config_hash: str) -> Set[str]:
+    """Grupy do przeliczenia; brak wpisu albo inna konfiguracja → wszystkie."""
+    if not cached or cached.get("config_hash") != config_hash or is_provisional(cached):
+        return set(GROUPS)
+    have = stored_versions(cached)
+    return {g for g in GROUPS if have.get(g, 0) != DESCRIPTOR_VERSIONS[g]}
+
+
+def merge_fresh(
+    cached: Optional[Mapping[str, Any]], fresh: Dict[str, Any], stale: Iterable[str]
+) -> Dict[str, Any]:
+    """Payload do zapisu: pola grup ``stale`` z ``fresh``, pozostałe grupy z ``cached``.
+
+    Wersje grup trafiają do ``extras["descriptor_versions"]``.
+    """
+    stale = set(stale)
+    out = dict(fresh)
+    versions = dict(stored_versions(cached)) if cached and not is_provisional(cached) else {}
+    if cached:
+        for key, value in cached.items():
+            group = group_of(key)
+            if group is not None and group not in stale:
+                out[key] = value
+        for key in list(out):
+            group = group_of(key)
+            if group is not None and group not in stale and key not in cached:
+                out.pop(key)
+    for group in stale:
+        versions[group] = DESCRIPTOR_VERSIONS[group]
+    extras = out.get("extras")
+    extras = dict(extras) if isinstance(extras, dict) else {}
+    extras.pop(PROVISIONAL_KEY, None)
+    if cached and is_provisional(cached):
+        extras[PREVIEW_KEY] = {k: cached.get(k) for k in PREVIEW_FIELDS}
+    extras[VERSIONS_KEY] = {g: versions[g] for g in GROUPS if g in versions}
+    out["extras"] = extras
+    return out
+
+
+def plan(cached_by_id: Mapping[str, Optional[Mapping[str, Any]]], config_hash: str) -> Dict[str, int]:
+    """Ile utworów wymaga której grupy (+ ``tracks`` – ile w ogóle, ``missing`` – bez wpisu)."""
+    counts: Counter[str] = Counter()
+    for cached in cached_by_id.values():
+        stale = stale_groups(cached, config_hash)
+        if not cached:
+            counts["missing"] += 1
+        if stale:
+            counts["tracks"] += 1
+        for group in stale:
+            counts[group] += 1
+    return {k: counts.get(k, 0) for k in ("tracks", "missing") + GROUPS}
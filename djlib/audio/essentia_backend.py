@@ -3,24 +3,43 @@ from __future__ import annotations
 from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, Optional, Tuple
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+import itertools
 import json
 import shutil
-import subprocess
-import tempfile
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from .cache import compute_audio_id, get_analysis, upsert_analysis, init_db
+from .beatgrid import build_grid, encode as encode_grid
+from .cache import BEATGRID_KEY, compute_audio_ids, get_analysis, get_store, upsert_analysis, init_db, record_alias
+from .aggregate import CHROMA_BINS, MFCC_COEFFS, aggregate_matrix, aggregate_series
+from .descriptors import GROUPS, PROVISIONAL_KEY, group_of, is_provisional, merge_fresh, stale_groups
+from .extractor_cli import (
+    ExtractorRun, default_timeout, docker_command, log_failure, make_scratch_dir, run_extractor,
+)
 from .features import bpm_correct_into_range, config_hash, energy_score_from_metrics
+from .lean import PROFILE_FULL, PROFILE_LEAN, extract_lean, extract_preview
+from .streaming import extract_streaming, should_stream
+from .supervisor import DEFAULT_MAX_CRASHES, Quarantine, supervise
+from .worker_client import WORKER_CMD_ENV, WorkerStartError, get_worker
 from . import ALGO_VERSION
 from djlib.tags import _to_camelot  # reuse existing Camelot mapping
 from djlib.config import LOGS_DIR
 import yaml
 import numpy as np
-try:
-    from scipy import stats  # type: ignore
-except Exception:  # scipy may be missing; gate features that require it
-    stats = None  # type: ignore
+
+_CONTAINER_SEQ = itertools.count(1)
+
+# Serie ramkowe z Pool MusicExtractora: nazwa cechy (prefiks _mean/_std) → klucz Pool
+_POOL_SERIES = (
+    ("spec_centroid", "lowlevel.spectral_centroid"),
+    ("spec_rolloff", "lowlevel.spectral_rolloff"),
+    ("spec_contrast", "lowlevel.spectral_contrast"),
+    ("tonnetz", "tonal.tonnetz"),
+    ("spec_flux", "lowlevel.spectral_flux"),
+    ("spec_flatness", "lowlevel.spectral_flatness_db"),
+    ("hfc", "lowlevel.hfc"),
+)
 
 
 def _try_import_essentia():
@@ -87,70 +106,130 @@ def check_env() -> Dict[str, Any]:
     }
 
 
-def analyze(
-    path: Path | str,
+_EXTRACTOR: Any = None
+
+
+def _get_extractor(es: Any) -> Any:
+    """Return this process' MusicExtractor (built on first use, then reused)."""
+    global _EXTRACTOR
+    if _EXTRACTOR is None:
+        _EXTRACTOR = es.MusicExtractor()
+    return _EXTRACTOR
+
+
+def _analyze_file(
+    p: Path,
     *,
-    target_bpm_range: Tuple[int, int] = (80, 180),
-    recompute: bool = False,
-    config: Optional[Dict[str, Any]] = None,
-) -> Dict[str, Any]:
-    """Analyze one audio file and return a dictionary with detected metrics.
+    target_bpm_range: Tuple[int, int],
+    recompute: bool,
+    config: Optional[Dict[str, Any]],
+    preview: bool = False,
+    cli_timeout: Optional[float] = None,
+    stream_above: Optional[float] = None,
+) -> Tuple[str, str, Dict[str, Any], bool]:
+    """Compute ``(file_hash, audio_id, payload, from_cache)`` without writing to the cache.
 
-    This is a skeleton implementation: it integrates cache and wiring, and
-    returns empty metrics if Essentia is unavailable. Real detectors will be
-    plugged in in subsequent iterations.
+    Only reads the cache, so it is safe to call from worker processes; the
+    caller persists the payload (``analyze`` directly, ``analyze_many`` in batches).
+    ``cli_timeout`` bounds one run of the external extractor (``None`` = default);
+    files longer than ``stream_above`` seconds are analyzed in streaming mode.
     """
-    try:
-        p = Path(path)
-        init_db()
-        aid = compute_audio_id(p)
-        cfg = config or {"target_bpm": list(target_bpm_range)}
-        ch = config_hash(cfg)
-
-        if not recompute:
-            cached = get_analysis(aid)
-            if cached and cached.get("config_hash") == ch and int(cached.get("algo_version") or 0) == ALGO_VERSION:
-                return cached
-
-        ess, es = _try_import_essentia()
-        cli_bin = _find_extractor_binary()
-
-        bpm = None
-        bpm_conf = None
-        key_camelot = None
-        key_strength = None
-        energy = None
-        metrics: Dict[str, Any] = {}
-        src = "stub"
-
-        if ess is not None and es is not None:
-            # Use Python Essentia MusicExtractor
-            src = "essentia"
-            try:
-                # Create MusicExtractor and run on file
-                extractor = es.MusicExtractor()
-                audio, results = extractor(str(p))
-                
-                # Debug: print available keys
-                # print(f"DEBUG: results type: {type(results)}, descriptors: {results.descriptorNames()[:10]}...")
-                
-                # Helper to get scalar value from Pool
-                def get_scalar(key):
-                    val = results[key]
-                    if isinstance(val, (int, float)):
-                        return float(val)
-                    elif hasattr(val, '__len__'):
-                        if len(val) == 1:
-                            return float(val[0])
-                        elif len(val) > 1:
-                            # For multi-element arrays, take mean or first value
-                            import numpy as np
-                            return float(np.mean(val))
+    file_hash, aid = compute_audio_ids(p)
+    cfg = config or {"target_bpm": list(target_bpm_range)}
+    ch = config_hash(cfg)
+
+    if preview:
+        return _preview_file(p, file_hash, aid, get_analysis(aid), ch, target_bpm_range, recompute)
+
+    # Per-descriptor-group versions: only stale groups are recomputed, the rest is kept from cache
+    cached = None if recompute else get_analysis(aid)
+    stale = set(GROUPS) if recompute else stale_groups(cached, ch)
+    if cached and not stale:
+        return file_hash, aid, cached, True
+
+    ess, es = _try_import_essentia()
+    cli_bin = _find_extractor_binary()
+
+    bpm = None
+    bpm_conf = None
+    key_camelot = None
+    key_strength = None
+    energy = None
+    metrics: Dict[str, Any] = {}
+    beats = None  # beat positions (s) for the persisted beatgrid (djlib.audio.beatgrid)
+    strength = None
+    src = "stub"
+
+    profile = str(cfg.get("profile") or PROFILE_FULL)
+
+    stream_blocks = None
+    if ess is not None and es is not None and should_stream(str(p), stream_above):
+        # Long files (DJ mixes): block-wise decode with running aggregates (djlib.audio.streaming)
+        src = "essentia-stream"
+        try:
+            streamed = extract_streaming(str(p), es, stale)
+            stream_blocks = streamed.pop("blocks", None)
+            bpm = streamed.pop("bpm", None)
+            key_raw = streamed.pop("key_raw", "")
+            key_camelot = _to_camelot(key_raw) if key_raw else None
+            key_strength = streamed.pop("key_strength", None)
+            energy = streamed.pop("energy", None)
+            beats = streamed.pop("beats", None)
+            strength = streamed.pop("beat_strength", None)
+            metrics.update(streamed)
+        except Exception as e:
+            print(f"Streaming Essentia analysis failed: {e}")
+    elif ess is not None and es is not None and profile == PROFILE_LEAN:
+        # Single decode, only the descriptors we persist (djlib.audio.lean)
+        src = "essentia-lean"
+        try:
+            lean = extract_lean(str(p), es, stale)
+            bpm = lean.pop("bpm", None)
+            key_raw = lean.pop("key_raw", "")
+            key_camelot = _to_camelot(key_raw) if key_raw else None
+            key_strength = lean.pop("key_strength", None)
+            energy = lean.pop("energy", None)
+            beats = lean.pop("beats", None)
+            strength = lean.pop("beat_strength", None)
+            metrics.update(lean)
+        except Exception as e:
+            print(f"Lean Essentia analysis failed: {e}")
+    elif ess is not None and es is not None:
+        # Use Python Essentia MusicExtractor
+        src = "essentia"
+        try:
+            # MusicExtractor is built once per process and reused
+            extractor = _get_extractor(es)
+            audio, results = extractor(str(p))
+            
+            # Debug: print available keys
+            # print(f"DEBUG: results type: {type(results)}, descriptors: {results.descriptorNames()[:10]}...")
+            
+            # Helper to get scalar value from Pool
+            def get_scalar(key):
+                val = results[key]
+                if isinstance(val, (int, float)):
                     return float(val)
-                
-                # Extract BPM
+                elif hasattr(val, '__len__'):
+                    if len(val) == 1:
+                        return float(val[0])
+                    elif len(val) > 1:
+                        # For multi-element arrays, take mean or first value
+                        import numpy as np
+                        return float(np.mean(val))
+                return float(val)
+            
+            if "rhythm" in stale:
                 bpm = get_scalar('rhythm.bpm')
-                
+                metrics["onset_rate"] = get_scalar('rhythm.onset_rate')
+                metrics["danceability"] = get_scalar('rhythm.danceability')
+                try:
+                    beats = [float(b) for b in results['rhythm.beats_position']]
+                    strength = [float(b) for b in results['rhythm.beats_loudness']]
+                except Exception:
+                    pass
+
+            if "tonal" in stale:
                 # Extract Key - strings are arrays of chars or single string
                 key_key_val = results['tonal.key_edma.key']
                 key_scale_val = results['tonal.key_edma.scale']
@@ -165,157 +244,112 @@ def analyze(
                 key_strength = get_scalar('tonal.key_edma.strength')
                 key_raw = f"{key_key} {key_scale}".strip()
                 key_camelot = _to_camelot(key_raw)
-                
+                metrics["chords_changes_rate"] = get_scalar('tonal.chords_changes_rate')
+                metrics["tuning_diatonic_strength"] = get_scalar('tonal.tuning_diatonic_strength')
+
+            if "loudness" in stale:
                 # Extract Energy - no direct mood_energy in this version, use spectral energy
                 energy = get_scalar('lowlevel.spectral_energy')
-                
-                # Extract low-level metrics
                 metrics["dyn_complex"] = get_scalar('lowlevel.dynamic_complexity')
                 metrics["lufs"] = get_scalar('lowlevel.loudness_ebu128.integrated')
+
+            if "spectral" in stale:
                 metrics["spec_centroid"] = get_scalar('lowlevel.spectral_centroid')
                 metrics["spec_rolloff"] = get_scalar('lowlevel.spectral_rolloff')
-                metrics["onset_rate"] = get_scalar('rhythm.onset_rate')
-                
-                # Additional features for genre classification
                 metrics["zero_crossing_rate"] = get_scalar('lowlevel.zerocrossingrate')
-                metrics["danceability"] = get_scalar('rhythm.danceability')
-                metrics["chords_changes_rate"] = get_scalar('tonal.chords_changes_rate')
-                metrics["tuning_diatonic_strength"] = get_scalar('tonal.tuning_diatonic_strength')
-                
-                # Aggregate MFCC coefficients (mean across time)
-                try:
-                    mfcc_vals = results['lowlevel.mfcc']
-                    if hasattr(mfcc_vals, '__len__') and len(mfcc_vals) > 0:
-                        mfcc_mean = np.mean(mfcc_vals, axis=0) if getattr(mfcc_vals, 'ndim', 1) > 1 else mfcc_vals
-                        if hasattr(mfcc_mean, '__len__') and len(mfcc_mean) >= 13:
-                            for i in range(13):  # First 13 MFCC coefficients (means)
-                                metrics[f"mfcc_{i}"] = float(mfcc_mean[i])
-                            # Per-coefficient std
-                            mfcc_std = np.std(mfcc_vals, axis=0) if getattr(mfcc_vals, 'ndim', 1) > 1 else np.zeros(13)
-                            for i in range(min(13, len(mfcc_std))):
-                                metrics[f"mfcc_std_{i}"] = float(mfcc_std[i])
-                            # Aggregate kurtosis/skew if scipy is available
-                            if stats is not None and getattr(mfcc_vals, 'ndim', 1) > 1:
-                                try:
-                                    mfcc_kurtosis = float(np.mean([stats.kurtosis(mfcc_vals[:, i]) for i in range(13)]))
-                                    mfcc_skew = float(np.mean([stats.skew(mfcc_vals[:, i]) for i in range(13)]))
-                                    metrics["mfcc_kurtosis_mean"] = mfcc_kurtosis
-                                    metrics["mfcc_skew_mean"] = mfcc_skew
-                                except Exception:
-                                    pass
-                except Exception as e:
-                    print(f"MFCC extraction failed: {e}")
-                
-                # Aggregate chroma features (HPCP - Harmonic Pitch Class Profile)
-                try:
-                    hpcp_vals = results['tonal.hpcp']
-                    if hasattr(hpcp_vals, '__len__') and len(hpcp_vals) > 0:
-                        hpcp_mean = np.mean(hpcp_vals, axis=0) if getattr(hpcp_vals, 'ndim', 1) > 1 else hpcp_vals
-                        if hasattr(hpcp_mean, '__len__') and len(hpcp_mean) >= 12:
-                            for i in range(12):  # 12 chroma bins (means)
-                                metrics[f"chroma_{i}"] = float(hpcp_mean[i])
-                            # Per-bin std
-                            if getattr(hpcp_vals, 'ndim', 1) > 1:
-                                hpcp_std = np.std(hpcp_vals, axis=0)
-                                for i in range(min(12, len(hpcp_std))):
-                                    metrics[f"chroma_std_{i}"] = float(hpcp_std[i])
-                                # Aggregate kurtosis if scipy is available
-                                if stats is not None:
-                                    try:
-                                        chroma_kurtosis = float(np.mean([stats.kurtosis(hpcp_vals[:, i]) for i in range(12)]))
-                                        metrics["chroma_kurtosis_mean"] = chroma_kurtosis
-                                    except Exception:
-                                        pass
-                except Exception as e:
-                    print(f"Chroma extraction failed: {e}")
-                
-                # Additional spectral features (robust to Pool semantics)
-                try:
-                    # Spectral centroid std
-                    try:
-                        centroid_vals = results['lowlevel.spectral_centroid']
-                        if hasattr(centroid_vals, '__len__') and len(centroid_vals) > 0:
-                            metrics["spec_centroid_std"] = float(np.std(centroid_vals))
-                    except Exception:
-                        pass
-                    # Spectral rolloff std
-                    try:
-                        rolloff_vals = results['lowlevel.spectral_rolloff']
-                        if hasattr(rolloff_vals, '__len__') and len(rolloff_vals) > 0:
-                            metrics["spec_rolloff_std"] = float(np.std(rolloff_vals))
-                    except Exception:
-                        pass
-                    # Spectral bandwidth (approximate)
-                    try:
-                        _ = results['lowlevel.spectral_energyband_low']
-                        _ = results['lowlevel.spectral_energyband_high']
-                        metrics["spec_bandwidth_mean"] = metrics.get("spec_centroid", 0)
-                        metrics["spec_bandwidth_std"] = metrics.get("spec_centroid_std", 0)
-                    except Exception:
-                        pass
-                    # Spectral contrast
-                    try:
-                        contrast_vals = results['lowlevel.spectral_contrast']
-                        if hasattr(contrast_vals, '__len__') and len(contrast_vals) > 0:
-                            metrics["spec_contrast_mean"] = float(np.mean(contrast_vals))
-                            metrics["spec_contrast_std"] = float(np.std(contrast_vals))
-                    except Exception:
-                        pass
-                    # Tonnetz
-                    try:
-                        tonnetz_vals = results['tonal.tonnetz']
-                        if hasattr(tonnetz_vals, '__len__') and len(tonnetz_vals) > 0:
-                            metrics["tonnetz_mean"] = float(np.mean(tonnetz_vals))
-                            metrics["tonnetz_std"] = float(np.std(tonnetz_vals))
-                    except Exception:
-                        pass
-                    # Spectral dynamics
-                    try:
-                        flux_vals = results['lowlevel.spectral_flux']
-                        if hasattr(flux_vals, '__len__') and len(flux_vals) > 0:
-                            metrics["spec_flux_mean"] = float(np.mean(flux_vals))
-                            metrics["spec_flux_std"] = float(np.std(flux_vals))
-                    except Exception:
-                        pass
-                    try:
-                        flat_vals = results['lowlevel.spectral_flatness_db']
-                        if hasattr(flat_vals, '__len__') and len(flat_vals) > 0:
-                            metrics["spec_flatness_mean"] = float(np.mean(flat_vals))
-                            metrics["spec_flatness_std"] = float(np.std(flat_vals))
-                    except Exception:
-                        pass
+            
+            # Statystyki ramkowe: jedno przejście wektorowe (djlib.audio.aggregate)
+            try:
+                if "mfcc" in stale:
+                    mfcc_vals = np.asarray(results['lowlevel.mfcc'], dtype=np.float64)
+                    if mfcc_vals.ndim > 1:
+                        metrics.update(aggregate_matrix("mfcc", mfcc_vals, MFCC_COEFFS))
+                    elif mfcc_vals.size >= MFCC_COEFFS:
+                        for i in range(MFCC_COEFFS):
+                            metrics[f"mfcc_{i}"] = float(mfcc_vals[i])
+                            metrics[f"mfcc_std_{i}"] = 0.0
+            except Exception as e:
+                print(f"MFCC extraction failed: {e}")
+            try:
+                if "chroma" in stale:
+                    hpcp_vals = np.asarray(results['tonal.hpcp'], dtype=np.float64)
+                    if hpcp_vals.ndim > 1:
+                        metrics.update(aggregate_matrix("chroma", hpcp_vals, CHROMA_BINS, skew=False))
+                    elif hpcp_vals.size >= CHROMA_BINS:
+                        for i in range(CHROMA_BINS):
+                            metrics[f"chroma_{i}"] = float(hpcp_vals[i])
+            except Exception as e:
+                print(f"Chroma extraction failed: {e}")
+
+            # Additional spectral features (robust to Pool semantics)
+            try:
+                series = {}
+                for name, key in _POOL_SERIES:
                     try:
-                        hfc_vals = results['lowlevel.hfc']
-                        if hasattr(hfc_vals, '__len__') and len(hfc_vals) > 0:
-                            metrics["hfc_mean"] = float(np.mean(hfc_vals))
-                            metrics["hfc_std"] = float(np.std(hfc_vals))
+                        series[name] = results[key]
                     except Exception:
-                        pass
-                except Exception as e:
-                    print(f"Additional spectral features extraction failed: {e}")
-                
+                        continue
+                for key, value in aggregate_series(series).items():
+                    if group_of(key) is not None:
+                        metrics[key] = value
+                try:
+                    _ = results['lowlevel.spectral_energyband_low']
+                    _ = results['lowlevel.spectral_energyband_high']
+                    # "bandwidth" to przybliżenie centroidem
+                    metrics["spec_bandwidth_mean"] = metrics.get("spec_centroid", 0)
+                    metrics["spec_bandwidth_std"] = metrics.get("spec_centroid_std", 0)
+                except Exception:
+                    pass
             except Exception as e:
-                print(f"Python Essentia analysis failed: {e}")
-                # Fall back to None
-                pass
-        elif cli_bin or shutil.which("docker"):
-            # Fallback: call Essentia streaming extractor binary and parse JSON/YAML output.
-            src = "essentia-cli"
-            debug_mode = os.getenv("DJLIB_ESSENTIA_DEBUG", "0").strip() in {"1", "true", "yes"}
-            print(f"DEBUG: debug_mode={debug_mode}, cli_bin={cli_bin}, docker={shutil.which('docker')}")  # DEBUG
-            if debug_mode:
-                # Use persistent LOGS/essentia_tmp/<audio_id>/features.json for debugging
-                debug_dir = LOGS_DIR / "essentia_tmp" / aid
-                debug_dir.mkdir(parents=True, exist_ok=True)
-                out_json = debug_dir / "features.json"
-                td = None  # no cleanup needed
-            else:
-                # Use ephemeral temp dir
-                td = tempfile.mkdtemp()
-                out_json = Path(td) / "features.json"
+                print(f"Additional spectral features extraction failed: {e}")
+            
+        except Exception as e:
+            print(f"Python Essentia analysis failed: {e}")
+            # Fall back to None
+            pass
+    elif cli_bin or shutil.which("docker") or os.getenv(WORKER_CMD_ENV):
+        # Fallback: call Essentia streaming extractor binary and parse JSON/YAML output.
+        src = "essentia-cli"
+        debug_mode = os.getenv("DJLIB_ESSENTIA_DEBUG", "0").strip() in {"1", "true", "yes"}
+        timeout = cli_timeout if cli_timeout is not None else default_timeout()
+        # Persistent worker (docker/analysis_worker.py) instead of a process/container per file;
+        # debug mode and files outside the worker mounts keep per-file runs
+        worker = None if debug_mode else get_worker(allow_docker=not cli_bin)
+        if worker is not None and worker.worker_path(p) is None:
+            worker = None
+        td = None  # no cleanup needed
+        if debug_mode:
+            print(f"DEBUG: cli_bin={cli_bin}, docker={shutil.which('docker')}")  # DEBUG
+            # Use persistent LOGS/essentia_tmp/<audio_id>/features.json for debugging
+            debug_dir = LOGS_DIR / "essentia_tmp" / aid
+            debug_dir.mkdir(parents=True, exist_ok=True)
+            out_json = debug_dir / "features.json"
+        elif worker is None:
+            # Ephemeral scratch dir, on tmpfs when available
+            td = make_scratch_dir()
+            out_json = td / "features.json"
 
-            try:
+        try:
+            data: Dict[str, Any] = {}
+            run: Optional[ExtractorRun] = None
+            raw: Optional[str] = None
+            if worker is not None:
+                try:
+                    res = worker.run(p, timeout)
+                except WorkerStartError as e:
+                    # the worker remembers the failed start (get_worker() returns None from now on);
+                    # this file and the following ones use per-file runs
+                    print(f"{e}; falling back to per-file extractor runs")
+                    worker = None
+                    td = make_scratch_dir()
+                    out_json = td / "features.json"
+                else:
+                    raw = res.get("raw")
+                    err = str(res.get("stderr") or res.get("error") or "")
+                    run = ExtractorRun(0 if res.get("ok") else 1, b"", err.encode("utf-8"), bool(res.get("timed_out")))
+            if worker is None:
                 # Prepare command
+                container = None
                 if cli_bin:
                     cmd = [cli_bin, str(p), str(out_json)]
                 else:
@@ -324,34 +358,20 @@ def analyze(
                     if not docker_enabled:
                         cmd = []
                     else:
-                        in_name = p.name
-                        cmd = [
-                            shutil.which("docker") or "docker",
-                            "run",
-                            "--rm",
-                            "-v",
-                            f"{str(p)}:/in/{in_name}:ro",
-                            "-v",
-                            f"{str(out_json.parent)}:/out",
-                            docker_img,
-                            f"/in/{in_name}",
-                            "/out/features.json",
-                        ]
-
-                data: Dict[str, Any] = {}
+                        # unique per call: threads of one process may analyse the same file
+                        container = f"djlib-ess-{aid[:12]}-{os.getpid()}-{next(_CONTAINER_SEQ)}"
+                        cmd = docker_command(shutil.which("docker") or "docker", docker_img, p, out_json.parent, container)
                 if cmd:
-                    proc = subprocess.run(cmd, check=False, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                    # Write stdout/stderr to logs for debugging
-                    try:
-                        LOGS_DIR.mkdir(parents=True, exist_ok=True)
-                        (LOGS_DIR / "essentia_cli_last.stdout").write_bytes(proc.stdout or b"")
-                        (LOGS_DIR / "essentia_cli_last.stderr").write_bytes(proc.stderr or b"")
-                    except Exception:
-                        pass
+                    run = run_extractor(cmd, timeout=timeout, container=container)
+                    if not run.timed_out and out_json.exists():
+                        raw = out_json.read_text(encoding="utf-8", errors="ignore")
 
+            if run is not None:
+                if run.timed_out:
+                    log_failure(aid, run)
+                    raise TimeoutError(f"essentia extractor timed out on {p}")
                 # If extractor produced an output file, parse it (JSON first, YAML fallback)
-                if out_json.exists():
-                    raw = out_json.read_text(encoding="utf-8", errors="ignore")
+                if raw is not None:
                     try:
                         data = json.loads(raw)
                     except Exception:
@@ -359,150 +379,364 @@ def analyze(
                             data = yaml.safe_load(raw) or {}
                         except Exception:
                             data = {}
-                    # also copy raw output to logs
-                    try:
-                        LOGS_DIR.mkdir(parents=True, exist_ok=True)
-                        (LOGS_DIR / "essentia_cli_last.output.json").write_text(raw, encoding="utf-8")
-                    except Exception:
-                        pass
+                if not run.ok or not isinstance(data, dict) or not data:
+                    # Logs only on failure
+                    log_failure(aid, run, raw)
+                if not isinstance(data, dict):
+                    data = {}
 
-                # Extract BPM
-                try:
-                    bpm = float(data.get("rhythm", {}).get("bpm"))
-                except Exception:
-                    pass
-                # Extract Key and strength
-                try:
-                    tonal = data.get("tonal", {})
-                    key_key = (tonal.get("key_key") or "").strip()
-                    key_scale = (tonal.get("key_scale") or "").strip()
-                    key_strength = tonal.get("key_strength")
-                    if key_key:
-                        key_raw = f"{key_key} {key_scale}".strip()
-                        cam = _to_camelot(key_raw)
-                        key_camelot = cam or key_camelot
-                except Exception:
-                    pass
-                # Low-level metrics
-                try:
-                    low = data.get("lowlevel", {})
-                    metrics["dyn_complex"] = low.get("dynamic_complexity")
-                    lufs = None
-                    try:
-                        ebu = low.get("loudness_ebu128", {})
-                        lufs = ebu.get("integrated")
-                    except Exception:
-                        pass
-                    if lufs is None:
-                        lufs = low.get("loudness")
-                    metrics["lufs"] = lufs
-                    sc = low.get("spectral_centroid", {})
-                    sr = low.get("spectral_rolloff", {})
-                    metrics["spec_centroid"] = sc.get("mean") if isinstance(sc, dict) else None
-                    metrics["spec_rolloff"] = sr.get("mean") if isinstance(sr, dict) else None
-                    rhy = data.get("rhythm", {})
-                    metrics["onset_rate"] = rhy.get("onset_rate")
-                except Exception:
-                    pass
-                # Highlevel mood/energy (0..1)
+            # Extract BPM
+            try:
+                bpm = float(data.get("rhythm", {}).get("bpm"))
+            except Exception:
+                pass
+            # Extract Key and strength
+            try:
+                tonal = data.get("tonal", {})
+                key_key = (tonal.get("key_key") or "").strip()
+                key_scale = (tonal.get("key_scale") or "").strip()
+                key_strength = tonal.get("key_strength")
+                if key_key:
+                    key_raw = f"{key_key} {key_scale}".strip()
+                    cam = _to_camelot(key_raw)
+                    key_camelot = cam or key_camelot
+            except Exception:
+                pass
+            # Low-level metrics
+            try:
+                low = data.get("lowlevel", {})
+                metrics["dyn_complex"] = low.get("dynamic_complexity")
+                lufs = None
                 try:
-                    hl = data.get("highlevel", {})
-                    mood_energy = hl.get("mood_energy", {})
-                    allvals = mood_energy.get("all", {}) if isinstance(mood_energy, dict) else {}
-                    e_high = allvals.get("high")
-                    if isinstance(e_high, (int, float)):
-                        energy = float(e_high)
+                    ebu = low.get("loudness_ebu128", {})
+                    lufs = ebu.get("integrated")
                 except Exception:
                     pass
+                if lufs is None:
+                    lufs = low.get("loudness")
+                metrics["lufs"] = lufs
+                sc = low.get("spectral_centroid", {})
+                sr = low.get("spectral_rolloff", {})
+                metrics["spec_centroid"] = sc.get("mean") if isinstance(sc, dict) else None
+                metrics["spec_rolloff"] = sr.get("mean") if isinstance(sr, dict) else None
+                rhy = data.get("rhythm", {})
+                metrics["onset_rate"] = rhy.get("onset_rate")
+                if isinstance(rhy.get("beats_position"), list):
+                    beats = rhy["beats_position"]
+            except Exception:
+                pass
+            # Highlevel mood/energy (0..1)
+            try:
+                hl = data.get("highlevel", {})
+                mood_energy = hl.get("mood_energy", {})
+                allvals = mood_energy.get("all", {}) if isinstance(mood_energy, dict) else {}
+                e_high = allvals.get("high")
+                if isinstance(e_high, (int, float)):
+                    energy = float(e_high)
+            except Exception:
+                pass
 
-            except subprocess.CalledProcessError as e:
-                try:
-                    LOGS_DIR.mkdir(parents=True, exist_ok=True)
-                    (LOGS_DIR / "essentia_cli_last.stderr").write_bytes(e.stderr or b"")
-                    (LOGS_DIR / "essentia_cli_last.stdout").write_bytes(e.stdout or b"")
-                except Exception:
-                    pass
-            finally:
-                # Cleanup temp dir if used
-                if td and not debug_mode:
-                    shutil.rmtree(td, ignore_errors=True)
-
-        # Apply BPM correction into target range
-        bpm_corr_val, corr_factor = bpm_correct_into_range(bpm, *target_bpm_range)
-
-        # If no direct energy from highlevel, compute a rough score from metrics
-        if energy is None:
-            energy = energy_score_from_metrics({k: v for k, v in metrics.items() if isinstance(v, (int, float))})
-
-        payload = {
-            "algo_version": ALGO_VERSION,
-            "config_hash": ch,
-            "bpm": bpm_corr_val,
-            "bpm_conf": bpm_conf,
-            "bpm_corr": corr_factor,
-            "key_camelot": key_camelot,
-            "key_strength": key_strength,
-            "lufs": metrics.get("lufs"),
-            "dyn_complex": metrics.get("dyn_complex"),
-            "onset_rate": metrics.get("onset_rate"),
-            "spec_centroid": metrics.get("spec_centroid"),
-            "spec_rolloff": metrics.get("spec_rolloff"),
-            "zero_crossing_rate": metrics.get("zero_crossing_rate"),
-            "danceability": metrics.get("danceability"),
-            "chords_changes_rate": metrics.get("chords_changes_rate"),
-            "tuning_diatonic_strength": metrics.get("tuning_diatonic_strength"),
-            "energy": energy,
-            "energy_var": metrics.get("energy_var"),
-            "analyzed_at": datetime.utcnow().isoformat(),
-            "source": src,
-            "extras": {"notes": "with genre features"},
-        }
-        
-        # Add MFCC coefficients
-        for i in range(13):
-            mfcc_key = f"mfcc_{i}"
-            if mfcc_key in metrics:
-                payload[mfcc_key] = metrics[mfcc_key]
-        
-        # Add MFCC statistics
-        mfcc_stat_keys = [f"mfcc_std_{i}" for i in range(13)] + ["mfcc_kurtosis_mean", "mfcc_skew_mean"]
-        for key in mfcc_stat_keys:
-            if key in metrics:
-                payload[key] = metrics[key]
-        
-        # Add chroma features
-        for i in range(12):
-            chroma_key = f"chroma_{i}"
-            if chroma_key in metrics:
-                payload[chroma_key] = metrics[chroma_key]
-        
-        # Add chroma statistics
-        chroma_stat_keys = [f"chroma_std_{i}" for i in range(12)] + ["chroma_kurtosis_mean"]
-        for key in chroma_stat_keys:
-            if key in metrics:
-                payload[key] = metrics[key]
-        
-        # Add additional spectral features
-        spectral_keys = [
-            "spec_centroid_std", "spec_rolloff_std", "spec_bandwidth_mean", "spec_bandwidth_std",
-            "spec_contrast_mean", "spec_contrast_std", "tonnetz_mean", "tonnetz_std",
-            "spec_flux_mean", "spec_flux_std", "spec_flatness_mean", "spec_flatness_std",
-            "hfc_mean", "hfc_std"
-        ]
-        for key in spectral_keys:
-            if key in metrics:
-                payload[key] = metrics[key]
+        finally:
+            # Cleanup temp dir if used
+            if td is not None:
+                shutil.rmtree(td, ignore_errors=True)
+
+    grid = build_grid(beats, strength) if beats and "rhythm" in stale else None
+    if grid is not None:
+        metrics["tempo_drift"] = grid["tempo_drift"]
 
+    # Apply BPM correction into target range
+    bpm_corr_val, corr_factor = bpm_correct_into_range(bpm, *target_bpm_range)
+
+    # If no direct energy from highlevel, compute a rough score from metrics
+    if energy is None:
+        energy = energy_score_from_metrics({k: v for k, v in metrics.items() if isinstance(v, (int, float))})
+
+    payload = {
+        "algo_version": ALGO_VERSION,
+        "config_hash": ch,
+        "bpm": bpm_corr_val,
+        "bpm_conf": bpm_conf,
+        "bpm_corr": corr_factor,
+        "key_camelot": key_camelot,
+        "key_strength": key_strength,
+        "lufs": metrics.get("lufs"),
+        "dyn_complex": metrics.get("dyn_complex"),
+        "onset_rate": metrics.get("onset_rate"),
+        "spec_centroid": metrics.get("spec_centroid"),
+        "spec_rolloff": metrics.get("spec_rolloff"),
+        "zero_crossing_rate": metrics.get("zero_crossing_rate"),
+        "danceability": metrics.get("danceability"),
+        "tempo_drift": metrics.get("tempo_drift"),
+        "chords_changes_rate": metrics.get("chords_changes_rate"),
+        "tuning_diatonic_strength": metrics.get("tuning_diatonic_strength"),
+        "energy": energy,
+        "energy_var": metrics.get("energy_var"),
+        "analyzed_at": datetime.utcnow().isoformat(),
+        "source": src,
+        "extras": {"notes": "with genre features"},
+    }
+    
+    # Add MFCC coefficients
+    for i in range(13):
+        mfcc_key = f"mfcc_{i}"
+        if mfcc_key in metrics:
+            payload[mfcc_key] = metrics[mfcc_key]
+    
+    # Add MFCC statistics
+    mfcc_stat_keys = [f"mfcc_std_{i}" for i in range(13)] + ["mfcc_kurtosis_mean", "mfcc_skew_mean"]
+    for key in mfcc_stat_keys:
+        if key in metrics:
+            payload[key] = metrics[key]
+    
+    # Add chroma features
+    for i in range(12):
+        chroma_key = f"chroma_{i}"
+        if chroma_key in metrics:
+            payload[chroma_key] = metrics[chroma_key]
+    
+    # Add chroma statistics
+    chroma_stat_keys = [f"chroma_std_{i}" for i in range(12)] + ["chroma_kurtosis_mean"]
+    for key in chroma_stat_keys:
+        if key in metrics:
+            payload[key] = metrics[key]
+    
+    # Add additional spectral features
+    spectral_keys = [
+        "spec_centroid_std", "spec_rolloff_std", "spec_bandwidth_mean", "spec_bandwidth_std",
+        "spec_contrast_mean", "spec_contrast_std", "tonnetz_mean", "tonnetz_std",
+        "spec_flux_mean", "spec_flux_std", "spec_flatness_mean", "spec_flatness_std",
+        "hfc_mean", "hfc_std"
+    ]
+    for key in spectral_keys:
+        if key in metrics:
+            payload[key] = metrics[key]
+
+    if stream_blocks is not None:
+        payload["extras"]["stream_blocks"] = stream_blocks
+    if grid is not None:
+        # written to the beatgrids side table by CacheStore.upsert_many
+        payload[BEATGRID_KEY] = encode_grid(grid)
+
+    payload = merge_fresh(cached, payload, stale)
+    return file_hash, aid, payload, False
+
+
+def _preview_file(
+    p: Path,
+    file_hash: str,
+    aid: str,
+    cached: Optional[Dict[str, Any]],
+    ch: str,
+    target_bpm_range: Tuple[int, int],
+    recompute: bool,
+) -> Tuple[str, str, Dict[str, Any], bool]:
+    """Provisional BPM/key from a few windows (``analyze-audio --preview``).
+
+    Never replaces a full analysis; ``recompute`` only refreshes an earlier preview.
+    """
+    if cached and (not is_provisional(cached) or (not recompute and cached.get("config_hash") == ch)):
+        return file_hash, aid, cached, True
+    _, es = _try_import_essentia()
+    if es is None:
+        raise RuntimeError("Preview analysis needs Essentia Python bindings")
+    res = extract_preview(str(p), es)
+    bpm_corr_val, corr_factor = bpm_correct_into_range(res.get("bpm"), *target_bpm_range)
+    key_raw = res.get("key_raw") or ""
+    payload = {
+        "algo_version": ALGO_VERSION,
+        "config_hash": ch,
+        "bpm": bpm_corr_val,
+        "bpm_corr": corr_factor,
+        "key_camelot": _to_camelot(key_raw) if key_raw else None,
+        "key_strength": res.get("key_strength"),
+        "analyzed_at": datetime.utcnow().isoformat(),
+        "source": "essentia-preview",
+        "extras": {PROVISIONAL_KEY: True, "preview_windows": res.get("windows")},
+    }
+    return file_hash, aid, payload, False
+
+
+def analyze(
+    path: Path | str,
+    *,
+    target_bpm_range: Tuple[int, int] = (80, 180),
+    recompute: bool = False,
+    config: Optional[Dict[str, Any]] = None,
+    preview: bool = False,
+) -> Dict[str, Any]:
+    """Analyze one audio file and return a dictionary with detected metrics.
+
+    Returns empty metrics if Essentia is unavailable.
+    """
+    try:
+        init_db()
+        file_hash, aid, payload, from_cache = _analyze_file(
+            Path(path), target_bpm_range=target_bpm_range, recompute=recompute, config=config, preview=preview
+        )
+        record_alias(file_hash, aid)
+        if from_cache:
+            return payload
         upsert_analysis(aid, payload)
         result = dict(payload)
+        result.pop(BEATGRID_KEY, None)
         result["audio_id"] = aid
         return result
     except Exception as e:
-        # Log any exception in analyze
+        _log_exception(e)
+        # Return empty result to avoid crashing CLI
+        return {}
+
+
+def _log_exception(e: BaseException) -> None:
+    try:
+        LOGS_DIR.mkdir(parents=True, exist_ok=True)
+        (LOGS_DIR / "analyze_exception.txt").write_text(str(e), encoding="utf-8")
+    except Exception:
+        pass
+
+
+# ---------------------------
+# Batch analysis (supervised worker processes + single writer)
+# ---------------------------
+
+def _uses_external_extractor(preview: bool = False) -> bool:
+    """True when analysis runs the extractor binary/Docker instead of Python bindings."""
+    if preview or _try_import_essentia()[1] is not None:
+        return False
+    if _find_extractor_binary() or os.getenv(WORKER_CMD_ENV):
+        return True
+    return bool(shutil.which("docker")) and os.getenv("DJLIB_ESSENTIA_DOCKER", "0").strip() in {"1", "true", "yes"}
+
+
+def _pool_init() -> None:
+    """Worker initializer: build the MusicExtractor once per process."""
+    _, es = _try_import_essentia()
+    if es is not None:
         try:
-            LOGS_DIR.mkdir(parents=True, exist_ok=True)
-            (LOGS_DIR / "analyze_exception.txt").write_text(str(e), encoding="utf-8")
+            _get_extractor(es)
         except Exception:
             pass
-        # Return empty result to avoid crashing CLI
-        return {}
+
+
+def _pool_task(item: Tuple[str, Dict[str, Any]]) -> Tuple[str, str, str, Dict[str, Any], bool, str]:
+    """Run in a worker: ``(path, file_hash, audio_id, payload, from_cache, error)``."""
+    path, kwargs = item
+    try:
+        file_hash, aid, payload, from_cache = _analyze_file(Path(path), **kwargs)
+        return path, file_hash, aid, payload, from_cache, ""
+    except Exception as e:
+        return path, "", "", {}, False, str(e) or e.__class__.__name__
+
+
+def analyze_many(
+    paths: Iterable[Path | str],
+    *,
+    workers: int = 1,
+    target_bpm_range: Tuple[int, int] = (80, 180),
+    recompute: bool = False,
+    config: Optional[Dict[str, Any]] = None,
+    preview: bool = False,
+    batch_size: int = 32,
+    cli_timeout: Optional[float] = None,
+    stream_above: Optional[float] = None,
+    isolate: Optional[bool] = None,
+    mem_limit_mb: Optional[int] = None,
+    max_crashes: int = DEFAULT_MAX_CRASHES,
+    retry_quarantined: bool = False,
+    on_result: Optional[Callable[[str, str, Dict[str, int]], None]] = None,
+) -> Dict[str, int]:
+    """Analyze many files in ``workers`` supervised child processes.
+
+    Workers only compute (each builds its extractor once); this process is the
+    single writer and upserts results into the cache in batches of
+    ``batch_size``. ``on_result(path, error, stats)`` is called after each file.
+
+    With Python bindings (or ``workers > 1``) analysis runs in children of
+    ``djlib.audio.supervisor.supervise`` (``isolate``): each has an ``RLIMIT_AS``
+    of ``mem_limit_mb``, a child that dies mid-file (decoder segfault) is
+    replaced and the file is counted in ``crashed``; after ``max_crashes``
+    crashes a file is quarantined and skipped by later runs (``skipped``)
+    unless ``retry_quarantined``. Files longer than ``stream_above`` seconds
+    (default ``$DJLIB_STREAM_MIN_SECONDS`` or 20 min) use bounded-memory
+    streaming analysis.
+
+    Without Python bindings (external extractor binary/Docker) the pool is made
+    of threads, each waiting on at most one extractor process, so at most
+    ``workers`` extractors run at once; a run longer than ``cli_timeout`` seconds
+    is killed and counted as an error. With a persistent worker
+    (``djlib.audio.worker_client``) the threads send jobs to one long-running
+    container/process instead of starting one per file.
+    """
+    init_db()
+    store = get_store()
+    kwargs = {
+        "target_bpm_range": tuple(target_bpm_range), "recompute": recompute, "config": config, "preview": preview,
+        "cli_timeout": cli_timeout, "stream_above": stream_above,
+    }
+    external = _uses_external_extractor(preview)
+    if isolate is None:
+        isolate = not external and (workers > 1 or _try_import_essentia()[1] is not None)
+    quarantine = Quarantine(max_crashes=max_crashes)
+    items = []
+    skipped = 0
+    for p in paths:
+        if retry_quarantined:
+            quarantine.clear(str(p))
+        elif quarantine.is_quarantined(str(p)):
+            skipped += 1
+            continue
+        items.append((str(p), kwargs))
+    stats = {
+        "total": len(items) + skipped, "processed": 0, "analyzed": 0, "cached": 0, "errors": 0,
+        "crashed": 0, "restarts": 0, "quarantined": 0, "skipped": skipped,
+    }
+    rows: list[Tuple[str, Dict[str, Any]]] = []
+    aliases: list[Tuple[str, str]] = []
+
+    def _flush() -> None:
+        if aliases:
+            store.record_aliases(aliases)
+            aliases.clear()
+        if rows:
+            store.upsert_many(rows)
+            rows.clear()
+
+    def _results() -> Iterator[Tuple[str, str, str, Dict[str, Any], bool, str]]:
+        if isolate:
+            yield from supervise(
+                items, _pool_task, workers=workers, init=_pool_init, mem_limit_mb=mem_limit_mb,
+                quarantine=quarantine, stats=stats, crash_result=lambda path, err: (path, "", "", {}, False, err),
+            )
+            return
+        if workers <= 1 or len(items) <= 1:
+            yield from map(_pool_task, items)
+            return
+        # external extractor: the persistent worker (if configured) runs up to ``workers`` extractors at once
+        get_worker(jobs=workers, allow_docker=not _find_extractor_binary())
+        with ThreadPoolExecutor(max_workers=workers) as tex:
+            for fut in as_completed([tex.submit(_pool_task, it) for it in items]):
+                yield fut.result()
+
+    try:
+        for path, file_hash, aid, payload, from_cache, err in _results():
+            stats["processed"] += 1
+            if err:
+                stats["errors"] += 1
+                _log_exception(RuntimeError(f"{path}: {err}"))
+            else:
+                quarantine.clear(path)
+                aliases.append((file_hash, aid))
+                if from_cache:
+                    stats["cached"] += 1
+                else:
+                    rows.append((aid, payload))
+                    stats["analyzed"] += 1
+                if len(rows) >= batch_size:
+                    _flush()
+            if on_result is not None:
+                on_result(path, err, stats)
+    finally:
+        _flush()
+        quarantine.save()
+    return stats
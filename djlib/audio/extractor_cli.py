@@ -0,0 +1,118 @@
+"""Uruchamianie zewnętrznego ekstraktora Essentii (binarka albo Docker) z limitem czasu.
+
+Każdy plik to osobny proces ``streaming_extractor_music``; uszkodzony plik potrafi
+go zawiesić, więc proces dostaje ``timeout`` (domyślnie ``DEFAULT_TIMEOUT`` s,
+``$DJLIB_ESSENTIA_TIMEOUT``), a po jego przekroczeniu jest zabijany razem z całą
+grupą procesów (dla Dockera dodatkowo ``docker kill`` kontenera).
+
+``features.json`` trafia do katalogu tymczasowego w ``scratch_root()`` – na
+tmpfs (``/dev/shm``), jeśli jest dostępny – i znika po sparsowaniu. Do LOGS
+(``essentia_cli_failed/<audio_id>.*``) zapisujemy stdout/stderr/wyjście tylko
+przy błędzie – osobno dla każdego pliku, bo ekstraktory działają równolegle.
+"""
+
+from __future__ import annotations
+
+import os
+import shutil
+import signal
+import subprocess
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional
+
+from djlib.config import LOGS_DIR
+
+DEFAULT_TIMEOUT = 300.0
+TIMEOUT_ENV = "DJLIB_ESSENTIA_TIMEOUT"
+SCRATCH_ENV = "DJLIB_ESSENTIA_SCRATCH"
+_SHM_DIRS = ("/dev/shm", "/run/shm")
+
+
+@dataclass
+class ExtractorRun:
+    returncode: Optional[int]
+    stdout: bytes = b""
+    stderr: bytes = b""
+    timed_out: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return not self.timed_out and self.returncode == 0
+
+
+def default_timeout() -> float:
+    try:
+        return float(os.getenv(TIMEOUT_ENV, "") or DEFAULT_TIMEOUT)
+    except ValueError:
+        return DEFAULT_TIMEOUT
+
+
+def scratch_root() -> Optional[str]:
+    """Katalog na wyjście ekstraktora: ``$DJLIB_ESSENTIA_SCRATCH``, tmpfs albo ``None`` (domyślny tmp)."""
+    env = os.getenv(SCRATCH_ENV, "").strip()
+    candidates = [env] if env else list(_SHM_DIRS)
+    for d in candidates:
+        if d and os.path.isdir(d) and os.access(d, os.W_OK | os.X_OK):
+            return d
+    return None
+
+
+def make_scratch_dir() -> Path:
+    return Path(tempfile.mkdtemp(prefix="djlib-ess-", dir=scratch_root()))
+
+
+def docker_command(docker: str, image: str, src: Path, out_dir: Path, name: str) -> List[str]:
+    return [
+        docker, "run", "--rm", "--name", name,
+        "-v", f"{src}:/in/{src.name}:ro",
+        "-v", f"{out_dir}:/out",
+        image, f"/in/{src.name}", "/out/features.json",
+    ]
+
+
+def _kill(proc: subprocess.Popen, container: Optional[str]) -> None:
+    if container:
+        docker = shutil.which("docker") or "docker"
+        subprocess.run([docker, "kill", container], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                       check=False, timeout=30)
+    try:
+        if os.name == "posix":
+            os.killpg(proc.pid, signal.SIGKILL)
+        else:
+            proc.kill()
+    except (ProcessLookupError, PermissionError, OSError):
+        proc.kill()
+
+
+def run_extractor(cmd: List[str], timeout: Optional[float] = None, container: Optional[str] = None) -> ExtractorRun:
+    """Uruchom ``cmd``; po ``timeout`` s zabij go (z procesami potomnymi) i zwróć ``timed_out``."""
+    proc = subprocess.Popen(
+        cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.DEVNULL,
+        start_new_session=(os.name == "posix"),
+    )
+    try:
+        out, err = proc.communicate(timeout=timeout if timeout and timeout > 0 else None)
+        return ExtractorRun(proc.returncode, out or b"", err or b"")
+    except subprocess.TimeoutExpired:
+        _kill(proc, container)
+        out, err = proc.communicate()
+        return ExtractorRun(proc.returncode, out or b"", err or b"", timed_out=True)
+
+
+def failure_dir() -> Path:
+    return LOGS_DIR / "essentia_cli_failed"
+
+
+def log_failure(name: str, run: ExtractorRun, raw_output: Optional[str] = None) -> None:
+    """Zapisz stdout/stderr (i surowe wyjście, jeśli jest) nieudanego uruchomienia do LOGS."""
+    try:
+        d = failure_dir()
+        d.mkdir(parents=True, exist_ok=True)
+        (d / f"{name}.stdout").write_bytes(run.stdout)
+        (d / f"{name}.stderr").write_bytes(run.stderr)
+        if raw_output is not None:
+            (d / f"{name}.output.json").write_text(raw_output, encoding="utf-8")
+    except Exception:
+        pass
@@ -34,6 +34,18 @@ def config_hash(config: Dict) -> str:
     return hashlib.sha1(payload.encode("utf-8")).hexdigest()  # nosec: B303
 
 
+def analysis_config(target_bpm_range: Tuple[int, int], profile: str = "full") -> Dict:
+    """Config passed to ``analyze`` (and hashed into ``config_hash``).
+
+    The default "full" profile keeps the historical shape, so existing cache
+    entries stay valid; other profiles are recorded in the hash.
+    """
+    cfg: Dict = {"target_bpm": list(target_bpm_range)}
+    if profile and profile != "full":
+        cfg["profile"] = profile
+    return cfg
+
+
 def energy_score_from_metrics(metrics: Dict[str, float] | None, weights: Dict[str, float] | None = None) -> float | None:
     """Combine normalized metrics into a single energy score [0..1].
     This is a placeholder; real implementation will include per‑library calibration.
@@ -0,0 +1,265 @@
+"""Profil analizy "lean": jedno dekodowanie, tylko zapisywane deskryptory.
+
+``MusicExtractor`` liczy setki deskryptorów (i dekoduje plik kilka razy w
+różnych częstotliwościach próbkowania), z których zapisujemy kilkadziesiąt.
+Profil lean dekoduje plik raz do mono float32 (``SAMPLE_RATE``) i ten sam bufor
+podaje tylko algorytmom, których wyniki trafiają do cache:
+
+- rytm: ``RhythmExtractor2013`` (BPM, pozycje beatów), ``BeatsLoudness``, ``OnsetRate``, ``Danceability``,
+- tonacja: ``KeyExtractor`` (profil edma), ``ChordsDetection``/``ChordsDescriptors``,
+- głośność: ``LoudnessEBUR128`` (integrated), ``DynamicComplexity``,
+- jedna pętla po ramkach: MFCC, HPCP (chroma) i statystyki widma.
+
+Liczone są tylko grupy z ``groups`` (zob. ``djlib.audio.descriptors``).
+Wartości są zbliżone, ale nie identyczne z pełnym ekstraktorem (inne ramki i
+statystyki) – profil jest częścią ``config_hash``, więc wpisy obu profili się
+nie mieszają. Porównanie: ``scripts/bench_analysis_profiles.py``.
+"""
+
+from __future__ import annotations
+
+import shutil
+import subprocess
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from .aggregate import CHROMA_BINS, MFCC_COEFFS, aggregate_matrix, aggregate_series
+from .beatgrid import beat_strength
+
+PROFILE_FULL = "full"
+PROFILE_LEAN = "lean"
+PROFILES = (PROFILE_FULL, PROFILE_LEAN)
+
+SAMPLE_RATE = 44100
+FRAME_SIZE = 2048
+HOP_SIZE = 1024
+
+_FRAME_GROUPS = {"mfcc", "chroma", "spectral", "tonal", "loudness"}
+
+# Podgląd (analyze-audio --preview): okna po PREVIEW_SECONDS s wokół tych miejsc utworu
+PREVIEW_POSITIONS = (0.25, 0.5, 0.75)
+PREVIEW_SECONDS = 30.0
+
+
+SPECTRAL_SERIES = ("centroid", "rolloff", "zcr", "contrast", "flux", "flatness", "hfc")
+_SERIES = SPECTRAL_SERIES + ("energy",)
+
+
+def frame_algorithms(es: Any, sr: int = SAMPLE_RATE) -> Dict[str, Any]:
+    """Algorytmy ramkowe (tworzone raz, używane dla wielu buforów)."""
+    return {
+        "window": es.Windowing(type="blackmanharris62"),
+        "spectrum": es.Spectrum(),
+        "mfcc": es.MFCC(),
+        "peaks": es.SpectralPeaks(orderBy="magnitude", magnitudeThreshold=1e-5, minFrequency=20,
+                                  maxFrequency=3500, maxPeaks=60, sampleRate=sr),
+        "hpcp": es.HPCP(sampleRate=sr),
+        "centroid": es.Centroid(range=sr / 2),
+        "rolloff": es.RollOff(sampleRate=sr),
+        "zcr": es.ZeroCrossingRate(),
+        "flux": es.Flux(),
+        "flatness": es.FlatnessDB(),
+        "hfc": es.HFC(sampleRate=sr),
+        "contrast": es.SpectralContrast(frameSize=FRAME_SIZE, sampleRate=sr),
+        "energy": es.Energy(),
+        "frames": es.FrameGenerator,
+    }
+
+
+def frame_features(
+    audio: np.ndarray, algos: Dict[str, Any], groups: Iterable[str]
+) -> tuple[Optional[np.ndarray], Optional[np.ndarray], Dict[str, np.ndarray]]:
+    """Jedna pętla po ramkach bufora: ``(mfcc n×13 | None, hpcp n×12 | None, serie skalarne)``."""
+    groups = set(groups)
+    need_mfcc = "mfcc" in groups
+    need_hpcp = bool(groups & {"chroma", "tonal"})
+    need_spectral = "spectral" in groups
+    need_energy = "loudness" in groups
+    window, spectrum = algos["window"], algos["spectrum"]
+    mfcc_frames: List[np.ndarray] = []
+    hpcp_frames: List[np.ndarray] = []
+    series: Dict[str, List[float]] = {k: [] for k in _SERIES}
+    for frame in algos["frames"](audio, frameSize=FRAME_SIZE, hopSize=HOP_SIZE, startFromZero=True):
+        spec = spectrum(window(frame))
+        if need_energy:
+            series["energy"].append(float(algos["energy"](spec)))
+        if need_mfcc:
+            mfcc_frames.append(np.asarray(algos["mfcc"](spec)[1], dtype=np.float32))
+        if need_hpcp:
+            freqs, mags = algos["peaks"](spec)
+            hpcp_frames.append(np.asarray(algos["hpcp"](freqs, mags), dtype=np.float32))
+        if need_spectral:
+            series["centroid"].append(float(algos["centroid"](spec)))
+            series["rolloff"].append(float(algos["rolloff"](spec)))
+            series["zcr"].append(float(algos["zcr"](frame)))
+            series["flux"].append(float(algos["flux"](spec)))
+            series["flatness"].append(float(algos["flatness"](spec)))
+            series["hfc"].append(float(algos["hfc"](spec)))
+            series["contrast"].append(float(np.mean(algos["contrast"](spec)[0])))
+    return (
+        np.vstack(mfcc_frames) if mfcc_frames else None,
+        np.vstack(hpcp_frames) if hpcp_frames else None,
+        {k: np.asarray(v, dtype=np.float64) for k, v in series.items()},
+    )
+
+
+def spectral_metrics(agg: Dict[str, float]) -> Dict[str, float]:
+    """Klucze payloadu z ``{seria}_mean``/``{seria}_std`` serii ``SPECTRAL_SERIES``."""
+    out = {
+        "spec_centroid": agg["centroid_mean"],
+        "spec_rolloff": agg["rolloff_mean"],
+        "zero_crossing_rate": agg["zcr_mean"],
+        "spec_centroid_std": agg["centroid_std"],
+        "spec_rolloff_std": agg["rolloff_std"],
+        # jak w pełnym profilu: "bandwidth" to przybliżenie centroidem
+        "spec_bandwidth_mean": agg["centroid_mean"],
+        "spec_bandwidth_std": agg["centroid_std"],
+    }
+    for name, key in (("contrast", "spec_contrast"), ("flux", "spec_flux"), ("flatness", "spec_flatness"),
+                      ("hfc", "hfc")):
+        if f"{name}_mean" in agg:
+            out[f"{key}_mean"] = agg[f"{name}_mean"]
+            out[f"{key}_std"] = agg[f"{name}_std"]
+    return out
+
+
+def extract_lean(path: str, es: Any, groups: Iterable[str]) -> Dict[str, Any]:
+    """Policz deskryptory grup ``groups``; ``es`` to ``essentia.standard``.
+
+    Zwraca klucze jak w payloadzie ``analyze`` (``bpm``, ``key_raw``,
+    ``key_strength``, ``energy`` i metryki), bez korekty BPM i mapowania Camelot.
+    """
+    groups = set(groups)
+    sr = SAMPLE_RATE
+    audio = es.MonoLoader(filename=str(path), sampleRate=sr)()
+    out: Dict[str, Any] = {}
+
+    if "rhythm" in groups:
+        bpm, ticks, _conf, _est, _intervals = es.RhythmExtractor2013(method="multifeature")(audio)
+        out["bpm"] = float(bpm)
+        out["beats"] = [float(t) for t in ticks]
+        out["beat_strength"] = beat_strength(es, audio, out["beats"], sr)
+        out["onset_rate"] = float(es.OnsetRate()(audio)[1])
+        out["danceability"] = float(es.Danceability(sampleRate=sr)(audio)[0])
+
+    key = scale = ""
+    if "tonal" in groups:
+        key, scale, strength = es.KeyExtractor(profileType="edma", sampleRate=sr)(audio)
+        out["key_raw"] = f"{key} {scale}".strip()
+        out["key_strength"] = float(strength)
+
+    if "loudness" in groups:
+        stereo = es.StereoMuxer()(audio, audio)
+        out["lufs"] = float(es.LoudnessEBUR128(sampleRate=sr)(stereo)[2])
+        out["dyn_complex"] = float(es.DynamicComplexity(sampleRate=sr)(audio)[0])
+
+    if not groups & _FRAME_GROUPS:
+        return out
+
+    mfcc_frames, hpcp_frames, series = frame_features(audio, frame_algorithms(es, sr), groups)
+
+    if series["energy"].size:
+        out["energy"] = float(np.mean(series["energy"]))
+
+    if mfcc_frames is not None:
+        out.update(aggregate_matrix("mfcc", mfcc_frames, MFCC_COEFFS))
+
+    if hpcp_frames is not None:
+        h = hpcp_frames
+        if "chroma" in groups:
+            out.update(aggregate_matrix("chroma", h, CHROMA_BINS, skew=False))
+        if "tonal" in groups:
+            out["tuning_diatonic_strength"] = float(
+                es.Key(profileType="diatonic")(h.mean(axis=0).astype(np.float32))[2]
+            )
+            chords, _strength = es.ChordsDetection(hopSize=HOP_SIZE, sampleRate=sr)(h)
+            if key:
+                out["chords_changes_rate"] = float(es.ChordsDescriptors()(chords, key, scale)[2])
+
+    if "spectral" in groups and series["centroid"].size:
+        out.update(spectral_metrics(aggregate_series({k: series[k] for k in SPECTRAL_SERIES})))
+    return out
+
+
+def _duration(path: str) -> float:
+    try:
+        from mutagen import File as MutFile  # type: ignore
+
+        info = getattr(MutFile(path), "info", None)
+        return float(getattr(info, "length", 0.0) or 0.0)
+    except Exception:
+        return 0.0
+
+
+def preview_windows(duration: float, positions: Sequence[float] = PREVIEW_POSITIONS,
+                    seconds: float = PREVIEW_SECONDS) -> List[tuple[float, float]]:
+    """``[(start, długość)]`` okien podglądu; krótki utwór (albo nieznana długość) = całość."""
+    if duration <= 0 or duration <= seconds * len(positions):
+        return [(0.0, duration if duration > 0 else 0.0)]
+    out = []
+    for pos in positions:
+        start = min(max(0.0, duration * pos - seconds / 2), duration - seconds)
+        out.append((round(start, 3), seconds))
+    return out
+
+
+def _decode_window(path: str, start: float, length: float) -> Optional[np.ndarray]:
+    """Zdekoduj tylko fragment: ffmpeg z ``-ss`` przed ``-i`` (seek bez dekodowania początku).
+
+    ``None`` bez ffmpeg albo gdy ffmpeg nie zdekodował pliku.
+    """
+    ffmpeg = shutil.which("ffmpeg")
+    if not ffmpeg:
+        return None
+    cmd = [ffmpeg, "-v", "error", "-nostdin", "-ss", f"{start:.3f}"]
+    if length > 0:
+        cmd += ["-t", f"{length:.3f}"]
+    cmd += ["-i", path, "-f", "f32le", "-ac", "1", "-ar", str(SAMPLE_RATE), "-"]
+    proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False)
+    if proc.returncode == 0 and proc.stdout:
+        return np.frombuffer(proc.stdout, dtype=np.float32)
+    return None
+
+
+def _decode_windows(path: str, es: Any, windows: Sequence[tuple[float, float]]) -> List[np.ndarray]:
+    """Okna ``[(start, długość)]``: ffmpeg per okno, a bez niego jeden ``MonoLoader`` i wycinki.
+
+    ``EasyLoader`` z zakresem czasu dekoduje plik od początku do końca okna, więc
+    kilka okien kosztowałoby kilka dekodowań – tu plik jest dekodowany najwyżej raz.
+    """
+    out: List[np.ndarray] = []
+    full: Optional[np.ndarray] = None
+    for start, length in windows:
+        chunk = _decode_window(path, start, length)
+        if chunk is None:
+            if full is None:
+                full = np.asarray(es.MonoLoader(filename=path, sampleRate=SAMPLE_RATE)(), dtype=np.float32)
+            lo = int(start * SAMPLE_RATE)
+            chunk = full[lo:lo + int(length * SAMPLE_RATE)] if length > 0 else full[lo:]
+        out.append(np.ascontiguousarray(chunk, dtype=np.float32))
+    return out
+
+
+def extract_preview(path: str, es: Any) -> Dict[str, Any]:
+    """BPM i tonacja z kilku okien utworu (``preview_windows``) zamiast całego pliku.
+
+    BPM: mediana z okien (każde osobno – bez sklejeń na granicach), tonacja:
+    ``KeyExtractor`` na połączonych oknach. Zwraca ``bpm``, ``key_raw``,
+    ``key_strength`` i ``windows``.
+    """
+    windows = preview_windows(_duration(str(path)))
+    chunks = [c for c in _decode_windows(str(path), es, windows) if c.size]
+    if not chunks:
+        return {}
+    rhythm = es.RhythmExtractor2013(method="multifeature")
+    bpms = [float(rhythm(c)[0]) for c in chunks if c.size >= SAMPLE_RATE * 5]
+    key, scale, strength = es.KeyExtractor(profileType="edma", sampleRate=SAMPLE_RATE)(np.concatenate(chunks))
+    out: Dict[str, Any] = {
+        "key_raw": f"{key} {scale}".strip(),
+        "key_strength": float(strength),
+        "windows": [[s, l] for s, l in windows],
+    }
+    if bpms:
+        out["bpm"] = float(np.median(bpms))
+    return out
@@ -0,0 +1,158 @@
+"""Snapshot macierzy cech audio (``.npy``) dla ML i wyszukiwania podobieństw.
+
+Obok ``LOGS/audio_analysis.sqlite`` leżą:
+
+- ``audio_features.<seq>-<tag>.npy`` – macierz float32 ``n_tracks × n_features``
+  (NaN = brak); każdy zapis tworzy nowy plik,
+- ``audio_features.index.json`` – ``matrix`` (nazwa bieżącego pliku ``.npy``),
+  ``ids`` (audio_id wierszy), ``features`` (nazwy kolumn) i ``seq`` – numer
+  ostatniej zmiany z dziennika ``feature_changes``, którą snapshot uwzględnia.
+
+``write_snapshot()`` odświeża snapshot przyrostowo: przelicza tylko wiersze
+zmienione od ``seq`` (triggery na ``audio_features``), a całość przebudowuje
+dopiero, gdy zmienił się zestaw kolumn albo zmian jest dużo. Konsument robi::
+
+    ids, names, matrix = load_snapshot()   # np.load(..., mmap_mode="r")
+
+i dostaje widok bez kopiowania. Punktem zatwierdzenia jest jedno ``os.replace``
+indeksu: macierz zapisana jest wcześniej pod nową nazwą, więc czytelnik (albo
+awaria w trakcie) widzi zawsze parę indeks/macierz z tego samego zapisu, a
+otwarty wcześniej mmap wskazuje na stary plik, usuwany dopiero po podmianie.
+Uwzględnione wpisy dziennika ``feature_changes`` są po zapisie usuwane.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from djlib.audio import cache
+
+# Powyżej tej części zmienionych wierszy taniej jest zbudować snapshot od zera.
+FULL_REBUILD_RATIO = 0.5
+_MATRIX_PREFIX = "audio_features."
+LEGACY_MATRIX = "audio_features.npy"  # sprzed wersjonowanych nazw
+
+
+def snapshot_paths() -> Tuple[Path, Path]:
+    """``(bieżący plik .npy, indeks)``."""
+    idx_path = _index_path()
+    return _matrix_path(_read_index(idx_path)), idx_path
+
+
+def _index_path() -> Path:
+    return cache.db_path().parent / "audio_features.index.json"
+
+
+def _matrix_path(index: Optional[Dict[str, Any]]) -> Path:
+    name = Path(str((index or {}).get("matrix") or LEGACY_MATRIX)).name  # tylko pliki obok bazy
+    return cache.db_path().parent / name
+
+
+def _read_index(path: Path) -> Optional[Dict[str, Any]]:
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if not isinstance(data, dict) or not isinstance(data.get("ids"), list):
+        return None
+    return data
+
+
+def _replace(matrix: np.ndarray, ids: List[str], names: List[str], seq: int) -> Path:
+    """Zapisz macierz pod nową nazwą, podmień indeks (jedno ``os.replace``), usuń stare macierze."""
+    idx_path = _index_path()
+    base = idx_path.parent
+    npy_path = base / f"{_MATRIX_PREFIX}{seq}-{os.urandom(4).hex()}.npy"
+    tmp_npy = npy_path.with_name(npy_path.name + ".tmp")
+    with tmp_npy.open("wb") as f:
+        np.save(f, np.ascontiguousarray(matrix, dtype=np.float32))
+    os.replace(tmp_npy, npy_path)
+    tmp_idx = idx_path.with_name(idx_path.name + ".tmp")
+    tmp_idx.write_text(
+        json.dumps({"matrix": npy_path.name, "ids": ids, "features": names, "seq": seq}), encoding="utf-8"
+    )
+    os.replace(tmp_idx, idx_path)
+    for old in [*base.glob(f"{_MATRIX_PREFIX}*.npy"), base / LEGACY_MATRIX]:
+        if old.name != npy_path.name:
+            try:
+                old.unlink(missing_ok=True)
+            except OSError:  # Windows: plik nadal zmapowany przez czytelnika
+                pass
+    return npy_path
+
+
+def write_snapshot(full: bool = False) -> Dict[str, Any]:
+    """Utwórz/odśwież snapshot; zwraca statystyki (``mode``: full/incremental/up-to-date)."""
+    store = cache.get_store()
+    index = None if full else _read_index(_index_path())
+    npy_path = _matrix_path(index)
+    names = store.feature_columns()
+    last, changed = store.feature_changes(int(index["seq"]) if index else 0)
+
+    mode = "incremental"
+    if (
+        index is None
+        or not npy_path.exists()
+        or index.get("features") != names
+        or int(index.get("seq", 0)) > last
+        or len(changed) > FULL_REBUILD_RATIO * max(1, len(index["ids"]))
+    ):
+        mode = "full"
+    elif not changed:
+        store.prune_feature_changes(last)
+        return {"mode": "up-to-date", "rows": len(index["ids"]), "features": len(names), "changed": 0,
+                "path": npy_path}
+
+    if mode == "full":
+        ids, names, matrix = store.feature_matrix(None, names)
+    else:
+        assert index is not None
+        old = np.load(npy_path)
+        ids = list(index["ids"])
+        if old.shape != (len(ids), len(names)):
+            return write_snapshot(full=True)
+        fresh_ids, _, fresh = store.feature_matrix(changed, names)
+        fresh_pos = {aid: i for i, aid in enumerate(fresh_ids)}
+        changed_set = set(changed)
+        keep = [i for i, aid in enumerate(ids) if aid not in changed_set or aid in fresh_pos]
+        pos = {aid: n for n, aid in enumerate(ids[i] for i in keep)}
+        matrix = old[keep]
+        ids = [ids[i] for i in keep]
+        for aid, i in fresh_pos.items():
+            if aid in pos:
+                matrix[pos[aid]] = fresh[i]
+        added = [aid for aid in fresh_ids if aid not in pos]
+        if added:
+            matrix = np.vstack([matrix, fresh[[fresh_pos[a] for a in added]]])
+            ids.extend(added)
+
+    npy_path = _replace(matrix, ids, names, last)
+    store.prune_feature_changes(last)
+    return {"mode": mode, "rows": len(ids), "features": len(names), "changed": len(changed), "path": npy_path}
+
+
+def load_snapshot(mmap_mode: Optional[str] = "r") -> Tuple[List[str], List[str], np.ndarray]:
+    """``(audio_ids, nazwy cech, macierz)``; domyślnie macierz jest zmapowana (bez kopiowania).
+
+    Indeks czytany jest raz, a macierz – z pliku, który on wskazuje; gdy w
+    międzyczasie zapis podmienił snapshot i usunął ten plik, odczyt jest ponawiany.
+    """
+    for _attempt in range(3):
+        index = _read_index(_index_path())
+        npy_path = _matrix_path(index)
+        if index is None:
+            break
+        try:
+            matrix = np.load(npy_path, mmap_mode=mmap_mode)
+        except FileNotFoundError:
+            continue
+        ids = list(index["ids"])
+        if matrix.shape[0] != len(ids):
+            raise ValueError(f"Snapshot cech niespójny: {npy_path} ma {matrix.shape[0]} wierszy, indeks {len(ids)}")
+        return ids, list(index.get("features") or []), matrix
+    raise FileNotFoundError(f"Brak snapshotu cech: {npy_path} (uruchom `features snapshot`)")
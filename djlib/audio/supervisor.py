@@ -0,0 +1,246 @@
+"""Nadzorowane procesy analizy: awaria dekodera nie przerywa całej partii.
+
+Bindingi Essentii działają w procesie, który je wywołał, więc segfault na
+uszkodzonym pliku zabijał całe ``analyze-audio`` (a ``ProcessPoolExecutor`` po
+śmierci jednego workera psuje całą pulę). ``supervise`` uruchamia ``workers``
+procesów potomnych, każdy z limitem pamięci ``RLIMIT_AS`` (``mem_limit_mb``,
+domyślnie ``$DJLIB_ANALYSIS_MEM_MB`` lub ``DEFAULT_MEM_LIMIT_MB``), i podaje im
+pliki po jednym przez ``Pipe``. Gdy proces zginie w trakcie pliku (sygnał,
+``os._exit``, OOM killer), plik dostaje błąd, awaria trafia do kwarantanny, a na
+miejsce procesu startuje nowy. Przekroczenie limitu pamięci w Pythonie to
+zwykły ``MemoryError`` – błąd pliku, bez restartu.
+
+Kwarantanna (``LOGS/audio_quarantine.json``) liczy awarie per ścieżka; plik,
+który wywrócił workera ``max_crashes`` razy, jest pomijany w kolejnych
+uruchomieniach, dopóki się nie zmieni (rozmiar/mtime) albo nie użyjesz
+``analyze-audio --retry-quarantined``.
+"""
+
+from __future__ import annotations
+
+import json
+import multiprocessing as mp
+import os
+import signal
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from multiprocessing.connection import wait as mp_wait
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from djlib.config import LOGS_DIR
+
+try:
+    import resource  # type: ignore
+except ImportError:  # Windows: brak RLIMIT_AS, procesy działają bez limitu
+    resource = None  # type: ignore
+
+DEFAULT_MAX_CRASHES = 2
+DEFAULT_MEM_LIMIT_MB = 4096
+MEM_ENV = "DJLIB_ANALYSIS_MEM_MB"
+
+
+def default_mem_limit_mb() -> int:
+    try:
+        return int(os.getenv(MEM_ENV, "") or DEFAULT_MEM_LIMIT_MB)
+    except ValueError:
+        return DEFAULT_MEM_LIMIT_MB
+
+
+def set_memory_limit(mb: int) -> bool:
+    """Ustaw ``RLIMIT_AS`` bieżącego procesu (``mb <= 0`` = bez limitu); ``False``, gdy się nie da."""
+    if mb <= 0 or resource is None or not hasattr(resource, "RLIMIT_AS"):
+        return False
+    limit = int(mb) * 1024 * 1024
+    try:
+        _soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+        if hard != resource.RLIM_INFINITY:
+            limit = min(limit, hard)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+        return True
+    except (ValueError, OSError):
+        return False
+
+
+def describe_exit(code: Optional[int]) -> str:
+    if code is not None and code < 0:
+        try:
+            return f"killed by {signal.Signals(-code).name}"
+        except ValueError:
+            return f"killed by signal {-code}"
+    return f"exit code {code}"
+
+
+class Quarantine:
+    """Licznik awarii workera per plik (``LOGS/audio_quarantine.json``)."""
+
+    def __init__(self, path: Optional[Path] = None, max_crashes: int = DEFAULT_MAX_CRASHES) -> None:
+        self.path = path or (LOGS_DIR / "audio_quarantine.json")
+        self.max_crashes = max(1, int(max_crashes))
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            if isinstance(data, dict):
+                self.entries = {str(k): v for k, v in data.items() if isinstance(v, dict)}
+        except (OSError, ValueError):
+            pass
+        self._dirty = False
+
+    @staticmethod
+    def _stat(path: str) -> Optional[List[float]]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return [st.st_size, st.st_mtime]
+
+    def _entry(self, path: str) -> Optional[Dict[str, Any]]:
+        e = self.entries.get(path)
+        if e is not None and e.get("stat") != self._stat(path):
+            # plik się zmienił – stare awarie nie dotyczą nowej wersji
+            self.entries.pop(path, None)
+            self._dirty = True
+            return None
+        return e
+
+    def is_quarantined(self, path: str) -> bool:
+        e = self._entry(str(path))
+        return e is not None and int(e.get("crashes", 0)) >= self.max_crashes
+
+    def record_crash(self, path: str, error: str) -> int:
+        path = str(path)
+        e = self._entry(path) or {"crashes": 0}
+        e.update(crashes=int(e.get("crashes", 0)) + 1, error=error, stat=self._stat(path),
+                 at=datetime.now().isoformat(timespec="seconds"))
+        self.entries[path] = e
+        self._dirty = True
+        self.save()
+        return int(e["crashes"])
+
+    def clear(self, path: str) -> None:
+        if self.entries.pop(str(path), None) is not None:
+            self._dirty = True
+
+    def quarantined(self) -> List[str]:
+        return [p for p, e in self.entries.items() if int(e.get("crashes", 0)) >= self.max_crashes]
+
+    def save(self) -> None:
+        if not self._dirty:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            tmp.write_text(json.dumps(self.entries, ensure_ascii=False, indent=1), encoding="utf-8")
+            os.replace(tmp, self.path)
+            self._dirty = False
+        except OSError:
+            pass
+
+
+def _child_main(conn: Any, task: Callable[[Any], Any], init: Optional[Callable[[], None]], mem_limit_mb: int) -> None:
+    set_memory_limit(mem_limit_mb)
+    if init is not None:
+        init()
+    while True:
+        try:
+            item = conn.recv()
+        except (EOFError, OSError):
+            break
+        if item is None:
+            break
+        conn.send(task(item))
+
+
+@dataclass
+class _Child:
+    proc: Any
+    conn: Any
+    item: Any = None
+
+
+def supervise(
+    items: Iterable[Tuple[str, Any]],
+    task: Callable[[Tuple[str, Any]], Tuple],
+    *,
+    workers: int = 1,
+    init: Optional[Callable[[], None]] = None,
+    mem_limit_mb: Optional[int] = None,
+    quarantine: Optional[Quarantine] = None,
+    stats: Optional[Dict[str, int]] = None,
+    crash_result: Callable[[str, str], Tuple] = lambda path, err: (path, err),
+) -> Iterator[Tuple]:
+    """Wyniki ``task(item)`` liczone w procesach potomnych, w kolejności ukończenia.
+
+    ``item[0]`` to ścieżka pliku. Awaria procesu daje ``crash_result(path, error)``;
+    w ``stats`` zliczane są ``crashed``, ``restarts`` i ``quarantined`` (nowe wpisy).
+    """
+    ctx = mp.get_context()
+    mem = default_mem_limit_mb() if mem_limit_mb is None else int(mem_limit_mb)
+    stats = stats if stats is not None else {}
+    for key in ("crashed", "restarts", "quarantined"):
+        stats.setdefault(key, 0)
+    pending = deque(items)
+
+    def spawn() -> _Child:
+        parent_conn, child_conn = ctx.Pipe()
+        proc = ctx.Process(target=_child_main, args=(child_conn, task, init, mem), daemon=True)
+        proc.start()
+        child_conn.close()
+        return _Child(proc, parent_conn)
+
+    def assign(c: _Child) -> None:
+        c.item = pending.popleft() if pending else None
+        if c.item is not None:
+            c.conn.send(c.item)
+
+    children = [spawn() for _ in range(max(1, min(int(workers), len(pending))))] if pending else []
+    try:
+        for c in children:
+            assign(c)
+        while True:
+            busy = [c for c in children if c.item is not None]
+            if not busy:
+                break
+            ready = mp_wait([c.conn for c in busy] + [c.proc.sentinel for c in busy])
+            for c in busy:
+                res = None
+                if c.conn in ready:
+                    try:
+                        res = c.conn.recv()
+                    except (EOFError, OSError):
+                        res = None
+                if res is not None:
+                    assign(c)
+                    yield res
+                    continue
+                if c.proc.sentinel not in ready and c.proc.is_alive():
+                    continue
+                # proces zginął w trakcie pliku
+                path = str(c.item[0])
+                c.proc.join()
+                c.conn.close()
+                err = f"analysis worker crashed ({describe_exit(c.proc.exitcode)})"
+                stats["crashed"] += 1
+                if quarantine is not None and quarantine.record_crash(path, err) == quarantine.max_crashes:
+                    stats["quarantined"] += 1
+                if pending:
+                    fresh = spawn()
+                    stats["restarts"] += 1
+                    children[children.index(c)] = fresh
+                    assign(fresh)
+                else:
+                    children.remove(c)
+                yield crash_result(path, err)
+    finally:
+        for c in children:
+            try:
+                c.conn.send(None)
+            except (OSError, ValueError):
+                pass
+        for c in children:
+            c.proc.join(timeout=5)
+            if c.proc.is_alive():
+                c.proc.kill()
+                c.proc.join()
+            c.conn.close()
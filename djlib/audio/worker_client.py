@@ -0,0 +1,249 @@
+"""Klient trwałego workera analizy (``docker/analysis_worker.py``).
+
+Zamiast ``docker run --rm`` dla każdego pliku (~1 s startu kontenera) uruchamiany
+jest jeden kontener ``-i`` z biblioteką (``LIB_ROOT``, ``INBOX_DIR``) zamontowaną
+raz, tylko do odczytu. Zadania idą na jego stdin, wyniki wracają jako linie JSON
+na stdout (protokół opisany w workerze). Ten sam protokół może mówić dowolny
+lokalny proces – ``$DJLIB_ESSENTIA_WORKER_CMD`` (np. ``python
+docker/analysis_worker.py --extractor /path/streaming_extractor_music``); do
+komendy dopisywane jest ``--jobs N``. ``DJLIB_ESSENTIA_WORKER=0`` wraca do
+``docker run`` per plik.
+
+Worker jest jeden na proces (``get_worker``) i jest bezpieczny dla wątków: wątki
+``analyze_many`` wysyłają zadania równolegle, a wątek czytający rozdziela
+odpowiedzi po ``id``. Gdy worker padnie albo przestanie odpowiadać, oczekujące
+zadania dostają ``WorkerError``, a następne zadanie uruchamia go od nowa. Gdy
+worker w ogóle nie wstaje (``WorkerStartError``), ``get_worker`` zapamiętuje to
+do końca procesu i zwraca ``None`` – analiza wraca do uruchomień per plik.
+"""
+
+from __future__ import annotations
+
+import atexit
+import itertools
+import json
+import os
+import shlex
+import shutil
+import subprocess
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+PROTOCOL = 1
+WORKER_ENV = "DJLIB_ESSENTIA_WORKER"
+WORKER_CMD_ENV = "DJLIB_ESSENTIA_WORKER_CMD"
+CONTAINER_ROOT = "/lib"
+# Ile dłużej niż limit zadania czekamy na odpowiedź, zanim uznamy workera za zawieszonego
+RESPONSE_GRACE = 30.0
+
+
+class WorkerError(RuntimeError):
+    pass
+
+
+class WorkerStartError(WorkerError):
+    """Proces workera nie uruchomił się (brak komendy/obrazu, zły protokół)."""
+
+
+@dataclass
+class _Session:
+    proc: subprocess.Popen
+    pending: Dict[str, Future] = field(default_factory=dict)
+
+
+class AnalysisWorker:
+    """Jeden proces workera; ``run(path)`` wysyła zadanie i czeka na jego odpowiedź."""
+
+    def __init__(self, cmd: Sequence[str], mounts: Sequence[Tuple[Path, str]] = (),
+                 container: Optional[str] = None, jobs: int = 1) -> None:
+        self.cmd = list(cmd)
+        self.mounts = [(Path(host).resolve(), root) for host, root in mounts]
+        self.container = container
+        self.jobs = jobs
+        self._lock = threading.Lock()
+        self._session: Optional[_Session] = None
+        self._ids = itertools.count(1)
+        self.start_error: Optional[str] = None
+
+    def worker_path(self, path: Path | str) -> Optional[str]:
+        """Ścieżka pliku widziana przez workera; ``None`` = poza zamontowanymi katalogami."""
+        if not self.mounts:
+            return str(path)
+        p = Path(path).resolve()
+        for host, root in self.mounts:
+            try:
+                rel = p.relative_to(host)
+            except ValueError:
+                continue
+            return f"{root}/{rel.as_posix()}"
+        return None
+
+    def _start(self) -> _Session:
+        if self.start_error is not None:
+            raise WorkerStartError(self.start_error)
+        try:
+            proc = subprocess.Popen(
+                self.cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                text=True, encoding="utf-8", bufsize=1, start_new_session=(os.name == "posix"),
+            )
+        except OSError as e:
+            self.start_error = f"analysis worker did not start: {e}"
+            raise WorkerStartError(self.start_error) from e
+        assert proc.stdout is not None
+        line = proc.stdout.readline()
+        try:
+            hello = json.loads(line)
+        except ValueError:
+            hello = {}
+        if not isinstance(hello, dict) or not hello.get("ready") or hello.get("protocol") != PROTOCOL:
+            self._stop(proc)
+            self.start_error = f"analysis worker did not start: {line.strip()[:200]!r}"
+            raise WorkerStartError(self.start_error)
+        session = _Session(proc)
+        threading.Thread(target=self._read, args=(session,), daemon=True).start()
+        return session
+
+    def _read(self, session: _Session) -> None:
+        assert session.proc.stdout is not None
+        for line in session.proc.stdout:
+            try:
+                msg = json.loads(line)
+            except ValueError:
+                continue
+            with self._lock:
+                fut = session.pending.pop(str(msg.get("id")), None)
+            if fut is not None:
+                fut.set_result(msg)
+        self._fail(session, "analysis worker exited")
+
+    def _fail(self, session: _Session, reason: str) -> None:
+        with self._lock:
+            if self._session is session:
+                self._session = None
+            pending, session.pending = session.pending, {}
+        for fut in pending.values():
+            if not fut.done():
+                fut.set_exception(WorkerError(reason))
+
+    def run(self, path: Path | str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Przeanalizuj plik; zwraca odpowiedź workera (``ok``, ``raw``/``error``, ``timed_out``)."""
+        target = self.worker_path(path)
+        if target is None:
+            raise ValueError(f"{path} is outside the worker mounts")
+        fut: Future = Future()
+        with self._lock:
+            if self._session is None or self._session.proc.poll() is not None:
+                self._session = self._start()
+            session = self._session
+            job_id = str(next(self._ids))
+            session.pending[job_id] = fut
+            try:
+                assert session.proc.stdin is not None
+                session.proc.stdin.write(json.dumps({"id": job_id, "path": target, "timeout": timeout}) + "\n")
+                session.proc.stdin.flush()
+            except (OSError, ValueError) as e:
+                session.pending.pop(job_id, None)
+                raise WorkerError(f"analysis worker unavailable: {e}") from e
+        try:
+            return fut.result(timeout=timeout + RESPONSE_GRACE if timeout and timeout > 0 else None)
+        except FutureTimeout:
+            # worker zawieszony: zabij go, następne zadanie uruchomi nowy
+            self._stop(session.proc)
+            self._fail(session, "analysis worker hung")
+            raise WorkerError("analysis worker did not respond") from None
+
+    def _stop(self, proc: subprocess.Popen) -> None:
+        if self.container:
+            docker = shutil.which("docker") or "docker"
+            subprocess.run([docker, "kill", self.container], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                           check=False, timeout=30)
+        proc.kill()
+        proc.wait()
+
+    def close(self) -> None:
+        with self._lock:
+            session, self._session = self._session, None
+        if session is None:
+            return
+        try:
+            if session.proc.stdin is not None:
+                session.proc.stdin.close()
+            session.proc.wait(timeout=10)
+        except (OSError, subprocess.TimeoutExpired):
+            self._stop(session.proc)
+
+
+def _mount_roots() -> List[Path]:
+    from djlib.config import INBOX_DIR, LIB_ROOT
+
+    roots: List[Path] = []
+    for r in (LIB_ROOT, INBOX_DIR):
+        try:
+            r = Path(r).resolve()
+        except OSError:
+            continue
+        if r.is_dir() and not any(r == x or x in r.parents for x in roots):
+            roots = [x for x in roots if r not in x.parents] + [r]
+    return roots
+
+
+def worker_spec(jobs: int, allow_docker: bool = True) -> Optional[AnalysisWorker]:
+    """Worker wg środowiska: ``$DJLIB_ESSENTIA_WORKER_CMD``, kontener Dockera albo ``None``."""
+    if os.getenv(WORKER_ENV, "1").strip().lower() in {"0", "false", "no"}:
+        return None
+    jobs = max(1, int(jobs))
+    local = os.getenv(WORKER_CMD_ENV, "").strip()
+    if local:
+        return AnalysisWorker(shlex.split(local) + ["--jobs", str(jobs)], jobs=jobs)
+    docker = shutil.which("docker")
+    docker_enabled = os.getenv("DJLIB_ESSENTIA_DOCKER", "0").strip() in {"1", "true", "yes"}
+    if not (allow_docker and docker and docker_enabled):
+        return None
+    image = os.getenv("DJLIB_ESSENTIA_IMAGE", "djlib-essentia:local")
+    name = f"djlib-ess-worker-{os.getpid()}"
+    mounts = [(root, f"{CONTAINER_ROOT}/{i}") for i, root in enumerate(_mount_roots())]
+    cmd = [docker, "run", "-i", "--rm", "--name", name]
+    for host, root in mounts:
+        cmd += ["-v", f"{host}:{root}:ro"]
+    cmd += ["--entrypoint", "djlib-analysis-worker", image, "--jobs", str(jobs), "--scratch", "/dev/shm"]
+    return AnalysisWorker(cmd, mounts, container=name, jobs=jobs)
+
+
+_WORKER: Optional[AnalysisWorker] = None
+_WORKER_LOCK = threading.Lock()
+_WORKER_DISABLED = False
+
+
+def get_worker(jobs: int = 1, allow_docker: bool = True) -> Optional[AnalysisWorker]:
+    """Worker tego procesu (tworzony przy pierwszym użyciu, zamykany przy wyjściu).
+
+    Po nieudanym starcie workera zwraca ``None`` do końca procesu.
+    """
+    global _WORKER, _WORKER_DISABLED
+    with _WORKER_LOCK:
+        if _WORKER is not None and _WORKER.start_error is not None:
+            _WORKER, _WORKER_DISABLED = None, True
+        if _WORKER_DISABLED:
+            return None
+        if _WORKER is not None and _WORKER.jobs >= jobs:
+            return _WORKER if allow_docker or not _WORKER.container else None
+        if _WORKER is not None:
+            _WORKER.close()
+        _WORKER = worker_spec(jobs, allow_docker)
+        return _WORKER
+
+
+def close_worker() -> None:
+    """Zamknij workera procesu i zapomnij ewentualny nieudany start."""
+    global _WORKER, _WORKER_DISABLED
+    with _WORKER_LOCK:
+        if _WORKER is not None:
+            _WORKER.close()
+            _WORKER = None
+        _WORKER_DISABLED = False
+
+
+atexit.register(close_worker)
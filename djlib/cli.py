@@ -10,12 +10,14 @@ from djlib.config import (
     INBOX_DIR, READY_TO_PLAY_DIR, REVIEW_QUEUE_DIR, LOGS_DIR, CSV_PATH, AUDIO_EXTS, UNSORTED_XLSX
 )
 from djlib.csvdb import load_records, save_records
-from djlib.tags import read_tags, write_tags
-from djlib.enrich import suggest_metadata, enrich_online_for_row
+from djlib.tags import write_tags
+from djlib.enrich import enrich_online_for_row
 from djlib.genre import external_genre_votes, load_taxonomy_map, suggest_bucket_from_votes
 from djlib.metadata.genre_resolver import resolve as resolve_genres
 from djlib.classify import guess_bucket
-from djlib.fingerprint import file_sha256, fingerprint_info
+from djlib.fingerprint import FPCALC_GROUP_SIZE, file_sha256, fingerprint_many
+from djlib.fingerprint_index import DEFAULT_THRESHOLD, FingerprintIndex
+from djlib.fingerprint_store import fingerprint_digest, resolve_fingerprints, store_fingerprint, store_fingerprints
 from djlib.filename import build_final_filename, extension_for
 from djlib.mover import resolve_target_path, move_with_rename, utc_now_str
 from djlib.buckets import is_valid_target
@@ -23,15 +25,22 @@ from djlib.placement import decide_bucket
 from djlib.ml.export_dataset import export_training_dataset
 from djlib.taxonomy import load_taxonomy, allowed_targets
 from djlib.unsorted import load_unsorted_rows, write_unsorted_rows, is_done
+from djlib.scan_index import IndexEntry, ScanIndex
+from djlib.scan_pipeline import (
+    KnownFiles, ProbeResult, content_ids_file, default_workers, hash_file, list_inbox, probe_file, run_io_stage, run_stage, suggest_for,
+)
 try:
     from djlib.audio import check_env as audio_check_env
     from djlib.audio import analyze as audio_analyze
-    from djlib.audio.cache import get_analysis
+    from djlib.audio import analyze_many as audio_analyze_many
+    from djlib.audio.cache import get_analysis, get_analyses
 except Exception:
     # If audio backend is unavailable, fall back to None
     audio_check_env = None  # type: ignore
     audio_analyze = None  # type: ignore
+    audio_analyze_many = None  # type: ignore
     get_analysis = None  # type: ignore
+    get_analyses = None  # type: ignore
 
 # --- Pomocnicze ---
 REPO_ROOT = Path(__file__).resolve().parents[1]
@@ -70,14 +79,26 @@ def cmd_configure(_: argparse.Namespace) -> None:
     print(f"   library_root: {cfg.library_root}")
     print(f"   inbox_dir:    {cfg.inbox_dir}\n")
 
-def cmd_scan(_: argparse.Namespace) -> None:
+def cmd_scan(args: argparse.Namespace) -> None:
     ensure_base_dirs()
+    workers = int(getattr(args, "workers", 0) or 0) or default_workers()
+    verify = bool(getattr(args, "verify", False))
+    _scan_paths(list_inbox(INBOX_DIR, AUDIO_EXTS), workers=workers, verify=verify)
+
+
+def _scan_paths(all_files: List[Path], *, workers: int, verify: bool = False, prune: bool = True) -> Dict[str, Any]:
+    """Pipeline skanu dla podanych plików INBOX (``scan`` i partie ``watch``).
+
+    ``prune`` usuwa z indeksu stat() pliki INBOX spoza ``all_files`` – tylko gdy
+    ``all_files`` to pełna lista INBOX. Zwraca końcowy status (jak w scan_status.json).
+    """
     library_rows = load_records(CSV_PATH)
     staging_rows = _load_unsorted()
     known_hashes = {r.get("file_hash", "") for r in library_rows if r.get("file_hash")}
-    known_fps = {r.get("fingerprint", "") for r in library_rows if r.get("fingerprint")}
+    # Arkusze trzymają digest fingerprintu (fp1:…); stare wiersze – pełny string.
+    row_fps = [r.get("fingerprint", "") for r in library_rows + staging_rows if r.get("fingerprint")]
+    known_fps = {fingerprint_digest(v) for v in row_fps}
     known_hashes.update({r.get("file_hash", "") for r in staging_rows if r.get("file_hash")})
-    known_fps.update({r.get("fingerprint", "") for r in staging_rows if r.get("fingerprint")})
 
     status_path = LOGS_DIR / "scan_status.json"
 
@@ -89,68 +110,191 @@ def cmd_scan(_: argparse.Namespace) -> None:
         except Exception:
             pass
 
-    all_files = [p for p in INBOX_DIR.glob("**/*") if p.is_file() and p.suffix.lower() in AUDIO_EXTS]
     total = len(all_files)
     processed = 0
     added = 0
     errors = 0
     missing_fpcalc = False
-    _write_status(
-        {
-            "state": "running",
-            "total": total,
-            "processed": 0,
-            "added": 0,
-            "errors": 0,
-            "last_file": "",
-        }
-    )
 
-    new_rows: List[Dict[str, str]] = []
+    def _running(stage: str, last_file: str = "") -> None:
+        _write_status(
+            {
+                "state": "running",
+                "stage": stage,
+                "workers": workers,
+                "total": total,
+                "processed": processed,
+                "added": added,
+                "errors": errors,
+                "last_file": last_file,
+                "missing_fpcalc": missing_fpcalc,
+            }
+        )
+
+    _running("hash")
+
+    # Etap 0: indeks stat() – niezmienione pliki (size/mtime/inode) nie są hashowane ponownie.
+    index = ScanIndex()
+    stats: Dict[str, os.stat_result] = {}
+    entries: Dict[str, IndexEntry] = {}
+    quick: Dict[str, str] = {}
+    hashes: Dict[str, str] = {}
+    verify_mismatches = 0
+    to_hash: List[str] = []
     for p in all_files:
-        fhash = file_sha256(p)
-        if fhash in known_hashes:
-            processed += 1
-            _write_status(
-                {
-                    "state": "running",
-                    "total": total,
-                    "processed": processed,
-                    "added": added,
-                    "errors": errors,
-                    "last_file": str(p),
-                }
-            )
+        ps = str(p)
+        try:
+            stats[ps] = p.stat()
+        except OSError:
+            continue
+        entry = index.lookup(ps, stats[ps])
+        if entry is not None:
+            entries[ps] = entry
+            hashes[ps] = entry.sha256
+            if entry.quick_hash and not verify:
+                quick[ps] = entry.quick_hash
+                continue
+        to_hash.append(ps)
+
+    # Etap 1: quick_hash (pula procesów) dla plików spoza indeksu; pełny SHA-256
+    # od razu tylko przy --verify.
+    for path_str, qh, fhash, err in run_stage(hash_file, [(ps, verify) for ps in to_hash], workers):
+        if qh:
+            quick[path_str] = qh
+            hashes[path_str] = fhash or hashes.get(path_str, "")
+            prev = entries.get(path_str)
+            if verify and prev is not None and prev.sha256 and prev.sha256 != fhash:
+                verify_mismatches += 1
+                entries.pop(path_str)
+        _running("hash", path_str)
+
+    # Prefiltr: znane pliki po quick_hash. Z biblioteki bierzemy tylko pliki o
+    # rozmiarze równym któremuś kandydatowi (sam stat(), bez czytania).
+    known = KnownFiles(known_hashes)
+    legacy_rows: List[Dict[str, str]] = []
+    for r in staging_rows:
+        if (r.get("quick_hash") or "").strip():
+            known.add(r["quick_hash"].strip(), (r.get("file_hash") or "").strip(), r.get("file_path") or "")
+        else:
+            legacy_rows.append(r)  # arkusz sprzed quick_hash – traktuj jak pliki biblioteki
+    candidate_sizes = {stats[ps].st_size for ps in quick}
+    lib_to_hash: List[str] = []
+    lib_rows: Dict[str, Dict[str, str]] = {}
+    for r in library_rows + legacy_rows:
+        raw = (r.get("final_path") or r.get("file_path") or "").strip()
+        if not raw:
             continue
-
-        tags = read_tags(p)
         try:
-            dur, fp = fingerprint_info(p)
-        except Exception as e:
-            fp = ""
-            dur = 0
+            st = Path(raw).stat()
+        except OSError:
+            continue
+        if st.st_size not in candidate_sizes:
+            continue
+        stats[raw] = st
+        lib_rows[raw] = r
+        entry = index.lookup(raw, st)
+        if entry is not None and entry.quick_hash:
+            known.add(entry.quick_hash, (r.get("file_hash") or "").strip(), raw)
+        else:
+            lib_to_hash.append(raw)
+    for path_str, qh, _, _ in run_stage(hash_file, [(ps, False) for ps in lib_to_hash], workers):
+        if qh:
+            fh = (lib_rows[path_str].get("file_hash") or "").strip()
+            known.add(qh, fh, path_str)
+            index.record(path_str, stats[path_str], fh, quick_hash=qh)
+
+    # Deduplikacja w kolejności plików – drugi identyczny plik w tym samym
+    # przebiegu jest pomijany jak wcześniej.
+    fresh: List[tuple[str, str, str]] = []
+    for p in all_files:
+        path_str = str(p)
+        qh = quick.get(path_str, "")
+        if not qh:
             errors += 1
-            if "fpcalc" in str(e).lower():
+            processed += 1
+            continue
+        is_known, fhash = known.check(qh, hashes.get(path_str, ""), path_str)
+        hashes[path_str] = fhash
+        if is_known:
+            processed += 1
+        else:
+            known.add(qh, fhash, path_str)
+            fresh.append((path_str, qh, fhash))
+
+    # Pełny SHA-256 nowych plików: kolumna file_hash to tożsamość wiersza (dedup,
+    # cache gc, cache migrate-ids, sync-audio-metrics). Znane pliki nadal kończą na quick_hash.
+    # W tym samym odczycie hash danych audio – klucz magazynu fingerprintów.
+    full_of: Dict[str, str] = {}
+    content_ids: Dict[str, str] = {}
+    for ps, sha, aid, _ in run_stage(content_ids_file, [ps for ps, _, _ in fresh], workers):
+        if sha:
+            full_of[ps] = sha
+            content_ids[ps] = aid
+    fresh = [(ps, qh, fh or full_of.get(ps, "")) for ps, qh, fh in fresh]
+    for ps, _, fh in fresh:
+        hashes[ps] = fh
+        if fh:
+            known.known_hashes.add(fh)
+
+    # Etap 2: tagi (pula procesów) tylko dla nowych plików.
+    probes: List[ProbeResult] = list(run_stage(probe_file, [ps for ps, _, _ in fresh], workers))
+
+    # Etap 3: fingerprinty – z indeksu stat(), a brakujące wsadowo przez fpcalc
+    # (magazyn fingerprintów pomija pliki już kiedyś zdekodowane).
+    need_fp = [pr.path for pr in probes if not (pr.path in entries and entries[pr.path].fingerprint)]
+    fps = fingerprint_many(need_fp, workers=workers, content_ids=content_ids) if need_fp else {}
+    for probe in probes:
+        entry = entries.get(probe.path)
+        if probe.path in fps:
+            probe.duration, probe.fingerprint, fp_error = fps[probe.path]
+            if "nie znaleziono 'fpcalc'" in fp_error.lower():
                 missing_fpcalc = True
+            probe.error = probe.error or fp_error
+        elif entry is not None:
+            probe.fingerprint, probe.duration = entry.fingerprint, entry.duration
+        if probe.error:
+            errors += 1
+        _running("probe", probe.path)
+
+    # Etap 4: sugestie metadanych (ograniczona pula wątków – I/O sieciowe).
+    suggestions = run_io_stage(suggest_for, [(pr.path, pr.tags) for pr in probes], workers)
+
+    # Bliskie duplikaty (inny enkoder/bitrate/przesunięcie) – indeks budowany
+    # tylko, gdy jest co sprawdzać.
+    fp_index = None
+    new_fps = [pr.fingerprint for pr in probes if pr.fingerprint]
+    digests = dict(zip(new_fps, store_fingerprints(new_fps)))
+    if new_fps:
+        fp_index = FingerprintIndex.from_items(
+            (fingerprint_digest(value), full_fp) for value, full_fp in resolve_fingerprints(row_fps).items()
+        )
 
-        is_dup = "true" if (fp and fp in known_fps) else "false"
+    new_rows: List[Dict[str, str]] = []
+    for (path_str, qh, fhash), probe, sugg in zip(fresh, probes, suggestions):
+        tags = probe.tags
+        fp = probe.fingerprint
+        fp_digest = digests.get(fp, "")
+        dur = probe.duration
+        is_dup = "false"
+        if fp and (fp_digest in known_fps or (fp_index is not None and fp_index.best_match(fp) is not None)):
+            is_dup = "true"
 
         ai_bucket, ai_comment = guess_bucket(
             tags["artist"], tags["title"], tags["bpm"], tags["genre"], tags["comment"]
         )
 
-        sugg = suggest_metadata(p, tags)
         if (sugg.get("duration_suggest") or "").strip() == "" and dur:
             mm = dur // 60
             ss = dur % 60
             sugg["duration_suggest"] = f"{mm}:{ss:02d}"
 
-        track_id = f"{fhash[:12]}_{int(time.time())}"
+        track_id = f"{(fhash or qh)[:12]}_{int(time.time())}"
         rec: Dict[str, str] = {
             "track_id": track_id,
-            "file_path": str(p),
+            "file_path": path_str,
             "file_hash": fhash,
-            "fingerprint": fp,
+            "quick_hash": qh,
+            "fingerprint": fp_digest,
             "added_date": utc_now_str(),
             "is_duplicate": is_dup,
             "artist": _safe_str(tags.get("artist")).strip(),
@@ -191,22 +335,13 @@ def cmd_scan(_: argparse.Namespace) -> None:
             rec[key] = _safe_str(sugg.get(key, ""))
         staging_rows.append(rec)
         new_rows.append(rec)
-        known_hashes.add(fhash)
         if fp:
-            known_fps.add(fp)
+            known_fps.add(fp_digest)
+            if fp_index is not None:
+                fp_index.add(fp_digest, fp)
         added += 1
         processed += 1
-        _write_status(
-            {
-                "state": "running",
-                "total": total,
-                "processed": processed,
-                "added": added,
-                "errors": errors,
-                "last_file": str(p),
-                "missing_fpcalc": missing_fpcalc,
-            }
-        )
+        _running("suggest", path_str)
 
     if new_rows:
         _save_unsorted(staging_rows)
@@ -214,17 +349,74 @@ def cmd_scan(_: argparse.Namespace) -> None:
     else:
         print("Brak nowych plików do dodania.")
 
-    _write_status(
-        {
-            "state": "done",
-            "total": total,
-            "processed": processed,
-            "added": added,
-            "errors": errors,
-            "missing_fpcalc": missing_fpcalc,
-            "unsorted_rows": len(staging_rows),
-        }
+    # Zaktualizuj indeks stat() (także o fingerprinty policzone w tym przebiegu).
+    probed = {pr.path: pr for pr in probes}
+    for path_str, qh in quick.items():
+        pr = probed.get(path_str)
+        entry = entries.get(path_str)
+        if pr is not None and pr.fingerprint:
+            fp, dur = pr.fingerprint, pr.duration
+        elif entry is not None:
+            fp, dur = entry.fingerprint, entry.duration
+        else:
+            fp, dur = "", 0
+        index.record(path_str, stats[path_str], hashes.get(path_str, ""), fp, dur, quick_hash=qh)
+    if prune:
+        index.prune(INBOX_DIR, quick.keys())
+    index.commit()
+    index.close()
+    if verify:
+        print(f"Weryfikacja hashy: niezgodności z indeksem={verify_mismatches}")
+
+    final = {
+        "state": "done",
+        "workers": workers,
+        "verify": verify,
+        "verify_mismatches": verify_mismatches,
+        "indexed_hits": len(all_files) - len(to_hash),
+        "full_hashes": known.full_hashed + len(full_of) + (len(to_hash) if verify else 0),
+        "total": total,
+        "processed": processed,
+        "added": added,
+        "errors": errors,
+        "missing_fpcalc": missing_fpcalc,
+        "unsorted_rows": len(staging_rows),
+    }
+    _write_status(final)
+    return final
+
+def cmd_watch(args: argparse.Namespace) -> None:
+    """Obserwuj INBOX i dodawaj nowe pliki do ``unsorted.xlsx`` partiami.
+
+    Start: uzgodnienie z indeksem stat() (jak ``scan``, bez ponownego hashowania
+    niezmienionych plików), potem tylko pliki zgłoszone przez zdarzenia/polling.
+    """
+    from djlib.watch import InboxWatcher
+
+    ensure_base_dirs()
+    workers = int(getattr(args, "workers", 0) or 0) or default_workers()
+
+    files = list_inbox(INBOX_DIR, AUDIO_EXTS)
+    _scan_paths(files, workers=workers)
+
+    def _ingest(batch: List[Path]) -> None:
+        print(f"👀 Watch: partia {len(batch)} plików")
+        _scan_paths(batch, workers=workers, prune=False)
+
+    watcher = InboxWatcher(
+        INBOX_DIR,
+        AUDIO_EXTS,
+        _ingest,
+        settle=float(getattr(args, "settle", 2.0)),
+        batch_interval=float(getattr(args, "batch_interval", 5.0)),
+        poll_interval=float(getattr(args, "poll_interval", 2.0)),
+        use_events=not bool(getattr(args, "poll", False)),
     )
+    watcher.seed(files)
+    mode = watcher.start()
+    print(f"👀 Watch: {INBOX_DIR} (tryb: {mode}). Ctrl+C kończy.")
+    watcher.run()
+
 
 def _load_rules(path: Path) -> Dict[str, Any]:
     import yaml
@@ -634,21 +826,26 @@ def cmd_fix_fingerprints(_: argparse.Namespace) -> None:
 
     _write_status("running", "")
 
-    for r, p in targets:
-        try:
-            dur, fp = fingerprint_info(p)
+    # Paczki po kilka grup fpcalc – wsadowo, ale z bieżącym postępem w statusie.
+    workers = default_workers()
+    batch = workers * FPCALC_GROUP_SIZE
+    for start in range(0, total, batch):
+        chunk = targets[start:start + batch]
+        results = fingerprint_many([p for _, p in chunk], workers=workers)
+        for r, p in chunk:
+            dur, fp, _err = results.get(str(p), (0, "", "brak wyniku"))
             if fp:
-                r["fingerprint"] = fp
+                r["fingerprint"] = store_fingerprint(fp)
                 # uzupełnij duration_suggest jeśli brak
                 ds = (r.get("duration_suggest") or "").strip()
                 if not ds and dur:
                     mm, ss = divmod(int(dur), 60)
                     r["duration_suggest"] = f"{mm}:{ss:02d}"
                 updated += 1
-        except Exception:
-            errors += 1
-        processed += 1
-        _write_status("running", str(p))
+            else:
+                errors += 1
+            processed += 1
+        _write_status("running", str(chunk[-1][1]))
 
     if updated:
         _save_unsorted(rows)
@@ -769,12 +966,19 @@ def cmd_apply(args: argparse.Namespace) -> None:
 
         dest_real = move_with_rename(src, dest_dir, final_name)
         log_rows.append([str(src), str(dest_real), r.get("track_id", "")])
+        # scan liczy pełny SHA-256 tylko przy kolizji quick_hash – dopełnij go teraz (przed zapisem tagów)
+        file_hash = (r.get("file_hash") or "").strip()
+        if not file_hash:
+            try:
+                file_hash = file_sha256(dest_real)
+            except Exception:
+                file_hash = ""
         processed_ids.add(r.get("track_id", ""))
         record = {
             "track_id": r.get("track_id", ""),
             "file_path": str(dest_real),
             "original_path": r.get("file_path") or "",
-            "file_hash": r.get("file_hash") or "",
+            "file_hash": file_hash,
             "fingerprint": r.get("fingerprint") or "",
             "added_date": utc_now_str(),
             "final_filename": final_name,
@@ -875,26 +1079,55 @@ def cmd_undo(_: argparse.Namespace) -> None:
             print(f"[WARN] Brak pliku do cofnięcia: {dest_after}")
     print(f"Cofnięto {reverted} ruchów.")
 
-def cmd_dupes(_: argparse.Namespace) -> None:
-    groups: dict[str, list[dict[str,str]]] = {}
-    rows = load_records(CSV_PATH)
-    for r in rows:
-        fp = (r.get("fingerprint") or "").strip()
-        if not fp:
-            continue
-        groups.setdefault(fp, []).append(r)
+def cmd_dupes(args: argparse.Namespace) -> None:
+    """Raport duplikatów w ``library.csv`` – także bliskich (ten sam utwór z innej
+    puli promo: inny enkoder, bitrate, przesunięcie), z oceną podobieństwa.
+    Grupy to spójne składowe par o ``similarity >= --threshold``.
+    """
+    threshold = float(getattr(args, "threshold", None) or DEFAULT_THRESHOLD)
+    rows = [r for r in load_records(CSV_PATH) if (r.get("fingerprint") or "").strip()]
+    full_fps = resolve_fingerprints(r.get("fingerprint", "") for r in rows)
+    index = FingerprintIndex.from_items(
+        (i, full_fps.get((r.get("fingerprint") or "").strip(), "")) for i, r in enumerate(rows)
+    )
+
+    parent = list(range(len(rows)))
+
+    def _find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    best: dict[int, float] = {}
+    for i, j, score in index.pairs(threshold):
+        parent[_find(i)] = _find(j)
+        best[i] = max(best.get(i, 0.0), score)
+        best[j] = max(best.get(j, 0.0), score)
+
+    groups: dict[int, list[int]] = {}
+    for i in best:
+        groups.setdefault(_find(i), []).append(i)
 
     out = LOGS_DIR / "dupes.csv"
     with out.open("w", newline="", encoding="utf-8") as f:
         w = csv.writer(f)
-        w.writerow(["group_fingerprint", "track_id", "artist", "title", "file_path", "final_path", "file_hash"])
-        for fp, items in groups.items():
-            if len(items) <= 1:
-                continue
-            for r in items:
-                w.writerow([fp, r.get("track_id",""), r.get("artist",""), r.get("title",""),
+        w.writerow(["group_fingerprint", "similarity", "track_id", "artist", "title", "file_path", "final_path", "file_hash"])
+        for members in sorted(groups.values(), key=min):
+            members.sort()
+            group_fp = fingerprint_digest(rows[members[0]].get("fingerprint", ""))
+            for i in members:
+                r = rows[i]
+                w.writerow([group_fp, f"{best[i]:.3f}", r.get("track_id",""), r.get("artist",""), r.get("title",""),
                             r.get("file_path",""), r.get("final_path",""), r.get("file_hash","")])
-    print(f"Zapisano raport duplikatów: {out}")
+    print(f"Zapisano raport duplikatów: {out} (grupy: {len(groups)}, próg podobieństwa: {threshold:.2f})")
+
+def _fmt_bpm(bpm: Any) -> str:
+    try:
+        return f"{float(bpm):.2f}".rstrip("0").rstrip(".")
+    except Exception:
+        return str(bpm)
+
 
 def cmd_sync_audio_metrics(args: argparse.Namespace) -> None:
     """Zsynchronizuj metryki (BPM/Key/Energy) z cache SQLite do głównego CSV.
@@ -908,10 +1141,14 @@ def cmd_sync_audio_metrics(args: argparse.Namespace) -> None:
     if not rows:
         print("Brak rekordów do aktualizacji.")
         return
+    from djlib.audio.descriptors import PREVIEW_KEY, is_provisional
     force = bool(getattr(args, "force", False))
     write_tags_flag = bool(getattr(args, "write_tags", False))
+    skip_provisional = bool(getattr(args, "skip_provisional", False))
     updated = 0
     tags_written = 0
+    kinds = {"full": 0, "provisional": 0, "upgraded": 0}
+    row_ids: List[tuple[Dict[str, str], str]] = []
     for r in rows:
         audio_id = (r.get("file_hash") or "").strip()
         if not audio_id:
@@ -925,24 +1162,39 @@ def cmd_sync_audio_metrics(args: argparse.Namespace) -> None:
                     continue
             except Exception:
                 continue
-        a = get_analysis(audio_id)
+        row_ids.append((r, audio_id))
+    # jedno zapytanie (w paczkach) zamiast połączenia na wiersz
+    analyses = get_analyses(aid for _, aid in row_ids)
+    for r, audio_id in row_ids:
+        a = analyses.get(audio_id)
         if not a:
             continue
+        # wpis z --preview (BPM/tonacja z fragmentów) jest tymczasowy
+        provisional = is_provisional(a)
+        if provisional and skip_provisional:
+            continue
+        # pełna analiza zastępuje w arkuszu wartości wpisane wcześniej z podglądu
+        extras = a.get("extras") if isinstance(a.get("extras"), dict) else {}
+        preview_vals = extras.get(PREVIEW_KEY) if isinstance(extras.get(PREVIEW_KEY), dict) else {}
         # przygotuj wartości
         bpm = a.get("bpm")
         key = a.get("key_camelot")
         energy = a.get("energy")
-        # uzupełniaj tylko puste chyba że --force
-        def _should_set(cur: str) -> bool:
-            return force or (not (cur or "").strip())
+        # uzupełniaj tylko puste (albo z podglądu) chyba że --force
+        def _should_set(cur: str, preview_val: str = "") -> bool:
+            cur = (cur or "").strip()
+            return force or not cur or bool(preview_val and cur == preview_val)
         changed = False
-        if bpm is not None and _should_set(r.get("bpm", "")):
-            try:
-                r["bpm"] = f"{float(bpm):.2f}".rstrip("0").rstrip(".")
-            except Exception:
-                r["bpm"] = str(bpm)
+        upgraded = False
+        prev_bpm = _fmt_bpm(preview_vals.get("bpm")) if preview_vals.get("bpm") is not None else ""
+        if bpm is not None and _should_set(r.get("bpm", ""), prev_bpm):
+            new_bpm = _fmt_bpm(bpm)
+            upgraded |= bool(prev_bpm) and (r.get("bpm") or "").strip() == prev_bpm
+            r["bpm"] = new_bpm
             changed = True
-        if key and _should_set(r.get("key_camelot", "")):
+        prev_key = str(preview_vals.get("key_camelot") or "")
+        if key and _should_set(r.get("key_camelot", ""), prev_key):
+            upgraded |= bool(prev_key) and (r.get("key_camelot") or "").strip() == prev_key
             r["key_camelot"] = str(key)
             changed = True
         if energy is not None and _should_set(r.get("energy_hint", "")):
@@ -954,9 +1206,11 @@ def cmd_sync_audio_metrics(args: argparse.Namespace) -> None:
             changed = True
         if changed:
             updated += 1
+            kinds["provisional" if provisional else "full"] += 1
+            kinds["upgraded"] += int(upgraded)
         
-        # Zapisz metadane do pliku jeśli --write-tags
-        if write_tags_flag and (bpm or key):
+        # Zapisz metadane do pliku jeśli --write-tags (nie z podglądu – tagi są trwałe)
+        if write_tags_flag and (bpm or key) and not provisional:
             try:
                 p = Path(r.get("file_path") or "")
                 if p.exists():
@@ -973,7 +1227,10 @@ def cmd_sync_audio_metrics(args: argparse.Namespace) -> None:
     
     if updated:
         _save_unsorted(rows)
-    print(f"🔄 Sync audio metrics: updated={updated}, tags_written={tags_written}")
+    print(
+        f"🔄 Sync audio metrics: updated={updated} (full={kinds['full']}, provisional={kinds['provisional']}, "
+        f"upgraded_from_preview={kinds['upgraded']}), tags_written={tags_written}"
+    )
 
 def cmd_genres_resolve(args: argparse.Namespace) -> None:
     artist = (getattr(args, "artist", None) or "").strip()
@@ -1050,6 +1307,28 @@ def cmd_taxonomy_backup(_: argparse.Namespace) -> None:
     except Exception as e:
         print(f"[ERR] Nie udało się zapisać backupu taksonomii: {e}")
 
+def _print_analysis_plan(targets: List[Path], config: Dict[str, Any]) -> None:
+    """analyze-audio --plan: ile plików wymaga której grupy deskryptorów (bez uruchamiania Essentii)."""
+    from concurrent.futures import ThreadPoolExecutor
+    from djlib.audio.cache import compute_audio_id
+    from djlib.audio.descriptors import GROUPS, plan
+    from djlib.audio.features import config_hash
+
+    def _aid(p: Path) -> str:
+        try:
+            return compute_audio_id(p)
+        except Exception:
+            return ""
+
+    with ThreadPoolExecutor(max_workers=default_workers()) as ex:
+        ids = [aid for aid in ex.map(_aid, targets) if aid]
+    cached = get_analyses(ids) if get_analyses is not None else {}
+    counts = plan({aid: cached.get(aid) for aid in ids}, config_hash(config))
+    print(f"🧭 Analyze-audio plan: files={len(targets)}, to_analyze={counts['tracks']}, not_in_cache={counts['missing']}")
+    for group in GROUPS:
+        print(f"   {group:9s} {counts[group]}")
+
+
 def cmd_analyze_audio(args: argparse.Namespace) -> None:
     """Analiza audio (BPM/Key/Energy) dla INBOX lub wskazanego pliku/katalogu.
     Wyniki zapisywane są do cache SQLite (LOGS/audio_analysis.sqlite).
@@ -1063,7 +1342,7 @@ def cmd_analyze_audio(args: argparse.Namespace) -> None:
         print(json.dumps(info, ensure_ascii=False, indent=2))
         return
 
-    if audio_analyze is None:
+    if audio_analyze_many is None:
         print("Audio backend niedostępny. Zainstaluj Essentia lub uruchom z --check-env, aby sprawdzić środowisko.")
         return
 
@@ -1077,13 +1356,17 @@ def cmd_analyze_audio(args: argparse.Namespace) -> None:
         targets = [p for p in base.glob("**/*") if p.is_file() and p.suffix.lower() in AUDIO_EXTS]
 
     total = len(targets)
-    print(f"DEBUG: base={base}, total_targets={total}")  # DEBUG
+    workers = int(getattr(args, "workers", 0) or 0) or 1
     processed = 0
     updated = 0
+    run_stats: Dict[str, int] = {}
+    failures: List[Dict[str, str]] = []  # ostatnie błędy/awarie (do audio_status.json)
+    started = time.monotonic()
     LOGS_DIR.mkdir(parents=True, exist_ok=True)
     status_path = LOGS_DIR / "audio_status.json"
 
     def _write_status(state: str, last_file: str = "", last_error: str = "") -> None:
+        elapsed = time.monotonic() - started
         try:
             with status_path.open("w", encoding="utf-8") as f:
                 json.dump({
@@ -1091,8 +1374,17 @@ def cmd_analyze_audio(args: argparse.Namespace) -> None:
                     "total": total,
                     "processed": processed,
                     "updated": updated,
+                    "workers": workers,
+                    "errors": run_stats.get("errors", 0),
+                    "crashed": run_stats.get("crashed", 0),
+                    "restarts": run_stats.get("restarts", 0),
+                    "quarantined": run_stats.get("quarantined", 0),
+                    "skipped_quarantined": run_stats.get("skipped", 0),
+                    "elapsed_s": round(elapsed, 1),
+                    "files_per_min": round(processed * 60.0 / elapsed, 2) if elapsed > 0 else 0.0,
                     "last_file": last_file,
                     "error": last_error,
+                    "failures": failures,
                 }, f, ensure_ascii=False)
         except Exception:
             pass
@@ -1106,22 +1398,175 @@ def cmd_analyze_audio(args: argparse.Namespace) -> None:
         except Exception:
             pass
 
+    from djlib.audio.features import analysis_config
+    profile = getattr(args, "profile", None) or os.getenv("DJLIB_ANALYSIS_PROFILE", "full")
+    config = analysis_config((lo, hi), profile)
+
+    if getattr(args, "plan", False):
+        _print_analysis_plan(targets, config)
+        return
+
+    def _on_result(path: str, error: str, stats: Dict[str, int]) -> None:
+        nonlocal processed, updated
+        processed = stats["processed"]
+        updated = stats["analyzed"] + stats["cached"]
+        run_stats.update(stats)
+        if error:
+            print(f"⚠️  Błąd analizy {path}: {error}")
+            failures.append({"path": path, "error": error})
+            del failures[:-20]
+        _write_status("running", path, error)
+
+    # Workery (nadzorowane procesy) tylko liczą; zapis do cache robi ten proces, partiami
     _write_status("running", "")
-    for p in targets:
-        print(f"DEBUG: processing {p}")  # DEBUG
-        try:
-            res = audio_analyze(p, target_bpm_range=(lo, hi), recompute=bool(args.recompute), config={"target_bpm": [lo, hi]})
-            # Jeśli analyze dokonało upsert do cache, liczymy jako updated
-            if res:
-                updated += 1
-            _write_status("running", str(p))
-        except Exception as e:
-            print(f"DEBUG: exception {e}")  # DEBUG
-            _write_status("running", str(p), str(e))
-        processed += 1
+    final = audio_analyze_many(
+        targets,
+        workers=workers,
+        target_bpm_range=(lo, hi),
+        recompute=bool(args.recompute),
+        config=config,
+        preview=bool(getattr(args, "preview", False)),
+        cli_timeout=getattr(args, "cli_timeout", None),
+        stream_above=getattr(args, "stream_above", None),
+        mem_limit_mb=getattr(args, "mem_limit_mb", None),
+        max_crashes=int(getattr(args, "max_crashes", 2) or 2),
+        retry_quarantined=bool(getattr(args, "retry_quarantined", False)),
+        on_result=_on_result,
+    )
+    run_stats.update(final)
 
     _write_status("done", "")
     print(f"🎧 Analyze-audio: files={total}, analyzed={updated}")
+    if final.get("crashed") or final.get("skipped"):
+        print(f"   awarie workera: {final.get('crashed', 0)}, nowe w kwarantannie: {final.get('quarantined', 0)}, "
+              f"pominięte (kwarantanna): {final.get('skipped', 0)} – zob. LOGS/audio_quarantine.json")
+
+def _paths_by_file_hash() -> Dict[str, Path]:
+    """file_hash → istniejący plik, z library.csv (final_path/file_path) i unsorted.xlsx."""
+    out: Dict[str, Path] = {}
+    for r in load_records(CSV_PATH) + _load_unsorted():
+        fh = (r.get("file_hash") or "").strip()
+        if not fh or fh in out:
+            continue
+        for key in ("final_path", "file_path"):
+            raw = (r.get(key) or "").strip()
+            if raw and Path(raw).exists():
+                out[fh] = Path(raw)
+                break
+    return out
+
+
+def cmd_cache_migrate_ids(_: argparse.Namespace) -> None:
+    """Przeklucz cache analizy z SHA-256 całego pliku na hash danych audio (odporny na zapis tagów)."""
+    from djlib.audio.cache import migrate_audio_ids
+    stats = migrate_audio_ids(_paths_by_file_hash())
+    print(
+        f"🗃️  Cache migrate-ids: rekeyed={stats['rekeyed']}, merged={stats['merged']}, "
+        f"unchanged={stats['unchanged']}, missing_file={stats['missing_file']}"
+    )
+
+def cmd_cache_migrate_fingerprints(_: argparse.Namespace) -> None:
+    """Przenieś pełne fingerprinty z library.csv/unsorted.xlsx do magazynu BLOB-ów, zostaw digest."""
+    from djlib.fingerprint_store import compact_rows
+    library_rows = load_records(CSV_PATH)
+    lib_changed = compact_rows(library_rows)
+    if lib_changed:
+        save_records(CSV_PATH, library_rows)
+    staging_rows = _load_unsorted()
+    staging_changed = compact_rows(staging_rows)
+    if staging_changed:
+        _save_unsorted(staging_rows)
+    print(f"🗃️  Cache migrate-fingerprints: library.csv={lib_changed}, unsorted.xlsx={staging_changed}")
+
+
+def _live_cache_keys() -> List[str]:
+    """Klucze wierszy library.csv/unsorted.xlsx, których plik nadal istnieje (albo nie ma ścieżki).
+
+    Zwykle to file_hash; wiersz bez file_hash (świeży wpis stagingu) jest
+    właścicielem analizy pliku, więc jego audio_id liczony jest ze ścieżki.
+    """
+    from djlib.audio.cache import compute_audio_ids
+    keys: List[str] = []
+    for r in load_records(CSV_PATH) + _load_unsorted():
+        fh = (r.get("file_hash") or "").strip()
+        paths = [(r.get(k) or "").strip() for k in ("final_path", "file_path")]
+        existing = [Path(p) for p in paths if p and Path(p).exists()]
+        if fh:
+            if existing or not any(paths):
+                keys.append(fh)
+            continue
+        for p in existing[:1]:
+            try:
+                keys.extend(compute_audio_ids(p))
+            except OSError:
+                pass
+    return keys
+
+
+def cmd_cache_gc(args: argparse.Namespace) -> None:
+    """Usuń z cache analizy wpisy bez właściciela (arkusze + pliki na dysku) i zrób VACUUM."""
+    from djlib.audio.cache import cache_stats, collect_garbage
+    if getattr(args, "stats", False):
+        st = cache_stats(days=int(args.stats_days))
+        rate = "-" if st["hit_rate"] is None else f"{st['hit_rate']:.1%}"
+        print(
+            f"🗃️  Cache: rows={st['rows']}, aliases={st['aliases']}, size={st['size_bytes'] / (1 << 20):.1f} MB, "
+            f"hit_rate({st['days']}d)={rate} ({st['hits']}/{st['lookups']})"
+        )
+        return
+    stats = collect_garbage(
+        _live_cache_keys(),
+        keep_days=int(args.keep_days),
+        min_algo_version=int(args.min_algo_version),
+        dry_run=bool(args.dry_run),
+    )
+    rate = "-" if stats["hit_rate"] is None else f"{stats['hit_rate']:.1%}"
+    prefix = "(dry-run) " if stats["dry_run"] else ""
+    print(
+        f"🗃️  Cache gc {prefix}: evicted={stats['evicted']} (orphaned={stats['orphaned']}, outdated={stats['outdated']}), "
+        f"aliases_removed={stats['aliases_removed']}, rows {stats['rows_before']}→{stats['rows_after']}, "
+        f"size {stats['size_before'] / (1 << 20):.1f}→{stats['size_after'] / (1 << 20):.1f} MB, hit_rate={rate}"
+    )
+
+def cmd_cache_beatgrid(args: argparse.Namespace) -> None:
+    """Pokaż zapisaną siatkę beatów (beaty, downbeaty, krzywa tempa) – bez dekodowania audio."""
+    from djlib.audio.cache import compute_audio_ids, get_beatgrid
+    key = str(args.target)
+    if Path(key).is_file():
+        file_hash, aid = compute_audio_ids(Path(key))
+        grid = get_beatgrid(aid) or get_beatgrid(file_hash)
+    else:
+        grid = get_beatgrid(key)
+    if grid is None:
+        print(f"❌ Brak siatki beatów dla {key} (uruchom analyze-audio)")
+        return
+    beats, tempo = grid["beats"], grid["tempo"]
+    out = {
+        "beats": int(beats.size),
+        "downbeats": int(grid["downbeats"].size),
+        "first_downbeat": float(grid["downbeats"][0]) if grid["downbeats"].size else None,
+        "bpm": grid["bpm"],
+        "tempo_drift": grid["tempo_drift"],
+        "variable_tempo": grid["variable_tempo"],
+        "updated_at": grid["updated_at"],
+    }
+    if args.full:
+        out.update(
+            beats=[round(float(b), 4) for b in beats],
+            downbeats=[round(float(b), 4) for b in grid["downbeats"]],
+            tempo=[float(t) for t in tempo],
+            tempo_hop=grid["tempo_hop"],
+        )
+    print(json.dumps(out, ensure_ascii=False, indent=None if args.full else 2))
+
+def cmd_features_snapshot(args: argparse.Namespace) -> None:
+    """Zapisz/odśwież macierz cech (LOGS/audio_features.<seq>-<tag>.npy + indeks id) do np.load(mmap_mode="r")."""
+    from djlib.audio.snapshot import write_snapshot
+    stats = write_snapshot(full=bool(getattr(args, "full", False)))
+    print(
+        f"🧮 Features snapshot ({stats['mode']}): rows={stats['rows']}, features={stats['features']}, "
+        f"changed={stats['changed']} → {stats['path']}"
+    )
 
 def cmd_ml_predict(_: argparse.Namespace) -> None:
     print(LEGACY_ML_MSG)
@@ -1144,7 +1589,8 @@ def cmd_ml_export_dataset(args: argparse.Namespace) -> None:
     """Export Essentia features + genre/bucket labels to CSV."""
     out_path = Path(getattr(args, "out", "") or (REPO_ROOT / "data" / "training_dataset_full.csv"))
     require_both = bool(getattr(args, "require_both_labels", False))
-    stats = export_training_dataset(out_path=out_path, require_both_labels=require_both)
+    workers = int(getattr(args, "workers", 0) or 0) or None
+    stats = export_training_dataset(out_path=out_path, require_both_labels=require_both, workers=workers)
     print(
         f"ML dataset export: rows={stats['rows_exported']}, "
         f"missing_features={stats['missing_features']}, missing_labels={stats['missing_labels']}"
@@ -1219,7 +1665,18 @@ def build_parser() -> argparse.ArgumentParser:
     sp = p.add_subparsers(dest="cmd", required=True)
 
     sp.add_parser("configure").set_defaults(func=cmd_configure)
-    sp.add_parser("scan").set_defaults(func=cmd_scan)
+    scp = sp.add_parser("scan")
+    scp.add_argument("--workers", type=int, default=0, help="Liczba procesów do hash/tagów/fingerprintu (domyślnie: min(CPU, 8))")
+    scp.add_argument("--verify", action="store_true", help="Ignoruj indeks stat() i przelicz SHA-256 wszystkich plików")
+    scp.set_defaults(func=cmd_scan)
+
+    wp = sp.add_parser("watch", help="Obserwuj INBOX i dodawaj nowe pliki do unsorted.xlsx")
+    wp.add_argument("--workers", type=int, default=0, help="Liczba procesów (jak w scan)")
+    wp.add_argument("--settle", type=float, default=2.0, help="Ile sekund rozmiar pliku musi być stały (koniec kopiowania)")
+    wp.add_argument("--batch-interval", type=float, default=5.0, help="Co ile sekund zapisywać partię do arkusza")
+    wp.add_argument("--poll-interval", type=float, default=2.0, help="Okres pollingu, gdy brak watchdog")
+    wp.add_argument("--poll", action="store_true", help="Wymuś polling zamiast zdarzeń systemu plików")
+    wp.set_defaults(func=cmd_watch)
 
     ap = sp.add_parser("auto-decide")
     ap.add_argument("--rules", default=str(REPO_ROOT / "rules.yml"))
@@ -1231,10 +1688,14 @@ def build_parser() -> argparse.ArgumentParser:
     ap2.set_defaults(func=cmd_apply)
 
     sp.add_parser("undo").set_defaults(func=cmd_undo)
-    sp.add_parser("dupes").set_defaults(func=cmd_dupes)
+    dp = sp.add_parser("dupes")
+    dp.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                    help="Minimalne podobieństwo fingerprintów (0..1) dla bliskich duplikatów")
+    dp.set_defaults(func=cmd_dupes)
     sap = sp.add_parser("sync-audio-metrics")
     sap.add_argument("--force", action="store_true")
     sap.add_argument("--write-tags", action="store_true", help="Zapisz metadane (BPM/Key) do plików audio")
+    sap.add_argument("--skip-provisional", action="store_true", help="Pomiń wpisy z analyze-audio --preview")
     sap.set_defaults(func=cmd_sync_audio_metrics)
     sp.add_parser("fix-fingerprints").set_defaults(func=cmd_fix_fingerprints)
     sp.add_parser("fix-filenames").set_defaults(func=cmd_fix_titles_from_filenames)
@@ -1248,8 +1709,31 @@ def build_parser() -> argparse.ArgumentParser:
     aap.add_argument("--path", default=str(INBOX_DIR), help="Ścieżka pliku lub folderu (domyślnie INBOX)")
     aap.add_argument("--check-env", action="store_true", help="Sprawdź środowisko Essentia")
     aap.add_argument("--recompute", action="store_true", help="Pomiń cache i przelicz na nowo")
-    aap.add_argument("--workers", type=int, default=1, help="Liczba workerów (na razie ignorowane; skeleton)")
+    aap.add_argument(
+        "--preview", action="store_true",
+        help="Szybki podgląd: BPM/tonacja z 3 okien po 30 s (25/50/75%%); wpis tymczasowy, pełna analiza go zastąpi",
+    )
+    aap.add_argument("--plan", action="store_true", help="Pokaż, ile plików wymaga których grup deskryptorów (bez analizy)")
+    aap.add_argument("--workers", type=int, default=1, help="Liczba procesów analizy (każdy tworzy ekstraktor raz); zapis do cache partiami w jednym procesie")
+    aap.add_argument(
+        "--cli-timeout", type=float, default=None,
+        help="Limit czasu (s) jednego uruchomienia zewnętrznego ekstraktora; zawieszony proces jest zabijany (domyślnie: $DJLIB_ESSENTIA_TIMEOUT lub 300)",
+    )
+    aap.add_argument(
+        "--mem-limit-mb", type=int, default=None,
+        help="Limit pamięci (RLIMIT_AS) procesu analizy w MB; 0 = bez limitu (domyślnie: $DJLIB_ANALYSIS_MEM_MB lub 4096)",
+    )
+    aap.add_argument(
+        "--stream-above", type=float, default=None,
+        help="Pliki dłuższe niż tyle sekund analizuj strumieniowo (stała pamięć, np. miksy; wymaga ffmpeg); 0 = nigdy (domyślnie: $DJLIB_STREAM_MIN_SECONDS lub 1200)",
+    )
+    aap.add_argument("--max-crashes", type=int, default=2, help="Po tylu awariach workera plik trafia do kwarantanny")
+    aap.add_argument("--retry-quarantined", action="store_true", help="Analizuj też pliki z kwarantanny (LOGS/audio_quarantine.json)")
     aap.add_argument("--target-bpm", default="80:180", help="Zakres docelowy BPM, np. 80:180")
+    aap.add_argument(
+        "--profile", choices=("full", "lean"), default=None,
+        help="full = MusicExtractor, lean = jedno dekodowanie i tylko zapisywane deskryptory (domyślnie: $DJLIB_ANALYSIS_PROFILE lub full)",
+    )
     aap.set_defaults(func=cmd_analyze_audio)
 
     # ml predict
@@ -1275,6 +1759,7 @@ def build_parser() -> argparse.ArgumentParser:
     ds = sp.add_parser("ml-export-training-dataset")
     ds.add_argument("--out", default=str(REPO_ROOT / "data" / "training_dataset_full.csv"))
     ds.add_argument("--require-both-labels", action="store_true", help="Uwzględnij tylko rekordy z kompletnymi etykietami")
+    ds.add_argument("--workers", type=int, default=0, help="Wątki do liczenia brakujących hashy (domyślnie: min(CPU, 8))")
     ds.set_defaults(func=cmd_ml_export_dataset)
 
     # QA: acceptance rate
@@ -1295,6 +1780,32 @@ def build_parser() -> argparse.ArgumentParser:
 
     sp.add_parser("detect-taxonomy").set_defaults(func=cmd_detect_taxonomy)
 
+    # cache analizy audio (LOGS/audio_analysis.sqlite)
+    cp = sp.add_parser("cache")
+    csp = cp.add_subparsers(dest="subcmd", required=True)
+    csp.add_parser("migrate-ids", help="Przeklucz wpisy na hash danych audio (niezależny od tagów)").set_defaults(func=cmd_cache_migrate_ids)
+    csp.add_parser(
+        "migrate-fingerprints", help="Przenieś fingerprinty z CSV/XLSX do LOGS/fingerprints.sqlite (w arkuszach zostaje digest)"
+    ).set_defaults(func=cmd_cache_migrate_fingerprints)
+    gcp = csp.add_parser("gc", help="Usuń wpisy bez właściciela / ze starym algo_version, VACUUM, statystyki")
+    gcp.add_argument("--keep-days", type=int, default=30, help="Nie usuwaj wpisów bez właściciela młodszych niż N dni")
+    gcp.add_argument("--min-algo-version", type=int, default=0, help="Usuń wpisy z algo_version < N (0 = wyłączone)")
+    gcp.add_argument("--dry-run", action="store_true", help="Tylko policz, nic nie usuwaj")
+    gcp.add_argument("--stats", action="store_true", help="Pokaż rozmiar i hit rate bez sprzątania")
+    gcp.add_argument("--stats-days", type=int, default=30, help="Okno hit rate w dniach")
+    gcp.set_defaults(func=cmd_cache_gc)
+    bgp = csp.add_parser("beatgrid", help="Zapisana siatka beatów/downbeatów i krzywa tempa (bez dekodowania audio)")
+    bgp.add_argument("target", help="Ścieżka pliku albo audio_id/file_hash")
+    bgp.add_argument("--full", action="store_true", help="Wypisz pełne tablice (beaty, downbeaty, tempo)")
+    bgp.set_defaults(func=cmd_cache_beatgrid)
+
+    # snapshot cech (LOGS/audio_features.index.json + macierz .npy)
+    fp_ = sp.add_parser("features")
+    fsp = fp_.add_subparsers(dest="subcmd", required=True)
+    fsn = fsp.add_parser("snapshot", help="Macierz cech float32 (.npy) + indeks id obok audio_analysis.sqlite")
+    fsn.add_argument("--full", action="store_true", help="Przebuduj od zera zamiast przyrostowo")
+    fsn.set_defaults(func=cmd_features_snapshot)
+
     # --- Meta-komendy: round-1 i round-2 ---
     tb = sp.add_parser("taxonomy-backup", help="Zrób snapshot taksonomii na podstawie folderów i zapisz backup")
     tb.set_defaults(func=cmd_taxonomy_backup)
@@ -338,7 +338,9 @@ def enrich_online_for_row(path: Path, row: Dict[str, str]) -> Dict[str, str] | N
         a, t, v = parse_from_filename(path)
         artist, title = a, t
     # 1) Zawsze spróbuj AcoustID jeśli mamy fingerprint i duration
-    fp = (row.get("fingerprint") or "").strip()
+    #    (arkusz trzyma digest fp1:… – pełny fingerprint jest w magazynie)
+    from djlib.fingerprint_store import resolve_fingerprint
+    fp = resolve_fingerprint(row.get("fingerprint") or "")
     dur_txt = (row.get("duration_suggest") or "").strip()
     dur_sec = 0
     try:
@@ -1,14 +1,24 @@
 from __future__ import annotations
 
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Any
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import json
 import os
 import sys
 import shutil
-import hashlib
 import platform
 import subprocess
 
+from djlib.hashing import audio_payload_sha256, file_sha256  # noqa: F401  (file_sha256: re-eksport dla istniejących importów)
+from djlib.fingerprint_store import get_fingerprint, put_fingerprint
+
+# Ile plików przekazujemy jednemu wywołaniu fpcalc.
+FPCALC_GROUP_SIZE = 8
+# Limit czasu jednego wywołania fpcalc (s) – zarówno grupy, jak i ponownej próby
+# pojedynczego pliku (fpcalc czyta tylko początek utworu, zwykle < 1 s na plik).
+FPCALC_FILE_TIMEOUT = 120
+
 try:
     import acoustid  # type: ignore[import-not-found]  # pyacoustid
 except Exception as e:
@@ -94,14 +104,6 @@ def ensure_fpcalc_in_env() -> Path:
     return p
 
 
-def file_sha256(path: Path) -> str:
-    h = hashlib.sha256()
-    with path.open("rb") as f:
-        for chunk in iter(lambda: f.read(65536), b""):
-            h.update(chunk)
-    return h.hexdigest()
-
-
 def _normalize_fingerprint(fp: Any) -> str:
     """Sprowadza fingerprint do stringa (obsługa bytes/list/str)."""
     if fp is None:
@@ -118,10 +120,24 @@ def _normalize_fingerprint(fp: Any) -> str:
     return str(fp)
 
 
-def fingerprint_info(path: Path) -> tuple[int, str]:
-    """Zwraca (duration_sec, fingerprint_str). Wymaga fpcalc.
-    duration zwracamy jako int sekund.
+def fingerprint_info(path: Path, content_id: Optional[str] = None) -> tuple[int, str]:
+    """Zwraca (duration_sec, fingerprint_str); duration jako int sekund.
+
+    Wynik pochodzi z magazynu fingerprintów (``djlib.fingerprint_store``)
+    kluczowanego hashem payloadu audio; fpcalc uruchamiany jest tylko przy
+    braku wpisu. ``content_id`` pozwala podać znany już hash payloadu.
     """
+    cid = content_id or audio_payload_sha256(path)
+    cached = get_fingerprint(cid)
+    if cached is not None:
+        return cached
+    duration_sec, fp = _compute_fingerprint_info(path)
+    put_fingerprint(cid, duration_sec, fp)
+    return duration_sec, fp
+
+
+def _compute_fingerprint_info(path: Path) -> tuple[int, str]:
+    """Policz (duration_sec, fingerprint_str) przez fpcalc – bez magazynu."""
     fpcalc_path = ensure_fpcalc_in_env()
     # 1) Spróbuj przez pyacoustid (najprościej)
     try:
@@ -141,11 +157,13 @@ def fingerprint_info(path: Path) -> tuple[int, str]:
 
     # 2) Fallback: wywołaj fpcalc bezpośrednio (bez pyacoustid)
     try:
-        out = subprocess.run([str(fpcalc_path), "-json", str(path)], capture_output=True, text=True, check=False)
+        out = subprocess.run([str(fpcalc_path), "-json", str(path)], capture_output=True, text=True, check=False,
+                             timeout=FPCALC_FILE_TIMEOUT)
         txt = out.stdout.strip()
         # jeśli -json nie wspierane, spróbuj zwykłego trybu
         if out.returncode != 0 or not txt:
-            out = subprocess.run([str(fpcalc_path), str(path)], capture_output=True, text=True, check=False)
+            out = subprocess.run([str(fpcalc_path), str(path)], capture_output=True, text=True, check=False,
+                                 timeout=FPCALC_FILE_TIMEOUT)
             txt = out.stdout.strip()
         duration_sec = 0
         fp = ""
@@ -184,3 +202,120 @@ def audio_fingerprint(path: Path) -> str:
     """Zachowana kompatybilność: zwraca tylko fingerprint."""
     _, fp = fingerprint_info(path)
     return fp
+
+
+# ---------------------------
+# Wsadowy fpcalc (wiele plików na wywołanie, kilka grup równolegle)
+# ---------------------------
+
+FingerprintResult = Tuple[int, str, str]  # (duration_sec, fingerprint, error)
+
+
+def _parse_fpcalc_json_lines(txt: str) -> List[Tuple[int, str]]:
+    """``fpcalc -json a b c`` wypisuje jeden obiekt JSON na linię (bez nazwy pliku)."""
+    results: List[Tuple[int, str]] = []
+    for line in txt.splitlines():
+        line = line.strip()
+        if not line.startswith("{"):
+            continue
+        try:
+            j = json.loads(line)
+        except ValueError:
+            continue
+        try:
+            duration_sec = int(round(float(j.get("duration", 0))))
+        except (TypeError, ValueError):
+            duration_sec = 0
+        results.append((max(0, duration_sec), _normalize_fingerprint(j.get("fingerprint", "")).strip()))
+    return results
+
+
+def _run_fpcalc_group(fpcalc_path: Path, paths: Sequence[str], timeout: float) -> List[FingerprintResult]:
+    """Jedno wywołanie fpcalc dla grupy plików.
+
+    Wyniki JSON nie zawierają nazwy pliku, więc mapujemy je po kolejności –
+    tylko gdy liczba obiektów zgadza się z liczbą plików. W przeciwnym razie
+    (błąd któregoś pliku, timeout) każdy plik liczony jest osobno. Każde
+    wywołanie ma limit ``timeout``, więc uszkodzony plik kosztuje najwyżej dwa
+    dekodowania i dwa limity czasu, a nie blokuje reszty grupy.
+    """
+    try:
+        out = subprocess.run(
+            [str(fpcalc_path), "-json", *paths],
+            capture_output=True, text=True, check=False, timeout=timeout,
+        )
+        parsed = _parse_fpcalc_json_lines(out.stdout)
+        if len(parsed) == len(paths) and all(fp for _, fp in parsed):
+            return [(dur, fp, "") for dur, fp in parsed]
+        err = out.stderr.strip() or f"fpcalc exit={out.returncode}"
+    except subprocess.TimeoutExpired:
+        if len(paths) == 1:
+            return [(0, "", f"fpcalc: przekroczono limit {timeout:.0f} s")]
+        err = ""
+    except OSError as e:
+        return [(0, "", f"fpcalc: {e}")] * len(paths)
+
+    if len(paths) > 1:
+        return [r for p in paths for r in _run_fpcalc_group(fpcalc_path, [p], timeout)]
+    return [(0, "", err or f"fpcalc: brak fingerprintu dla {paths[0]}")]
+
+
+def fingerprint_many(
+    paths: Iterable[Path | str],
+    workers: int = 1,
+    group_size: int = FPCALC_GROUP_SIZE,
+    timeout: float = FPCALC_FILE_TIMEOUT,
+    content_ids: Optional[Dict[str, str]] = None,
+) -> Dict[str, FingerprintResult]:
+    """Fingerprinty wielu plików: ``{path: (duration_sec, fingerprint, error)}``.
+
+    Najpierw magazyn fingerprintów, potem brakujące pliki w grupach po
+    ``group_size`` na jedno wywołanie fpcalc, ``workers`` grup równolegle
+    (wątki – praca odbywa się w procesach fpcalc). Udane wyniki trafiają do
+    magazynu. ``content_ids`` (``{path: audio_payload_sha256}``) pozwala podać
+    hashe policzone wcześniej (``scan`` liczy je razem z ``file_hash``), żeby nie
+    czytać pliku drugi raz.
+    """
+    items = [str(p) for p in paths]
+    out: Dict[str, FingerprintResult] = {}
+    n = max(1, workers)
+
+    def _content_id(path: str) -> Tuple[str, str]:
+        if content_ids and content_ids.get(path):
+            return content_ids[path], ""
+        try:
+            return audio_payload_sha256(Path(path)), ""
+        except OSError as e:
+            return "", str(e)
+
+    pending: List[Tuple[str, str]] = []
+    with ThreadPoolExecutor(max_workers=n) as ex:
+        for path, (cid, err) in zip(items, ex.map(_content_id, items)):
+            if err:
+                out[path] = (0, "", err)
+                continue
+            cached = get_fingerprint(cid)
+            if cached is not None:
+                out[path] = (cached[0], cached[1], "")
+            else:
+                pending.append((path, cid))
+    if not pending:
+        return out
+
+    try:
+        fpcalc_path = ensure_fpcalc_in_env()
+    except RuntimeError as e:
+        for path, _ in pending:
+            out[path] = (0, "", str(e))
+        return out
+
+    size = max(1, group_size)
+    groups = [pending[i:i + size] for i in range(0, len(pending), size)]
+    with ThreadPoolExecutor(max_workers=n) as ex:
+        runs = ex.map(lambda g: _run_fpcalc_group(fpcalc_path, [p for p, _ in g], timeout), groups)
+        for group, results in zip(groups, runs):
+            for (path, cid), (dur, fp, err) in zip(group, results):
+                if fp:
+                    put_fingerprint(cid, dur, fp)
+                out[path] = (dur, fp, err)
+    return out
@@ -0,0 +1,351 @@
+"""Wykrywanie bliskich duplikatów na podstawie fingerprintów Chromaprint.
+
+Ten sam utwór z dwóch pul promo (inny enkoder, bitrate, kilka ms przesunięcia)
+ma inny string fingerprintu, ale jego sub-fingerprinty (uint32, ~8 na sekundę)
+różnią się tylko w kilku procentach bitów. Dlatego:
+
+1. ``decode_fingerprint`` – dekoduje skompresowany fingerprint (base64url,
+   jak zwraca fpcalc/pyacoustid) do tablicy ``uint32`` (NumPy, bez libchromaprint),
+2. ``similarity`` – 1 − (różne bity / wszystkie bity) dla najlepszego
+   przesunięcia w zakresie ``±max_offset`` (popcount XOR, wektorowo),
+3. ``FingerprintIndex`` – indeks LSH: górne ``bits`` bitów sub-fingerprintów
+   jako termy (spójnie próbkowane), a pary z co najmniej ``min_shared``
+   wspólnymi termami są kandydatami weryfikowanymi przez ``similarity``.
+   Zbiór termów nie zależy od przesunięcia w czasie.
+
+Fingerprinty nieskompresowane (liczby po przecinku) też są obsługiwane.
+"""
+
+from __future__ import annotations
+
+import base64
+from dataclasses import dataclass, field
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Domyślny próg podobieństwa: niezależne nagrania dają ~0.5 (losowe bity).
+DEFAULT_THRESHOLD = 0.8
+# ±80 sub-fingerprintów ≈ ±10 s przesunięcia.
+DEFAULT_MAX_OFFSET = 80
+# Minimalne wspólne pokrycie (sub-fingerprinty) przy porównaniu z przesunięciem.
+_MIN_OVERLAP = 16
+
+_MAX_NORMAL_VALUE = 7
+
+
+# ---------------------------
+# Dekodowanie / kodowanie formatu Chromaprint
+# ---------------------------
+
+def _b64decode(s: str) -> bytes:
+    s = s.strip()
+    return base64.urlsafe_b64decode(s + "=" * (-len(s) % 4))
+
+
+def _unpack_ints(data: bytes, width: int) -> np.ndarray:
+    """Rozpakuj ciąg liczb ``width``-bitowych (LSB first, jak w Chromaprint)."""
+    bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8), bitorder="little")
+    n = bits.size // width
+    bits = bits[: n * width].reshape(n, width)
+    out = bits[:, 0].astype(np.int64)
+    for k in range(1, width):
+        out += bits[:, k].astype(np.int64) << k
+    return out
+
+
+def _pack_ints(values: np.ndarray, width: int) -> bytes:
+    vals = np.asarray(values, dtype=np.int64)
+    bits = ((vals[:, None] >> np.arange(width)) & 1).astype(np.uint8).ravel()
+    return np.packbits(bits, bitorder="little").tobytes()
+
+
+def decode_fingerprint(fp: str) -> np.ndarray:
+    """Skompresowany fingerprint Chromaprint → ``uint32[]`` (pusta tablica przy błędzie)."""
+    fp = (fp or "").strip()
+    if not fp:
+        return np.zeros(0, dtype=np.uint32)
+    if "," in fp or fp.isdigit():
+        try:
+            return np.array([int(x) for x in fp.split(",") if x.strip()], dtype=np.int64).astype(np.uint32)
+        except ValueError:
+            return np.zeros(0, dtype=np.uint32)
+    try:
+        raw = _b64decode(fp)
+    except (ValueError, TypeError):
+        return np.zeros(0, dtype=np.uint32)
+    if len(raw) < 4:
+        return np.zeros(0, dtype=np.uint32)
+    count = int.from_bytes(raw[1:4], "big")
+    if count == 0:
+        return np.zeros(0, dtype=np.uint32)
+
+    normal = _unpack_ints(raw[4:], 3)
+    zeros = np.flatnonzero(normal == 0)
+    if zeros.size < count:
+        return np.zeros(0, dtype=np.uint32)
+    normal = normal[: zeros[count - 1] + 1]
+    exc_pos = np.flatnonzero(normal == _MAX_NORMAL_VALUE)
+    if exc_pos.size:
+        offset = 4 + (normal.size * 3 + 7) // 8
+        exceptional = _unpack_ints(raw[offset:], 5)
+        if exceptional.size < exc_pos.size:
+            return np.zeros(0, dtype=np.uint32)
+        normal = normal.copy()
+        normal[exc_pos] += exceptional[: exc_pos.size]
+
+    # Delty pozycji bitów → pozycje (kumulacja resetowana na zerach) → wartości.
+    item = np.concatenate(([0], np.cumsum(normal == 0)[:-1]))
+    nz = normal != 0
+    csum = np.cumsum(normal)
+    item_base = np.concatenate(([0], csum[zeros[: count - 1]]))
+    bit_pos = csum[nz] - item_base[item[nz]]
+    if bit_pos.size and (bit_pos.max() > 32 or bit_pos.min() < 1):
+        return np.zeros(0, dtype=np.uint32)
+    # Bity w obrębie sub-fingerprintu są różne, więc suma potęg 2 = OR (float64 dokładny do 2^53).
+    values = np.bincount(item[nz], weights=np.exp2(bit_pos - 1), minlength=count)
+    return np.bitwise_xor.accumulate(values.astype(np.uint32))
+
+
+def encode_fingerprint(values: Iterable[int], algorithm: int = 1) -> str:
+    """``uint32[]`` → skompresowany fingerprint (odwrotność ``decode_fingerprint``)."""
+    arr = np.asarray(list(values) if not isinstance(values, np.ndarray) else values, dtype=np.uint32)
+    deltas = arr.copy()
+    deltas[1:] ^= arr[:-1]
+    normal: List[int] = []
+    for x in deltas.tolist():
+        bit, last_bit = 1, 0
+        while x:
+            if x & 1:
+                normal.append(bit - last_bit)
+                last_bit = bit
+            x >>= 1
+            bit += 1
+        normal.append(0)
+    norm = np.array(normal, dtype=np.int64)
+    exceptional = norm[norm >= _MAX_NORMAL_VALUE] - _MAX_NORMAL_VALUE
+    header = bytes([algorithm & 0xFF]) + int(arr.size).to_bytes(3, "big")
+    body = _pack_ints(np.minimum(norm, _MAX_NORMAL_VALUE), 3)
+    if exceptional.size:
+        body += _pack_ints(exceptional, 5)
+    return base64.urlsafe_b64encode(header + body).decode("ascii").rstrip("=")
+
+
+# ---------------------------
+# Podobieństwo (Hamming z przesunięciem)
+# ---------------------------
+
+if hasattr(np, "bitwise_count"):
+    def _popcount(x: np.ndarray) -> np.ndarray:
+        return np.bitwise_count(x)
+else:  # pragma: no cover - NumPy < 2.0
+    _POP8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def _popcount(x: np.ndarray) -> np.ndarray:
+        return _POP8[x.view(np.uint8)].reshape(x.shape + (4,)).sum(axis=-1)
+
+
+def similarity(a: np.ndarray, b: np.ndarray, max_offset: int = DEFAULT_MAX_OFFSET) -> float:
+    """Najlepsze podobieństwo bitowe (0..1) po przesunięciach ``-max_offset..max_offset``."""
+    if a.size == 0 or b.size == 0:
+        return 0.0
+    min_overlap = min(_MIN_OVERLAP, a.size, b.size)
+    best = 0.0
+    for off in range(-max_offset, max_offset + 1):
+        if off >= 0:
+            x, y = a[off:], b
+        else:
+            x, y = a, b[-off:]
+        n = min(x.size, y.size)
+        if n < min_overlap:
+            continue
+        diff = int(_popcount(np.bitwise_xor(x[:n], y[:n])).sum())
+        score = 1.0 - diff / (32.0 * n)
+        if score > best:
+            best = score
+    return best
+
+
+def fingerprint_similarity(fp_a: str, fp_b: str, max_offset: int = DEFAULT_MAX_OFFSET) -> float:
+    if fp_a and fp_a == fp_b:
+        return 1.0
+    return similarity(decode_fingerprint(fp_a), decode_fingerprint(fp_b), max_offset)
+
+
+# ---------------------------
+# Indeks LSH
+# ---------------------------
+
+_TERM_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+
+@dataclass
+class FingerprintIndex:
+    """Indeks bliskich duplikatów: ``add(key, fp)``, ``query(fp)``, ``pairs()``.
+
+    Term = górne ``bits`` bitów sub-fingerprintu; zapisujemy tylko termy, których
+    hash daje resztę 0 mod ``sample`` (ten sam podzbiór w każdym utworze).
+    Termy częstsze niż ``max_df`` (cisza, szum) są pomijane przy szukaniu par.
+    Nowo dodane wpisy trafiają do małej listy sprawdzanej bezpośrednio;
+    posortowana tablica termów jest przebudowywana co ``rebuild_every`` wpisów.
+    Wiele wpisów naraz (np. cała biblioteka) – ``extend``/``from_items``: jedna
+    przebudowa zamiast jednej na ``rebuild_every`` wpisów.
+    """
+
+    bits: int = 24
+    sample: int = 4
+    min_shared: int = 4
+    max_df: int = 64
+    max_offset: int = DEFAULT_MAX_OFFSET
+    rebuild_every: int = 256
+    keys: List[Hashable] = field(default_factory=list)
+    _arrays: List[np.ndarray] = field(default_factory=list, repr=False)
+    _fps: List[str] = field(default_factory=list, repr=False)
+    _exact: Dict[str, int] = field(default_factory=dict, repr=False)
+    _terms: List[np.ndarray] = field(default_factory=list, repr=False)
+    _sorted_terms: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.uint32), repr=False)
+    _sorted_ids: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64), repr=False)
+    _built: int = 0
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _terms_of(self, arr: np.ndarray) -> np.ndarray:
+        t = np.unique(arr >> np.uint32(32 - self.bits))
+        if self.sample > 1:
+            h = (t.astype(np.uint64) * _TERM_MIX) >> np.uint64(40)
+            t = t[h % np.uint64(self.sample) == 0]
+        return t
+
+    @classmethod
+    def from_items(cls, items: Iterable[Tuple[Hashable, str]], **params: int) -> "FingerprintIndex":
+        """Indeks z par ``(key, fp)`` zbudowany jednorazowo."""
+        index = cls(**params)
+        index.extend(items)
+        return index
+
+    def _append(self, key: Hashable, fp: str) -> None:
+        fp = (fp or "").strip()
+        arr = decode_fingerprint(fp)
+        self.keys.append(key)
+        self._fps.append(fp)
+        self._arrays.append(arr)
+        self._terms.append(self._terms_of(arr) if arr.size else np.zeros(0, dtype=np.uint32))
+        if fp:
+            self._exact.setdefault(fp, len(self.keys) - 1)
+
+    def add(self, key: Hashable, fp: str) -> None:
+        self._append(key, fp)
+        if len(self.keys) - self._built > self.rebuild_every:
+            self._build()
+
+    def extend(self, items: Iterable[Tuple[Hashable, str]]) -> None:
+        """Dodaj wiele wpisów i przebuduj tablicę termów raz (O(n log n) zamiast O(n²))."""
+        for key, fp in items:
+            self._append(key, fp)
+        if len(self.keys) > self._built:
+            self._build()
+
+    def _build(self) -> None:
+        n = len(self.keys)
+        if not n:
+            return
+        ids = np.concatenate([np.full(t.size, i, dtype=np.int64) for i, t in enumerate(self._terms)])
+        terms = np.concatenate(self._terms)
+        order = np.argsort(terms, kind="stable")
+        self._sorted_terms = terms[order]
+        self._sorted_ids = ids[order]
+        self._built = n
+
+    def _candidates(self, terms: np.ndarray) -> List[int]:
+        counts: Dict[int, int] = {}
+        if terms.size and self._sorted_terms.size:
+            lo = np.searchsorted(self._sorted_terms, terms, side="left")
+            hi = np.searchsorted(self._sorted_terms, terms, side="right")
+            df = hi - lo
+            keep = (df > 0) & (df <= self.max_df)
+            if keep.any():
+                hits = np.concatenate([self._sorted_ids[a:b] for a, b in zip(lo[keep], hi[keep])])
+                uniq, cnt = np.unique(hits, return_counts=True)
+                counts.update(zip(uniq.tolist(), cnt.tolist()))
+        for i in range(self._built, len(self.keys)):
+            shared = np.intersect1d(terms, self._terms[i], assume_unique=True).size
+            if shared:
+                counts[i] = shared
+        need = self._min_shared_for(terms.size)
+        return [i for i, c in counts.items() if c >= need]
+
+    def _min_shared_for(self, n_terms: int) -> int:
+        # krótkie fragmenty mają mało termów – próg nie może przekroczyć ich liczby
+        return max(1, min(self.min_shared, n_terms // 4 or 1))
+
+    def query(self, fp: str, threshold: float = DEFAULT_THRESHOLD) -> List[Tuple[Hashable, float]]:
+        """Wpisy podobne do ``fp`` (``similarity >= threshold``), malejąco."""
+        fp = (fp or "").strip()
+        out: Dict[int, float] = {}
+        if fp in self._exact:
+            for i, other in enumerate(self._fps):
+                if other == fp:
+                    out[i] = 1.0
+        arr = decode_fingerprint(fp)
+        if arr.size:
+            for i in self._candidates(self._terms_of(arr)):
+                if i in out:
+                    continue
+                score = similarity(arr, self._arrays[i], self.max_offset)
+                if score >= threshold:
+                    out[i] = score
+        return sorted(((self.keys[i], s) for i, s in out.items()), key=lambda kv: -kv[1])
+
+    def best_match(self, fp: str, threshold: float = DEFAULT_THRESHOLD) -> Optional[Tuple[Hashable, float]]:
+        hits = self.query(fp, threshold)
+        return hits[0] if hits else None
+
+    def candidate_pairs(self) -> np.ndarray:
+        """Pary ``(i, j)``, i < j, z co najmniej ``min_shared`` wspólnymi termami."""
+        self._build()
+        terms, ids = self._sorted_terms, self._sorted_ids
+        if terms.size == 0:
+            return np.zeros((0, 2), dtype=np.int64)
+        starts = np.flatnonzero(np.concatenate(([True], terms[1:] != terms[:-1])))
+        sizes = np.diff(np.concatenate((starts, [terms.size])))
+        chunks: List[np.ndarray] = []
+        for size in np.unique(sizes):
+            if size < 2 or size > self.max_df:
+                continue
+            group_starts = starts[sizes == size]
+            a_idx, b_idx = np.triu_indices(int(size), k=1)
+            a = ids[group_starts[:, None] + a_idx[None, :]].ravel()
+            b = ids[group_starts[:, None] + b_idx[None, :]].ravel()
+            lo, hi = np.minimum(a, b), np.maximum(a, b)
+            chunks.append(lo * len(self.keys) + hi)
+        if not chunks:
+            return np.zeros((0, 2), dtype=np.int64)
+        codes, counts = np.unique(np.concatenate(chunks), return_counts=True)
+        n_terms = np.array([t.size for t in self._terms])
+        lo, hi = codes // len(self.keys), codes % len(self.keys)
+        need = np.maximum(1, np.minimum(self.min_shared, np.maximum(np.minimum(n_terms[lo], n_terms[hi]) // 4, 1)))
+        keep = (counts >= need) & (lo != hi)
+        return np.stack((lo[keep], hi[keep]), axis=1)
+
+    def pairs(self, threshold: float = DEFAULT_THRESHOLD) -> List[Tuple[Hashable, Hashable, float]]:
+        """Wszystkie pary bliskich duplikatów w indeksie (``similarity >= threshold``)."""
+        out: Dict[Tuple[int, int], float] = {}
+        for idxs in self._exact_groups():
+            for x in range(len(idxs)):
+                for y in range(x + 1, len(idxs)):
+                    out[(idxs[x], idxs[y])] = 1.0
+        for i, j in self.candidate_pairs().tolist():
+            if (i, j) in out:
+                continue
+            score = similarity(self._arrays[i], self._arrays[j], self.max_offset)
+            if score >= threshold:
+                out[(i, j)] = score
+        return [(self.keys[i], self.keys[j], s) for (i, j), s in sorted(out.items())]
+
+    def _exact_groups(self) -> List[List[int]]:
+        groups: Dict[str, List[int]] = {}
+        for i, fp in enumerate(self._fps):
+            if fp:
+                groups.setdefault(fp, []).append(i)
+        return [g for g in groups.values() if len(g) > 1]
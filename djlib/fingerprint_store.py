@@ -0,0 +1,247 @@
+"""Trwały magazyn fingerprintów.
+
+``LOGS/fingerprints.sqlite`` zawiera dwie tabele:
+
+- ``fingerprint_blobs``: digest → skompresowany fingerprint (BLOB). Fingerprint
+  Chromaprint (base64url) trzymamy jako zdekodowane bajty, listę liczb jako
+  spakowane ``uint32`` przez zlib. W ``library.csv``/``unsorted.xlsx`` zostaje
+  tylko krótki digest (``fp1:…``) – ``resolve_fingerprint(s)`` zamienia go z
+  powrotem na pełny fingerprint.
+- ``fingerprints``: content_id → (duration, digest). fpcalc dekoduje cały plik,
+  więc jego wynik zapisujemy pod hashem payloadu audio
+  (``djlib.hashing.audio_payload_sha256``) – ten sam plik, jego kopia albo wersja
+  z przepisanymi tagami trafia do fpcalc najwyżej raz. Nieudane próby nie są
+  zapisywane (brak fpcalc może być chwilowy).
+
+Połączenie otwierane jest per wywołanie z ``timeout`` i WAL, bo z magazynu
+korzystają równolegle procesy potomne ``scan``.
+"""
+
+from __future__ import annotations
+
+import base64
+import binascii
+import hashlib
+import sqlite3
+import struct
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from djlib.config import LOGS_DIR
+
+DIGEST_PREFIX = "fp1:"
+_DIGEST_HEX = 20
+
+# Kodowanie BLOB-a
+_ENC_CHROMAPRINT = "chromaprint"  # zdekodowany base64url
+_ENC_UINT32 = "u32z"              # zlib(uint32 LE) – fingerprint "po przecinku"
+_ENC_TEXT = "textz"               # zlib(utf-8) – inne
+
+
+def store_path() -> Path:
+    LOGS_DIR.mkdir(parents=True, exist_ok=True)
+    return LOGS_DIR / "fingerprints.sqlite"
+
+
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(store_path(), timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS fingerprints (
+            content_id TEXT PRIMARY KEY,
+            duration INTEGER NOT NULL,
+            fingerprint TEXT NOT NULL,
+            created_at TEXT
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS fingerprint_blobs (
+            digest TEXT PRIMARY KEY,
+            encoding TEXT NOT NULL,
+            data BLOB NOT NULL
+        )
+        """
+    )
+    return conn
+
+
+# ---------------------------
+# Digest + kodowanie BLOB-ów
+# ---------------------------
+
+def is_fingerprint_digest(value: str) -> bool:
+    return (value or "").startswith(DIGEST_PREFIX)
+
+
+def fingerprint_digest(fp: str) -> str:
+    """Krótki, stabilny identyfikator fingerprintu do plików tabelarycznych."""
+    fp = (fp or "").strip()
+    if not fp or is_fingerprint_digest(fp):
+        return fp
+    return DIGEST_PREFIX + hashlib.sha256(fp.encode("utf-8")).hexdigest()[:_DIGEST_HEX]
+
+
+def _encode_blob(fp: str) -> Tuple[str, bytes]:
+    if "," in fp:
+        try:
+            vals = [int(x) & 0xFFFFFFFF for x in fp.split(",")]
+            packed = struct.pack(f"<{len(vals)}I", *vals)
+            if ",".join(str(v) for v in vals) == fp:
+                return _ENC_UINT32, zlib.compress(packed, 6)
+        except ValueError:
+            pass
+    else:
+        try:
+            raw = base64.urlsafe_b64decode(fp + "=" * (-len(fp) % 4))
+            if base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=") == fp:
+                return _ENC_CHROMAPRINT, raw
+        except (ValueError, binascii.Error):
+            pass
+    return _ENC_TEXT, zlib.compress(fp.encode("utf-8"), 6)
+
+
+def _decode_blob(encoding: str, data: bytes) -> str:
+    if encoding == _ENC_CHROMAPRINT:
+        return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+    if encoding == _ENC_UINT32:
+        raw = zlib.decompress(data)
+        return ",".join(str(v) for v in struct.unpack(f"<{len(raw) // 4}I", raw))
+    return zlib.decompress(data).decode("utf-8")
+
+
+def _put_blobs(conn: sqlite3.Connection, fps: Iterable[str]) -> List[str]:
+    digests: List[str] = []
+    rows = []
+    for fp in fps:
+        fp = (fp or "").strip()
+        if not fp or is_fingerprint_digest(fp):
+            digests.append(fp)
+            continue
+        d = fingerprint_digest(fp)
+        digests.append(d)
+        rows.append((d, *_encode_blob(fp)))
+    if rows:
+        conn.executemany(
+            "INSERT OR IGNORE INTO fingerprint_blobs (digest, encoding, data) VALUES (?, ?, ?)", rows
+        )
+    return digests
+
+
+def store_fingerprints(fps: Iterable[str]) -> List[str]:
+    """Zapisz fingerprinty jako BLOB-y; zwraca digesty (w tej samej kolejności).
+
+    Puste wartości i gotowe digesty przechodzą bez zmian.
+    """
+    conn = _connect()
+    try:
+        digests = _put_blobs(conn, fps)
+        conn.commit()
+    finally:
+        conn.close()
+    return digests
+
+
+def store_fingerprint(fp: str) -> str:
+    return store_fingerprints([fp])[0]
+
+
+def compact_rows(rows: List[Dict[str, str]], column: str = "fingerprint") -> int:
+    """Zamień pełne fingerprinty w wierszach na digesty (BLOB-y do magazynu).
+
+    Zwraca liczbę zmienionych wierszy; wiersze z digestem są pomijane.
+    """
+    todo = [r for r in rows if (r.get(column) or "").strip() and not is_fingerprint_digest(r.get(column) or "")]
+    if not todo:
+        return 0
+    for r, d in zip(todo, store_fingerprints(r[column] for r in todo)):
+        r[column] = d
+    return len(todo)
+
+
+def resolve_fingerprints(values: Iterable[str]) -> Dict[str, str]:
+    """``{wartość z arkusza: pełny fingerprint}``; nieznane digesty są pomijane.
+
+    Pełne fingerprinty (stare wiersze) mapowane są same na siebie.
+    """
+    out: Dict[str, str] = {}
+    wanted: List[str] = []
+    for v in values:
+        v = (v or "").strip()
+        if not v:
+            continue
+        if is_fingerprint_digest(v):
+            wanted.append(v)
+        else:
+            out[v] = v
+    if not wanted:
+        return out
+    conn = _connect()
+    try:
+        uniq = list(dict.fromkeys(wanted))
+        for i in range(0, len(uniq), 500):
+            chunk = uniq[i:i + 500]
+            q = ",".join("?" * len(chunk))
+            for d, enc, data in conn.execute(
+                f"SELECT digest, encoding, data FROM fingerprint_blobs WHERE digest IN ({q})", chunk
+            ):
+                out[d] = _decode_blob(enc, data)
+    finally:
+        conn.close()
+    return out
+
+
+def resolve_fingerprint(value: str) -> str:
+    """Digest (``fp1:…``) → pełny fingerprint; inne wartości bez zmian, nieznany digest → ""."""
+    value = (value or "").strip()
+    if not is_fingerprint_digest(value):
+        return value
+    return resolve_fingerprints([value]).get(value, "")
+
+
+# ---------------------------
+# content_id → (duration, fingerprint)
+# ---------------------------
+
+def get_fingerprint(content_id: str) -> Optional[Tuple[int, str]]:
+    if not content_id:
+        return None
+    conn = _connect()
+    try:
+        row = conn.execute(
+            """
+            SELECT f.duration, f.fingerprint, b.encoding, b.data
+            FROM fingerprints f LEFT JOIN fingerprint_blobs b ON b.digest = f.fingerprint
+            WHERE f.content_id=?
+            """,
+            (content_id,),
+        ).fetchone()
+    finally:
+        conn.close()
+    if not row or not row[1]:
+        return None
+    fp = str(row[1])
+    if is_fingerprint_digest(fp):
+        if row[3] is None:
+            return None
+        fp = _decode_blob(row[2], row[3])
+    return int(row[0] or 0), fp
+
+
+def put_fingerprint(content_id: str, duration: int, fingerprint: str) -> None:
+    if not content_id or not fingerprint:
+        return
+    conn = _connect()
+    try:
+        digest = _put_blobs(conn, [fingerprint])[0]
+        conn.execute(
+            "INSERT OR REPLACE INTO fingerprints (content_id, duration, fingerprint, created_at) VALUES (?, ?, ?, ?)",
+            (content_id, int(duration or 0), digest, datetime.utcnow().isoformat()),
+        )
+        conn.commit()
+    finally:
+        conn.close()
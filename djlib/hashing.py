@@ -0,0 +1,274 @@
+"""Hashowanie plików audio.
+
+- ``file_sha256`` – SHA-256 całego pliku (``file_hash`` w CSV/XLSX),
+- ``sampled_sha256`` – tani hash próbkowany (rozmiar + początek/środek/koniec),
+  używany przez ``scan`` jako prefiltr przed pełnym SHA-256 (``quick_hash``),
+- ``audio_payload_sha256`` – SHA-256 samych danych audio, z pominięciem
+  kontenerów metadanych (ID3v1/v2, APEv2, Lyrics3, bloki metadanych FLAC,
+  strony nagłówkowe Ogg, atomy MP4 poza ``mdat``, chunki RIFF/AIFF poza
+  ``data``/``SSND``). Zapis tagów nie zmienia tego hasha, dlatego jest
+  kluczem cache analizy audio (``djlib.audio.cache.compute_audio_id``).
+
+Duże pliki (mastery WAV/AIFF, miksy) czytane są przez mmap i podawane do
+hashlib jako ``memoryview`` (bez kopii); gdy mmap nie działa, ``readinto``
+do jednego bufora. ``scripts/bench_file_hash.py`` porównuje obie ścieżki.
+
+Moduł nie zależy od pyacoustid/fpcalc, więc może być importowany wszędzie.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import io
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+
+# Blok odczytu dla ścieżki bez mmap (readinto do jednego bufora).
+CHUNK_SIZE = 1 << 20
+# Plik mapowany jest do pamięci od tego rozmiaru; mniejsze czytamy zwykle.
+MMAP_MIN_SIZE = 4 << 20
+# Ile bajtów mapy podajemy naraz do hashlib (hashlib zwalnia GIL dla > 2 KiB).
+MMAP_BLOCK = 8 << 20
+SAMPLE_BLOCK = 65536
+
+Range = Tuple[int, int]  # [start, end)
+
+
+def _iter_blocks(f: BinaryIO, size: int, block: Optional[int] = None) -> Iterator[memoryview]:
+    """Kolejne bloki pliku jako ``memoryview`` – bez tworzenia ``bytes`` per blok.
+
+    Duże pliki (≥ ``MMAP_MIN_SIZE``) są mapowane do pamięci i krojone na
+    widoki; gdy mmap nie jest wspierany (FUSE, SMB, pipe…) albo plik jest mały,
+    czytamy ``readinto`` do jednego, wielokrotnie używanego bufora. Widok jest
+    ważny tylko do następnego kroku iteracji.
+    """
+    if size >= MMAP_MIN_SIZE:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError, io.UnsupportedOperation):
+            mm = None
+        if mm is not None:
+            step = block or MMAP_BLOCK
+            try:
+                with memoryview(mm) as view:
+                    for off in range(0, len(mm), step):
+                        with view[off:off + step] as chunk:
+                            yield chunk
+            finally:
+                mm.close()
+            return
+    buf = bytearray(block or CHUNK_SIZE)
+    view = memoryview(buf)
+    f.seek(0)
+    while True:
+        n = f.readinto(buf)
+        if not n:
+            break
+        yield view[:n]
+
+
+def file_sha256(path: Path, block: Optional[int] = None) -> str:
+    """SHA-256 całego pliku; ``block`` nadpisuje domyślny rozmiar bloku."""
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        for chunk in _iter_blocks(f, size, block):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def sampled_sha256(path: Path, block: int = SAMPLE_BLOCK) -> str:
+    """SHA-256 z rozmiaru pliku i trzech bloków (początek, środek, koniec).
+
+    Czyta najwyżej ``3 * block`` bajtów. Różne ``sampled_sha256`` ⇒ różne pliki;
+    równe – tylko kandydat na duplikat, do potwierdzenia pełnym ``file_sha256``.
+    """
+    size = path.stat().st_size
+    h = hashlib.sha256()
+    h.update(size.to_bytes(8, "little"))
+    with path.open("rb") as f:
+        if size <= 3 * block:
+            h.update(f.read())
+        else:
+            for off in (0, (size - block) // 2, size - block):
+                f.seek(off)
+                h.update(f.read(block))
+    return h.hexdigest()
+
+
+# ---------------------------
+# Zakresy danych audio per kontener
+# ---------------------------
+
+def _syncsafe(b: bytes) -> int:
+    return (b[0] << 21) | (b[1] << 14) | (b[2] << 7) | b[3]
+
+
+def _strip_tag_framing(f: BinaryIO, start: int, end: int) -> Range:
+    """Pomiń ID3v2 na początku oraz ID3v1/APEv2/Lyrics3v2 na końcu zakresu."""
+    # ID3v2 (może wystąpić kilka po sobie)
+    while end - start >= 10:
+        f.seek(start)
+        hdr = f.read(10)
+        if hdr[:3] != b"ID3":
+            break
+        size = 10 + _syncsafe(hdr[6:10]) + (10 if hdr[5] & 0x10 else 0)
+        start = min(end, start + size)
+
+    changed = True
+    while changed and end > start:
+        changed = False
+        # ID3v1
+        if end - start >= 128:
+            f.seek(end - 128)
+            if f.read(3) == b"TAG":
+                end -= 128
+                changed = True
+                continue
+        # APEv2 (stopka 32 B; rozmiar obejmuje stopkę, nagłówek opcjonalny)
+        if end - start >= 32:
+            f.seek(end - 32)
+            foot = f.read(32)
+            if foot[:8] == b"APETAGEX":
+                size, flags = struct.unpack("<II", foot[12:20])
+                size += 32 if flags & 0x80000000 else 0
+                end = max(start, end - size)
+                changed = True
+                continue
+        # Lyrics3v2
+        if end - start >= 15:
+            f.seek(end - 15)
+            tail = f.read(15)
+            if tail[6:] == b"LYRICS200" and tail[:6].isdigit():
+                end = max(start, end - 15 - int(tail[:6]))
+                changed = True
+    return start, end
+
+
+def _flac_ranges(f: BinaryIO, size: int) -> List[Range]:
+    pos = 4
+    while pos + 4 <= size:
+        f.seek(pos)
+        hdr = f.read(4)
+        last = hdr[0] & 0x80
+        pos += 4 + int.from_bytes(hdr[1:4], "big")
+        if last:
+            break
+    return [_strip_tag_framing(f, min(pos, size), size)]
+
+
+def _ogg_ranges(f: BinaryIO, size: int) -> List[Range]:
+    """Payloady stron audio (granule != 0). Nagłówki Vorbis/Opus (w tym komentarze)
+    leżą na stronach z granule 0, a przepisanie komentarzy zmienia tylko numery
+    sekwencji/CRC kolejnych stron – nie ich payload."""
+    ranges: List[Range] = []
+    pos = 0
+    while pos + 27 <= size:
+        f.seek(pos)
+        hdr = f.read(27)
+        if hdr[:4] != b"OggS":
+            break
+        granule = struct.unpack("<q", hdr[6:14])[0]
+        nseg = hdr[26]
+        seg_table = f.read(nseg)
+        body = pos + 27 + nseg
+        length = sum(seg_table)
+        if granule != 0:
+            ranges.append((body, min(size, body + length)))
+        pos = body + length
+    return ranges
+
+
+def _mp4_ranges(f: BinaryIO, size: int) -> List[Range]:
+    ranges: List[Range] = []
+    pos = 0
+    while pos + 8 <= size:
+        f.seek(pos)
+        hdr = f.read(8)
+        atom_size = struct.unpack(">I", hdr[:4])[0]
+        kind = hdr[4:8]
+        header = 8
+        if atom_size == 1:
+            atom_size = struct.unpack(">Q", f.read(8))[0]
+            header = 16
+        elif atom_size == 0:
+            atom_size = size - pos
+        if atom_size < header:
+            break
+        if kind == b"mdat":
+            ranges.append((pos + header, min(size, pos + atom_size)))
+        pos += atom_size
+    return ranges
+
+
+def _iff_ranges(f: BinaryIO, size: int, *, little: bool, audio_chunk: bytes) -> List[Range]:
+    ranges: List[Range] = []
+    fmt = "<I" if little else ">I"
+    pos = 12
+    while pos + 8 <= size:
+        f.seek(pos)
+        hdr = f.read(8)
+        chunk_size = struct.unpack(fmt, hdr[4:8])[0]
+        if hdr[:4] == audio_chunk:
+            ranges.append((pos + 8, min(size, pos + 8 + chunk_size)))
+        pos += 8 + chunk_size + (chunk_size & 1)
+    return ranges
+
+
+def audio_payload_ranges(f: BinaryIO, size: int) -> List[Range]:
+    """Zwróć zakresy bajtów z danymi audio; pusta lista = nie rozpoznano danych."""
+    f.seek(0)
+    head = f.read(12)
+    try:
+        if head[:4] == b"fLaC":
+            ranges = _flac_ranges(f, size)
+        elif head[:4] == b"OggS":
+            ranges = _ogg_ranges(f, size)
+        elif head[4:8] == b"ftyp":
+            ranges = _mp4_ranges(f, size)
+        elif head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+            ranges = _iff_ranges(f, size, little=True, audio_chunk=b"data")
+        elif head[:4] == b"FORM" and head[8:12] in (b"AIFF", b"AIFC"):
+            ranges = _iff_ranges(f, size, little=False, audio_chunk=b"SSND")
+        else:
+            # MP3/AAC/WV i inne strumienie: dane audio = plik bez ramek tagów
+            ranges = [_strip_tag_framing(f, 0, size)]
+    except (struct.error, IndexError, ValueError):
+        return []
+    return [(s, e) for s, e in ranges if e > s]
+
+
+def audio_ids(path: Path) -> Tuple[str, str]:
+    """Policz w jednym przebiegu ``(file_sha256, audio_payload_sha256)``.
+
+    Gdy nie rozpoznano danych audio, hash payloadu jest równy hashowi pliku.
+    """
+    size = path.stat().st_size
+    full = hashlib.sha256()
+    payload = hashlib.sha256()
+    with path.open("rb") as f:
+        ranges = audio_payload_ranges(f, size)
+        pos = 0
+        ri = 0
+        for chunk in _iter_blocks(f, size):
+            full.update(chunk)
+            end = pos + len(chunk)
+            while ri < len(ranges) and ranges[ri][0] < end:
+                s, e = ranges[ri]
+                lo = max(s, pos) - pos
+                hi = min(e, end) - pos
+                if hi > lo:
+                    payload.update(chunk[lo:hi])
+                if e > end:
+                    break
+                ri += 1
+            pos = end
+    full_hex = full.hexdigest()
+    return full_hex, (payload.hexdigest() if ranges else full_hex)
+
+
+def audio_payload_sha256(path: Path) -> str:
+    return audio_ids(path)[1]
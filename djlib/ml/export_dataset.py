@@ -5,12 +5,14 @@ Utilities for exporting Essentia features + user labels into a training CSV.
 from __future__ import annotations
 
 import csv
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, Iterable, Tuple
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
 
-from djlib.audio.cache import compute_audio_id, get_analysis
+from djlib.audio.cache import compute_audio_id, get_store
 from djlib.config import CSV_PATH
 from djlib.csvdb import load_records
+from djlib.scan_pipeline import default_workers
 
 
 REPO_ROOT = Path(__file__).resolve().parents[1]
@@ -42,6 +44,39 @@ def _resolve_audio_id(row: Dict[str, str]) -> Tuple[str | None, bool]:
         return None, False
 
 
+def _resolve_audio_ids(rows: Sequence[Dict[str, str]], workers: int) -> List[Tuple[str | None, bool]]:
+    """``_resolve_audio_id`` for every row; rows without file_hash are hashed in a thread pool.
+
+    hashlib releases the GIL on large buffers, so threads scale on I/O and CPU.
+    """
+    out: List[Tuple[str | None, bool]] = [(None, False)] * len(rows)
+    todo: List[int] = []
+    for i, row in enumerate(rows):
+        if (row.get("file_hash") or "").strip():
+            out[i] = _resolve_audio_id(row)
+        else:
+            todo.append(i)
+    if workers <= 1 or len(todo) <= 1:
+        for i in todo:
+            out[i] = _resolve_audio_id(rows[i])
+        return out
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        for i, res in zip(todo, ex.map(lambda i: _resolve_audio_id(rows[i]), todo)):
+            out[i] = res
+    return out
+
+
+def _labels(row: Dict[str, str]) -> Tuple[str, str]:
+    return (row.get("genre") or "").strip(), (row.get("target_subfolder") or "").strip()
+
+
+def _has_labels(row: Dict[str, str], require_both: bool) -> bool:
+    genre_label, bucket_label = _labels(row)
+    if require_both:
+        return bool(genre_label and bucket_label)
+    return bool(genre_label or bucket_label)
+
+
 def _flatten_analysis(analysis: Dict[str, Any]) -> Dict[str, Any]:
     """Remove nested blobs and keep scalar Essentia features."""
     flat = {}
@@ -52,17 +87,44 @@ def _flatten_analysis(analysis: Dict[str, Any]) -> Dict[str, Any]:
     return flat
 
 
+_LIBRARY_META_KEYS = (
+    "bpm",
+    "key_camelot",
+    "energy_hint",
+    "must_play",
+    "occasion_tags",
+    "notes",
+    "pop_playcount",
+    "pop_listeners",
+    "is_duplicate",
+)
+
+
+def _build_record(row: Dict[str, str], analysis: Dict[str, Any]) -> Dict[str, Any]:
+    record = _flatten_analysis(analysis)
+    record["genre_label"], record["bucket_label"] = _labels(row)
+    record["file_path"] = (row.get("final_path") or row.get("file_path") or "").strip()
+    record["track_id"] = row.get("track_id")
+    for meta_key in _LIBRARY_META_KEYS:
+        record[f"library_{meta_key}"] = row.get(meta_key)
+    return record
+
+
 def export_training_dataset(
     out_path: Path | str | None = None,
     *,
     require_both_labels: bool = False,
+    workers: int | None = None,
 ) -> Dict[str, Any]:
-    """Export Essentia features + genre/bucket labels to a CSV file."""
+    """Export Essentia features + genre/bucket labels to a CSV file.
+
+    The library is loaded once, features are fetched with a single JOIN in the
+    analysis cache and rows are streamed straight to the CSV writer.
+    """
     dest = Path(out_path) if out_path else DEFAULT_EXPORT_PATH
     dest.parent.mkdir(parents=True, exist_ok=True)
 
     rows = load_records(CSV_PATH)
-    dataset_rows = []
     stats = {
         "total_rows": len(rows),
         "missing_audio_id": 0,
@@ -71,59 +133,43 @@ def export_training_dataset(
         "computed_hashes": 0,
     }
 
-    for row in rows:
-        audio_id, computed_now = _resolve_audio_id(row)
+    resolved: List[Tuple[Dict[str, str], str]] = []
+    ids = _resolve_audio_ids(rows, workers if workers is not None else default_workers())
+    for row, (audio_id, computed_now) in zip(rows, ids):
         if not audio_id:
             stats["missing_audio_id"] += 1
             continue
         if computed_now:
             stats["computed_hashes"] += 1
-
-        analysis = get_analysis(audio_id)
-        if not analysis:
-            stats["missing_features"] += 1
-            continue
-
-        genre_label = (row.get("genre") or "").strip()
-        bucket_label = (row.get("target_subfolder") or "").strip()
-        if require_both_labels and (not genre_label or not bucket_label):
-            stats["missing_labels"] += 1
-            continue
-        if not genre_label and not bucket_label:
-            stats["missing_labels"] += 1
-            continue
-
-        record = _flatten_analysis(analysis)
-        record["genre_label"] = genre_label
-        record["bucket_label"] = bucket_label
-        record["file_path"] = (row.get("final_path") or row.get("file_path") or "").strip()
-        record["track_id"] = row.get("track_id")
-        for meta_key in (
-            "bpm",
-            "key_camelot",
-            "energy_hint",
-            "must_play",
-            "occasion_tags",
-            "notes",
-            "pop_playcount",
-            "pop_listeners",
-            "is_duplicate",
-        ):
-            record[f"library_{meta_key}"] = row.get(meta_key)
-        dataset_rows.append(record)
-
-    if dataset_rows:
-        fieldnames = _collect_fieldnames(dataset_rows)
-        with dest.open("w", newline="", encoding="utf-8") as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            for rec in dataset_rows:
-                writer.writerow({k: rec.get(k, "") for k in fieldnames})
-    else:
+        resolved.append((row, audio_id))
+
+    store = get_store()
+    audio_ids = [audio_id for _, audio_id in resolved]
+    keep = [_has_labels(row, require_both_labels) for row, _ in resolved]
+    columns = [k for k in store.feature_keys(audio_ids, keep) if k != "extras"]
+    meta = ["file_path", "track_id"] + [f"library_{k}" for k in _LIBRARY_META_KEYS]
+    fieldnames = _collect_fieldnames([dict.fromkeys(columns + meta + ["genre_label", "bucket_label"])])
+
+    exported = 0
+    joined = 0
+    with dest.open("w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore")
+        writer.writeheader()
+        for idx, analysis in store.iter_join(audio_ids):
+            joined += 1
+            if not keep[idx]:
+                stats["missing_labels"] += 1
+                continue
+            record = _build_record(resolved[idx][0], analysis)
+            writer.writerow({k: record.get(k, "") for k in fieldnames})
+            exported += 1
+    stats["missing_features"] = len(resolved) - joined
+
+    if not exported:
         # Still create an empty file with header for downstream tooling
         dest.write_text("genre_label,bucket_label\n", encoding="utf-8")
 
-    stats["rows_exported"] = len(dataset_rows)
+    stats["rows_exported"] = exported
     stats["output_path"] = dest
     return stats
 
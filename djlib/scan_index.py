@@ -0,0 +1,145 @@
+"""Trwały indeks stat() plików: (path, size, mtime_ns, inode) → quick_hash/sha256/fingerprint.
+
+Pozwala kolejnym przebiegom ``scan`` pominąć liczenie SHA-256 (i fpcalc) dla
+plików, które nie zmieniły się od ostatniego skanu. Trzyma też ``quick_hash``
+plików biblioteki użytych przez prefiltr hashy. Indeks leży w
+``LOGS/scan_index.sqlite``; ``scan --verify`` ignoruje go i liczy hashe od nowa.
+``sha256`` może być pusty dla plików znanych po ``quick_hash`` (pełny hash
+liczony jest wtedy leniwie – kolizja ``quick_hash`` albo ``apply``); nowe pliki
+INBOX mają go zawsze, bo trafia do ``file_hash`` wiersza arkusza.
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, Optional
+
+from djlib.config import LOGS_DIR
+
+
+@dataclass(frozen=True)
+class IndexEntry:
+    path: str
+    size: int
+    mtime_ns: int
+    inode: int
+    sha256: str
+    fingerprint: str = ""
+    duration: int = 0
+    quick_hash: str = ""
+
+    def matches(self, st: os.stat_result) -> bool:
+        return (
+            self.size == st.st_size
+            and self.mtime_ns == st.st_mtime_ns
+            and self.inode == st.st_ino
+        )
+
+
+def index_path() -> Path:
+    LOGS_DIR.mkdir(parents=True, exist_ok=True)
+    return LOGS_DIR / "scan_index.sqlite"
+
+
+class ScanIndex:
+    """Cienka warstwa nad SQLite; jedna transakcja na przebieg skanu."""
+
+    def __init__(self, path: Path | None = None) -> None:
+        self.path = Path(path) if path else index_path()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.path)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS scan_index (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                inode INTEGER NOT NULL,
+                sha256 TEXT NOT NULL,
+                fingerprint TEXT,
+                duration INTEGER,
+                indexed_at TEXT
+            )
+            """
+        )
+        cols = {r[1] for r in self._conn.execute("PRAGMA table_info(scan_index)")}
+        if "quick_hash" not in cols:
+            self._conn.execute("ALTER TABLE scan_index ADD COLUMN quick_hash TEXT")
+        self._conn.commit()
+
+    def __enter__(self) -> "ScanIndex":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self._conn.commit()
+        self.close()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def commit(self) -> None:
+        self._conn.commit()
+
+    def get(self, path: Path | str) -> Optional[IndexEntry]:
+        row = self._conn.execute(
+            "SELECT path, size, mtime_ns, inode, sha256, fingerprint, duration, quick_hash FROM scan_index WHERE path=?",
+            (str(path),),
+        ).fetchone()
+        if not row:
+            return None
+        return IndexEntry(row[0], row[1], row[2], row[3], row[4], row[5] or "", int(row[6] or 0), row[7] or "")
+
+    def lookup(self, path: Path | str, st: os.stat_result) -> Optional[IndexEntry]:
+        """Zwróć wpis tylko jeśli stat() pliku nie zmienił się od indeksowania."""
+        entry = self.get(path)
+        if entry is not None and entry.matches(st):
+            return entry
+        return None
+
+    def record(
+        self,
+        path: Path | str,
+        st: os.stat_result,
+        sha256: str,
+        fingerprint: str = "",
+        duration: int = 0,
+        quick_hash: str = "",
+    ) -> None:
+        self._conn.execute(
+            """
+            INSERT INTO scan_index (path, size, mtime_ns, inode, sha256, fingerprint, duration, indexed_at, quick_hash)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(path) DO UPDATE SET
+                size=excluded.size,
+                mtime_ns=excluded.mtime_ns,
+                inode=excluded.inode,
+                sha256=excluded.sha256,
+                fingerprint=excluded.fingerprint,
+                duration=excluded.duration,
+                indexed_at=excluded.indexed_at,
+                quick_hash=excluded.quick_hash
+            """,
+            (
+                str(path), st.st_size, st.st_mtime_ns, st.st_ino,
+                sha256 or "", fingerprint or "", int(duration or 0),
+                datetime.utcnow().isoformat(), quick_hash or "",
+            ),
+        )
+
+    def prune(self, root: Path, seen: Iterable[str]) -> int:
+        """Usuń wpisy spod ``root``, których nie było w bieżącym przebiegu."""
+        keep = set(seen)
+        prefix = str(root).rstrip(os.sep) + os.sep
+        stale = [
+            p for (p,) in self._conn.execute(
+                "SELECT path FROM scan_index WHERE substr(path, 1, ?) = ?", (len(prefix), prefix)
+            )
+            if p not in keep
+        ]
+        self._conn.executemany("DELETE FROM scan_index WHERE path=?", [(p,) for p in stale])
+        return len(stale)
@@ -0,0 +1,180 @@
+"""Wieloetapowy pipeline skanowania INBOX.
+
+Etapy:
+1. hash (CPU/IO, pula procesów) – próbkowany ``quick_hash`` plików nieobecnych
+   w indeksie stat() (``djlib.scan_index``); pełny SHA-256 tylko przy kolizji
+   ``quick_hash`` ze znanym plikiem (``KnownFiles``) albo przy ``--verify``,
+2. probe (CPU/IO, pula procesów) – tagi nowych plików,
+3. fingerprint (``djlib.fingerprint.fingerprint_many``) – wsadowe wywołania fpcalc
+   dla nowych plików bez fingerprintu w indeksie/magazynie,
+4. suggest (sieć, ograniczona pula wątków) – ``suggest_metadata``.
+
+Wyniki każdego etapu zwracane są w kolejności wejścia (``Executor.map``), więc
+deduplikacja po ``known_hashes``/``known_fps`` w ``cmd_scan`` pozostaje
+deterministyczna niezależnie od liczby workerów.
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Sequence, TypeVar
+import os
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# Zapytania sieciowe (MusicBrainz/AcoustID/Last.fm) mają własne limity – nie ma
+# sensu otwierać więcej równoległych połączeń niż kilka.
+MAX_SUGGEST_WORKERS = 4
+
+_TAG_KEYS = ("artist", "title", "version_info", "bpm", "key_camelot", "energy_hint", "genre", "comment")
+
+
+@dataclass
+class ProbeResult:
+    path: str
+    tags: Dict[str, Any] = field(default_factory=dict)
+    duration: int = 0
+    fingerprint: str = ""
+    error: str = ""
+
+
+def default_workers() -> int:
+    return max(1, min(os.cpu_count() or 1, 8))
+
+
+def hash_file(item: tuple[str, bool]) -> tuple[str, str, str, str]:
+    """Zwraca (path, quick_hash, sha256, error); sha256 tylko gdy ``item[1]``.
+
+    Uruchamiane w procesie potomnym.
+    """
+    from djlib.hashing import file_sha256, sampled_sha256
+
+    path, full = item
+    try:
+        p = Path(path)
+        return path, sampled_sha256(p), (file_sha256(p) if full else ""), ""
+    except Exception as e:
+        return path, "", "", str(e)
+
+
+def content_ids_file(path: str) -> tuple[str, str, str, str]:
+    """Zwraca (path, sha256, audio_id, error) – pełny hash pliku i hash danych audio w jednym odczycie.
+
+    Uruchamiane w procesie potomnym.
+    """
+    from djlib.hashing import audio_ids
+
+    try:
+        sha, aid = audio_ids(Path(path))
+        return path, sha, aid, ""
+    except Exception as e:
+        return path, "", "", str(e)
+
+
+class KnownFiles:
+    """Znane pliki (biblioteka + arkusz + bieżący przebieg) pogrupowane po ``quick_hash``.
+
+    Dwustopniowe sprawdzenie duplikatu: brak wspólnego ``quick_hash`` ⇒ plik
+    na pewno nowy (bez czytania całości); przy kolizji liczony jest pełny
+    SHA-256 kandydata i – leniwie – znanych plików bez ``file_hash``.
+    Pliki biblioteki, których nie ma już na dysku, reprezentuje tylko
+    ``known_hashes`` – ich kopię wykryje wtedy fingerprint (``is_duplicate``).
+    """
+
+    def __init__(self, known_hashes: set[str]) -> None:
+        self.known_hashes = known_hashes
+        self._by_quick: Dict[str, List[List[str]]] = {}
+        self.full_hashed = 0
+
+    def add(self, quick: str, sha: str = "", path: str = "") -> None:
+        if sha:
+            self.known_hashes.add(sha)
+        if quick:
+            self._by_quick.setdefault(quick, []).append([sha, path])
+
+    def _full(self, path: str) -> str:
+        from djlib.hashing import file_sha256
+
+        self.full_hashed += 1
+        return file_sha256(Path(path))
+
+    def check(self, quick: str, sha: str, path: str) -> tuple[bool, str]:
+        """Zwraca (czy_znany, sha256) – sha256 może zostać policzony przy kolizji."""
+        if sha and sha in self.known_hashes:
+            return True, sha
+        refs = self._by_quick.get(quick)
+        if not refs:
+            return False, sha
+        if any(ref[1] == path for ref in refs):
+            # ten sam plik (np. już w arkuszu) z niezmienionym quick_hash
+            return True, sha
+        if not sha:
+            sha = self._full(path)
+            if sha in self.known_hashes:
+                return True, sha
+        for ref in refs:
+            if not ref[0] and ref[1] and Path(ref[1]).exists():
+                ref[0] = self._full(ref[1])
+            if ref[0] == sha:
+                return True, sha
+        return False, sha
+
+
+def probe_file(path: str) -> ProbeResult:
+    """Czyta tagi pliku. Uruchamiane w procesie potomnym.
+
+    ``duration``/``fingerprint`` uzupełnia później etap fingerprintów.
+    """
+    from djlib.tags import read_tags
+
+    res = ProbeResult(path=path)
+    try:
+        res.tags = read_tags(Path(path))
+    except Exception as e:
+        # Uszkodzony plik nie może zatrzymać całego skanu – puste tagi + błąd.
+        res.tags = {k: "" for k in _TAG_KEYS}
+        res.error = str(e)
+    return res
+
+
+def suggest_for(item: tuple[str, Dict[str, Any]]) -> Dict[str, str]:
+    from djlib.enrich import suggest_metadata
+
+    path, tags = item
+    return suggest_metadata(Path(path), tags)
+
+
+def run_stage(fn: Callable[[T], R], items: Sequence[T], workers: int) -> Iterator[R]:
+    """Uruchom ``fn`` na ``items`` w puli procesów; wyniki w kolejności wejścia.
+
+    Przy ``workers <= 1`` (lub jednym elemencie) działa w bieżącym procesie –
+    bez kosztu startu puli.
+    """
+    if workers <= 1 or len(items) <= 1:
+        for it in items:
+            yield fn(it)
+        return
+    chunksize = max(1, len(items) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        yield from ex.map(fn, items, chunksize=chunksize)
+
+
+def run_io_stage(fn: Callable[[T], R], items: Iterable[T], workers: int) -> Iterator[R]:
+    """Jak ``run_stage``, ale w ograniczonej puli wątków (zadania sieciowe)."""
+    items = list(items)
+    n = max(1, min(workers, MAX_SUGGEST_WORKERS))
+    if n <= 1 or len(items) <= 1:
+        for it in items:
+            yield fn(it)
+        return
+    with ThreadPoolExecutor(max_workers=n) as ex:
+        yield from ex.map(fn, items)
+
+
+def list_inbox(inbox: Path, exts: Iterable[str]) -> List[Path]:
+    """Posortowana lista plików audio – stała kolejność między przebiegami."""
+    exts = {e.lower() for e in exts}
+    return sorted(p for p in inbox.glob("**/*") if p.is_file() and p.suffix.lower() in exts)
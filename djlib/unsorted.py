@@ -22,6 +22,7 @@ UNSORTED_COLUMNS: Sequence[ColumnSpec] = [
     ColumnSpec("track_id", hidden=True, width=22),
     ColumnSpec("file_path", hidden=True, width=36),
     ColumnSpec("file_hash", hidden=True, width=30),
+    ColumnSpec("quick_hash", hidden=True, width=30),
     ColumnSpec("fingerprint", hidden=True, width=26),
     ColumnSpec("added_date", hidden=True, width=18),
     ColumnSpec("is_duplicate", hidden=True, width=12),
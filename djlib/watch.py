@@ -0,0 +1,228 @@
+"""Obserwator INBOX dla ``djlib.cli watch``.
+
+Zamiast globować całe INBOX przy każdym ``scan``:
+
+- zdarzenia systemu plików (``watchdog``: inotify/FSEvents/kqueue, jeśli
+  zainstalowany) albo – awaryjnie – okresowy ``stat()`` drzewa zgłaszają
+  nowe/zmienione pliki audio,
+- plik trafia do przetworzenia dopiero, gdy jego rozmiar i mtime nie zmieniły
+  się przez ``settle`` sekund (kopiowanie zakończone),
+- gotowe pliki są zbierane i przekazywane partiami (``on_batch``) co
+  ``batch_interval`` sekund – jeden zapis arkusza na partię.
+
+Uzgodnienie stanu przy starcie (pliki dodane, gdy watcher nie działał) robi
+``cmd_watch`` zwykłym pipeline'em skanu – indeks stat() sprawia, że
+niezmienione pliki nie są ponownie hashowane.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+try:  # pragma: no cover - opcjonalna zależność
+    from watchdog.events import FileSystemEventHandler  # type: ignore[import-not-found]
+    from watchdog.observers import Observer  # type: ignore[import-not-found]
+except Exception:  # pragma: no cover
+    FileSystemEventHandler = object  # type: ignore[assignment,misc]
+    Observer = None  # type: ignore[assignment]
+
+
+@dataclass
+class _Pending:
+    size: int
+    mtime_ns: int
+    stable_since: float
+
+
+class _Handler(FileSystemEventHandler):  # type: ignore[misc,valid-type]
+    def __init__(self, watcher: "InboxWatcher") -> None:
+        super().__init__()
+        self._watcher = watcher
+
+    def on_created(self, event) -> None:  # noqa: D401
+        if not event.is_directory:
+            self._watcher.notify(event.src_path)
+
+    def on_modified(self, event) -> None:
+        if not event.is_directory:
+            self._watcher.notify(event.src_path)
+
+    def on_moved(self, event) -> None:
+        if not event.is_directory:
+            self._watcher.notify(event.dest_path)
+
+    def on_closed(self, event) -> None:
+        if not event.is_directory:
+            self._watcher.notify(event.src_path)
+
+
+class InboxWatcher:
+    def __init__(
+        self,
+        inbox: Path,
+        exts: Iterable[str],
+        on_batch: Callable[[List[Path]], None],
+        *,
+        settle: float = 2.0,
+        batch_interval: float = 5.0,
+        poll_interval: float = 2.0,
+        use_events: bool = True,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.inbox = Path(inbox)
+        self.exts = {e.lower() for e in exts}
+        self.on_batch = on_batch
+        self.settle = settle
+        self.batch_interval = batch_interval
+        self.poll_interval = poll_interval
+        self.use_events = use_events
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._pending: Dict[str, _Pending] = {}
+        self._ready: List[str] = []
+        self._snapshot: Dict[str, Tuple[int, int]] = {}
+        self._observer = None
+        self._last_poll = float("-inf")
+        self._last_flush = clock()
+
+    # --- stan ---
+
+    @property
+    def mode(self) -> str:
+        return "events" if self._observer is not None else "polling"
+
+    def accepts(self, path: str) -> bool:
+        name = os.path.basename(path)
+        return not name.startswith(".") and os.path.splitext(name)[1].lower() in self.exts
+
+    def seed(self, paths: Iterable[Path | str]) -> None:
+        """Zapamiętaj stan plików już przetworzonych (np. po uzgodnieniu przy starcie)."""
+        for p in paths:
+            try:
+                st = os.stat(p)
+            except OSError:
+                continue
+            self._snapshot[str(p)] = (st.st_size, st.st_mtime_ns)
+
+    def notify(self, path: str) -> None:
+        """Zgłoś możliwą zmianę pliku (zdarzenie albo polling)."""
+        path = str(path)
+        if not self.accepts(path):
+            return
+        with self._lock:
+            if path not in self._pending:
+                self._pending[path] = _Pending(-1, -1, self._clock())
+
+    # --- kroki pętli ---
+
+    def rescan(self) -> None:
+        """Polling: porównaj stat() drzewa INBOX z ostatnim znanym stanem."""
+        seen = set()
+        for root, dirs, files in os.walk(self.inbox):
+            dirs[:] = [d for d in dirs if not d.startswith(".")]
+            for name in files:
+                path = os.path.join(root, name)
+                if not self.accepts(path):
+                    continue
+                seen.add(path)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                if self._snapshot.get(path) != (st.st_size, st.st_mtime_ns):
+                    self.notify(path)
+        for gone in set(self._snapshot) - seen:
+            self._snapshot.pop(gone, None)
+
+    def check_pending(self, now: Optional[float] = None) -> List[str]:
+        """Przenieś do gotowych pliki, których rozmiar/mtime są stabilne przez ``settle``."""
+        now = self._clock() if now is None else now
+        ready: List[str] = []
+        with self._lock:
+            for path, pend in list(self._pending.items()):
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    self._pending.pop(path)  # usunięty/przeniesiony w trakcie kopiowania
+                    continue
+                sig = (st.st_size, st.st_mtime_ns)
+                if sig != (pend.size, pend.mtime_ns):
+                    pend.size, pend.mtime_ns, pend.stable_since = sig[0], sig[1], now
+                    continue
+                if st.st_size > 0 and now - pend.stable_since >= self.settle:
+                    self._pending.pop(path)
+                    if self._snapshot.get(path) != sig:
+                        self._snapshot[path] = sig
+                        ready.append(path)
+            self._ready.extend(ready)
+        return ready
+
+    def flush(self, now: Optional[float] = None, force: bool = False) -> List[Path]:
+        """Wywołaj ``on_batch`` dla zebranych plików (co ``batch_interval`` albo ``force``).
+
+        Błąd ``on_batch`` (np. zablokowany unsorted.xlsx) nie zatrzymuje watchera:
+        partia wraca do gotowych i jest ponawiana przy następnym flushu.
+        """
+        now = self._clock() if now is None else now
+        with self._lock:
+            if not self._ready or (not force and now - self._last_flush < self.batch_interval):
+                return []
+            batch = [Path(p) for p in sorted(set(self._ready))]
+            self._ready.clear()
+            self._last_flush = now
+        try:
+            self.on_batch(batch)
+        except Exception as e:
+            print(f"⚠️  Watch: nie udało się przetworzyć partii ({len(batch)} plików): {e} – ponowię")
+            with self._lock:
+                self._ready.extend(str(p) for p in batch)
+            return []
+        return batch
+
+    def step(self, now: Optional[float] = None) -> List[Path]:
+        now = self._clock() if now is None else now
+        if self._observer is None and now - self._last_poll >= self.poll_interval:
+            self._last_poll = now
+            self.rescan()
+        self.check_pending(now)
+        return self.flush(now)
+
+    # --- cykl życia ---
+
+    def start(self) -> str:
+        """Uruchom obserwatora zdarzeń (idempotentne – ``run`` woła je ponownie)."""
+        if self._observer is not None:
+            return self.mode
+        if self.use_events and Observer is not None:
+            try:
+                obs = Observer()
+                obs.schedule(_Handler(self), str(self.inbox), recursive=True)
+                obs.start()
+                self._observer = obs
+            except Exception:
+                self._observer = None
+        return self.mode
+
+    def stop(self) -> None:
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join(timeout=5)
+            self._observer = None
+        self.check_pending()
+        self.flush(force=True)
+
+    def run(self, tick: float = 0.5, stop: Optional[threading.Event] = None) -> None:
+        self.start()
+        try:
+            while not (stop is not None and stop.is_set()):
+                self.step()
+                time.sleep(tick)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""Long-running analysis worker: jobs on stdin, results on stdout (JSON lines).
+
+Runs inside the Essentia image (``--entrypoint djlib-analysis-worker``) with the
+library mounted read-only once, or locally as any process speaking the same
+protocol. Only the standard library is used (the image ships a bare python3).
+
+Protocol (one JSON object per line):
+
+- on start the worker prints ``{"ready": true, "protocol": 1, "jobs": N}``,
+- request:  ``{"id": "...", "path": "/lib/0/track.mp3", "timeout": 300}``,
+- response: ``{"id": "...", "ok": true, "raw": "<features.json>"}`` or
+  ``{"id": "...", "ok": false, "error": "...", "stderr": "...", "timed_out": false}``.
+
+Up to ``--jobs`` extractor processes run at once, so responses may arrive out of
+order. A run longer than its ``timeout`` is killed (whole process group). EOF on
+stdin = finish pending jobs and exit.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+PROTOCOL = 1
+_STDERR_TAIL = 4000
+
+
+def _scratch(root):
+    if root and os.path.isdir(root) and os.access(root, os.W_OK | os.X_OK):
+        return root
+    return None
+
+
+def run_job(extractor, path, timeout, scratch):
+    td = tempfile.mkdtemp(prefix="job-", dir=scratch)
+    out = os.path.join(td, "features.json")
+    try:
+        proc = subprocess.Popen(
+            [extractor, path, out], stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+            start_new_session=True,
+        )
+        try:
+            _, err = proc.communicate(timeout=timeout if timeout and timeout > 0 else None)
+        except subprocess.TimeoutExpired:
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except OSError:
+                proc.kill()
+            _, err = proc.communicate()
+            return {"ok": False, "error": "timeout", "timed_out": True,
+                    "stderr": (err or b"")[-_STDERR_TAIL:].decode("utf-8", "replace")}
+        raw = None
+        if os.path.exists(out):
+            with open(out, encoding="utf-8", errors="ignore") as f:
+                raw = f.read()
+        if proc.returncode != 0 or not raw:
+            return {"ok": False, "error": "exit %s" % proc.returncode, "timed_out": False, "raw": raw,
+                    "stderr": (err or b"")[-_STDERR_TAIL:].decode("utf-8", "replace")}
+        return {"ok": True, "raw": raw}
+    except OSError as e:
+        return {"ok": False, "error": str(e), "timed_out": False}
+    finally:
+        shutil.rmtree(td, ignore_errors=True)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--extractor", default="streaming_extractor_music")
+    ap.add_argument("--jobs", type=int, default=1)
+    ap.add_argument("--scratch", default="/dev/shm", help="directory for features.json (tmpfs if available)")
+    args = ap.parse_args(argv)
+
+    extractor = shutil.which(args.extractor) or args.extractor
+    scratch = _scratch(args.scratch)
+    jobs = max(1, args.jobs)
+    out_lock = threading.Lock()
+
+    def emit(msg):
+        line = json.dumps(msg) + "\n"
+        with out_lock:
+            sys.stdout.write(line)
+            sys.stdout.flush()
+
+    def handle(req):
+        job_id = req.get("id")
+        try:
+            res = run_job(extractor, str(req["path"]), req.get("timeout"), scratch)
+        except Exception as e:  # never let one job take the worker down
+            res = {"ok": False, "error": str(e) or e.__class__.__name__, "timed_out": False}
+        res["id"] = job_id
+        emit(res)
+
+    emit({"ready": True, "protocol": PROTOCOL, "jobs": jobs})
+    with ThreadPoolExecutor(max_workers=jobs) as ex:
+        for line in sys.stdin:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                req = json.loads(line)
+            except ValueError:
+                emit({"id": None, "ok": False, "error": "bad request", "timed_out": False})
+                continue
+            ex.submit(handle, req)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
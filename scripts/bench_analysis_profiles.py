@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""Benchmark: profil analizy ``full`` (MusicExtractor) vs ``lean`` (jedno dekodowanie).
+
+Dla każdego pliku liczy oba profile od zera (bez zapisu do cache), mierzy czas
+ścian i porównuje wyniki: zgodność BPM (±0.5) i tonacji (Camelot) oraz medianę
+względnej różnicy każdej metryki liczbowej – widać, które cechy lean liczy
+inaczej niż pełny ekstraktor.
+
+Wymaga Essentii (Python bindings).
+
+Użycie: python scripts/bench_analysis_profiles.py PATH [PATH ...] [--limit 20] [--top 15]
+"""
+from __future__ import annotations
+
+import argparse
+import statistics
+import time
+from pathlib import Path
+
+from djlib.audio.essentia_backend import _analyze_file, _try_import_essentia
+from djlib.audio.features import analysis_config
+from djlib.config import AUDIO_EXTS
+
+
+def _files(paths: list[str], limit: int) -> list[Path]:
+    out: list[Path] = []
+    for raw in paths:
+        p = Path(raw)
+        if p.is_dir():
+            out.extend(sorted(q for q in p.rglob("*") if q.is_file() and q.suffix.lower() in AUDIO_EXTS))
+        elif p.is_file():
+            out.append(p)
+    return out[:limit]
+
+
+def _run(path: Path, profile: str) -> tuple[dict, float]:
+    t0 = time.perf_counter()
+    _, _, payload, _ = _analyze_file(
+        path, target_bpm_range=(80, 180), recompute=True, config=analysis_config((80, 180), profile)
+    )
+    return payload, time.perf_counter() - t0
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("paths", nargs="+")
+    ap.add_argument("--limit", type=int, default=20)
+    ap.add_argument("--top", type=int, default=15, help="ile metryk z największą różnicą pokazać")
+    args = ap.parse_args()
+
+    if _try_import_essentia()[1] is None:
+        raise SystemExit("Brak Essentii (Python bindings) – benchmark wymaga obu profili.")
+    files = _files(args.paths, args.limit)
+    if not files:
+        raise SystemExit("Brak plików audio.")
+
+    times = {"full": 0.0, "lean": 0.0}
+    bpm_ok = key_ok = 0
+    rel: dict[str, list[float]] = {}
+    for f in files:
+        full, t_full = _run(f, "full")
+        lean, t_lean = _run(f, "lean")
+        times["full"] += t_full
+        times["lean"] += t_lean
+        if full.get("bpm") is not None and lean.get("bpm") is not None and abs(full["bpm"] - lean["bpm"]) <= 0.5:
+            bpm_ok += 1
+        if full.get("key_camelot") and full.get("key_camelot") == lean.get("key_camelot"):
+            key_ok += 1
+        for k, v in full.items():
+            w = lean.get(k)
+            if isinstance(v, (int, float)) and isinstance(w, (int, float)) and not isinstance(v, bool):
+                rel.setdefault(k, []).append(abs(v - w) / max(abs(v), 1e-9))
+        print(f"{f.name[:50]:50s} full {t_full:6.2f} s  lean {t_lean:6.2f} s  x{t_full / max(t_lean, 1e-9):4.1f}")
+
+    n = len(files)
+    print(f"\nplików: {n}; full {times['full']:.1f} s, lean {times['lean']:.1f} s, "
+          f"przyspieszenie x{times['full'] / max(times['lean'], 1e-9):.2f}")
+    print(f"BPM zgodne (±0.5): {bpm_ok}/{n}; tonacja zgodna: {key_ok}/{n}")
+    worst = sorted(((statistics.median(v), k) for k, v in rel.items()), reverse=True)[: args.top]
+    print("mediana względnej różnicy (lean vs full):")
+    for med, k in worst:
+        print(f"  {k:28s} {med:8.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""Benchmark: load/save ``library.csv`` (i opcjonalnie ``unsorted.xlsx``) z pełnymi
+fingerprintami w kolumnie vs. z digestem ``fp1:…`` i BLOB-ami w magazynie.
+
+Generuje N wierszy z syntetycznymi fingerprintami (~950 sub-fingerprintów,
+jak dla 2 minut audio) w formacie "po przecinku" (``raw``) albo skompresowanym
+Chromaprint (``chromaprint``). Mierzy też koszt rozwiązania wszystkich digestów
+(``resolve_fingerprints``) – to, co płacą tylko komendy potrzebujące pełnego
+fingerprintu (dupes, scan przy nowych plikach).
+
+Użycie: python scripts/bench_fingerprint_storage.py [--rows 20000] [--format raw|chromaprint] [--xlsx]
+"""
+from __future__ import annotations
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+import djlib.fingerprint_store as store
+from djlib.csvdb import FIELDNAMES, load_records, save_records
+from djlib.fingerprint_index import encode_fingerprint
+
+
+def _rows(n: int, fmt: str) -> list[dict[str, str]]:
+    rng = np.random.default_rng(0)
+    rows = []
+    for i in range(n):
+        arr = rng.integers(0, 2**32, size=950, dtype=np.uint64).astype(np.uint32)
+        fp = ",".join(map(str, arr.tolist())) if fmt == "raw" else encode_fingerprint(arr)
+        row = {k: "" for k in FIELDNAMES}
+        row.update({
+            "track_id": f"{i:012x}_1700000000",
+            "file_path": f"/music/INBOX/track_{i:05d}.mp3",
+            "file_hash": f"{i:064x}",
+            "fingerprint": fp,
+            "artist": f"Artist {i % 997}",
+            "title": f"Title {i}",
+            "bpm": "124",
+            "key_camelot": "8A",
+        })
+        rows.append(row)
+    return rows
+
+
+def _timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return out, time.perf_counter() - t0
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--rows", type=int, default=20000)
+    ap.add_argument("--format", choices=("raw", "chromaprint"), default="raw")
+    ap.add_argument("--xlsx", action="store_true", help="mierz też unsorted.xlsx (openpyxl, wolne)")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        store.store_path = lambda: root / "fingerprints.sqlite"  # type: ignore[assignment]
+        rows = _rows(args.rows, args.format)
+        results = []
+
+        for label in ("before", "after"):
+            if label == "after":
+                _, t_compact = _timed(lambda: store.compact_rows(rows))
+                print(f"migracja (compact_rows): {t_compact:.2f} s")
+            csv_path = root / f"library_{label}.csv"
+            _, t_save = _timed(lambda: save_records(csv_path, rows))
+            loaded, t_load = _timed(lambda: load_records(csv_path))
+            size_mb = csv_path.stat().st_size / (1 << 20)
+            line = f"{label:6s} CSV: {size_mb:8.1f} MB  save {t_save:6.2f} s  load {t_load:6.2f} s"
+            if args.xlsx:
+                from djlib.unsorted import load_unsorted_rows, write_unsorted_rows
+
+                xlsx_path = root / f"unsorted_{label}.xlsx"
+                _, t_xsave = _timed(lambda: write_unsorted_rows(xlsx_path, rows, []))
+                _, t_xload = _timed(lambda: load_unsorted_rows(xlsx_path))
+                line += f" | XLSX {xlsx_path.stat().st_size / (1 << 20):6.1f} MB  save {t_xsave:6.2f} s  load {t_xload:6.2f} s"
+            results.append(line)
+            if label == "after":
+                resolved, t_res = _timed(lambda: store.resolve_fingerprints(r["fingerprint"] for r in loaded))
+                results.append(f"resolve_fingerprints({len(resolved)}): {t_res:.2f} s")
+
+        blob_mb = (root / "fingerprints.sqlite").stat().st_size / (1 << 20)
+    print(f"wierszy: {args.rows}, format: {args.format}")
+    for line in results:
+        print(line)
+    print(f"magazyn BLOB-ów: {blob_mb:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
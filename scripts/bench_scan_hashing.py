@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""Benchmark: ile bajtów czyta hashowanie w ``scan`` – przed i po prefiltrze.
+
+Tworzy w katalogu tymczasowym N syntetycznych plików (część z nich to
+duplikaty "biblioteki") i porównuje:
+
+- before: ``file_sha256`` każdego pliku INBOX (dawny ``cmd_scan``),
+- after:  ``sampled_sha256`` + pełny SHA-256 przy kolizji ``quick_hash``
+  (``KnownFiles``) i dla plików nowych (``file_hash`` nowego wiersza arkusza);
+  oszczędność dotyczy duplikatów i plików już znanych.
+
+Użycie: python scripts/bench_scan_hashing.py [--files 200] [--size-mb 8] [--dupes 10]
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import djlib.hashing as hashing
+from djlib.scan_pipeline import KnownFiles
+
+
+class _Counter:
+    bytes_read = 0
+
+
+def _counting_open(orig):
+    def opener(self, *args, **kwargs):
+        f = orig(self, *args, **kwargs)
+        read = f.read
+        readinto = f.readinto
+
+        def counted(n=-1):
+            data = read(n)
+            _Counter.bytes_read += len(data)
+            return data
+
+        def counted_into(buf):
+            n = readinto(buf)
+            _Counter.bytes_read += n or 0
+            return n
+
+        f.read = counted
+        f.readinto = counted_into
+        return f
+
+    return opener
+
+
+def _make_files(root: Path, n: int, size: int, dupes: int) -> tuple[list[Path], list[Path]]:
+    lib = root / "lib"
+    inbox = root / "inbox"
+    lib.mkdir()
+    inbox.mkdir()
+    library = []
+    for i in range(max(dupes, 1) * 2):
+        p = lib / f"lib_{i:04d}.mp3"
+        p.write_bytes(os.urandom(size))
+        library.append(p)
+    files = []
+    for i in range(n):
+        p = inbox / f"in_{i:04d}.mp3"
+        if i < dupes:
+            p.write_bytes(library[i].read_bytes())
+        else:
+            p.write_bytes(os.urandom(size))
+        files.append(p)
+    return library, files
+
+
+def _measure(fn) -> tuple[int, float]:
+    _Counter.bytes_read = 0
+    t0 = time.perf_counter()
+    fn()
+    return _Counter.bytes_read, time.perf_counter() - t0
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--files", type=int, default=200)
+    ap.add_argument("--size-mb", type=float, default=8.0)
+    ap.add_argument("--dupes", type=int, default=10)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        library, files = _make_files(Path(tmp), args.files, int(args.size_mb * 1024 * 1024), args.dupes)
+        lib_quick = {str(p): hashing.sampled_sha256(p) for p in library}
+        lib_full = {str(p): hashing.file_sha256(p) for p in library}
+
+        orig_open = Path.open
+        Path.open = _counting_open(orig_open)
+        hashing.MMAP_MIN_SIZE = 1 << 62  # mmap omija read() – licz tylko ścieżkę readinto
+        try:
+            def before():
+                known = set(lib_full.values())
+                found = sum(1 for p in files if hashing.file_sha256(p) in known)
+                print(f"  before: duplikaty={found}")
+
+            def after():
+                known = KnownFiles(set())
+                for path, q in lib_quick.items():
+                    known.add(q, lib_full[path], path)  # wiersze library.csv mają file_hash
+                found = 0
+                new = 0
+                for p in files:
+                    is_known, sha = known.check(hashing.sampled_sha256(p), "", str(p))
+                    if is_known:
+                        found += 1
+                    elif not sha:
+                        hashing.file_sha256(p)  # file_hash nowego wiersza
+                        new += 1
+                print(f"  after:  duplikaty={found}, pełne SHA-256={known.full_hashed + new}")
+
+            b_bytes, b_time = _measure(before)
+            a_bytes, a_time = _measure(after)
+        finally:
+            Path.open = orig_open
+
+    mb = 1024 * 1024
+    print(f"plików={args.files}, rozmiar={args.size_mb} MB, duplikatów={args.dupes}")
+    print(f"before: {b_bytes / mb:10.1f} MB odczytu, {b_time:6.2f} s")
+    print(f"after:  {a_bytes / mb:10.1f} MB odczytu, {a_time:6.2f} s")
+    if a_bytes:
+        print(f"redukcja odczytu: {b_bytes / a_bytes:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
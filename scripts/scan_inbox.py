@@ -7,14 +7,15 @@ from djlib.config import INBOX_DIR, CSV_PATH, AUDIO_EXTS, ensure_base_dirs
 from djlib.csvdb import load_records, save_records, FIELDNAMES
 from djlib.tags import read_tags
 from djlib.classify import guess_bucket
-from djlib.fingerprint import file_sha256, audio_fingerprint
+from djlib.fingerprint import file_sha256, fingerprint_info
+from djlib.fingerprint_store import fingerprint_digest, store_fingerprint
 
 def main():
     ensure_base_dirs()
 
     rows = load_records(CSV_PATH)
     known_hashes = {r.get("file_hash", "") for r in rows if r.get("file_hash")}
-    known_fps = {r.get("fingerprint", "") for r in rows if r.get("fingerprint")}
+    known_fps = {fingerprint_digest(r.get("fingerprint", "")) for r in rows if r.get("fingerprint")}
 
     new_rows = []
     for p in INBOX_DIR.glob("**/*"):
@@ -29,8 +30,12 @@ def main():
             continue
 
         tags = read_tags(p)
-        fp = audio_fingerprint(p)
-        is_dup = "true" if (fp and fp in known_fps) else "false"
+        try:
+            duration_sec, fp = fingerprint_info(p)
+        except Exception:
+            duration_sec, fp = 0, ""
+        fp_digest = store_fingerprint(fp) if fp else ""
+        is_dup = "true" if (fp_digest and fp_digest in known_fps) else "false"
 
         ai_bucket, ai_comment = guess_bucket(
             tags["artist"], tags["title"], tags["bpm"], tags["genre"], tags["comment"]
@@ -42,14 +47,11 @@ def main():
         tags_for_suggest = tags.copy()
         tags_for_suggest["fingerprint"] = fp or ""
         
-        # Pobierz duration z pliku
-        try:
-            from djlib.fingerprint import fingerprint_info
-            duration_sec, _ = fingerprint_info(p)
-            if duration_sec:
-                mm, ss = divmod(int(duration_sec), 60)
-                tags_for_suggest["duration"] = f"{mm}:{ss:02d}"
-        except Exception:
+        # duration z tego samego wywołania fpcalc co fingerprint
+        if duration_sec:
+            mm, ss = divmod(int(duration_sec), 60)
+            tags_for_suggest["duration"] = f"{mm}:{ss:02d}"
+        else:
             tags_for_suggest["duration"] = ""
 
         from djlib.enrich import suggest_metadata
@@ -65,7 +67,7 @@ def main():
             "key_camelot": tags["key_camelot"],
             "energy_hint": tags["energy_hint"],
             "file_hash": fhash,
-            "fingerprint": fp,
+            "fingerprint": fp_digest,
             "is_duplicate": is_dup,
             "ai_guess_bucket": ai_bucket,
             "ai_guess_comment": ai_comment,
@@ -89,7 +91,7 @@ def main():
         new_rows.append(rec)
         known_hashes.add(fhash)
         if fp:
-            known_fps.add(fp)
+            known_fps.add(fp_digest)
 
     if new_rows:
         rows.extend(new_rows)
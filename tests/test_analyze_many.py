@@ -0,0 +1,32 @@
+import multiprocessing
+
+import djlib.audio.cache as cache
+from djlib.audio import essentia_backend as backend
+
+
+def test_analyze_many_pool_single_writer(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "db_path", lambda: tmp_path / "audio_analysis.sqlite")
+    monkeypatch.setattr(backend, "_try_import_essentia", lambda: (None, None))
+    monkeypatch.setattr(backend, "_find_extractor_binary", lambda: None)
+    monkeypatch.setattr(backend.shutil, "which", lambda _name: None)
+    files = []
+    for i in range(5):
+        f = tmp_path / f"t{i}.mp3"
+        f.write_bytes(b"\xff\xfb" * (100 + i))
+        files.append(f)
+    missing = tmp_path / "gone.mp3"
+
+    # monkeypatche dziedziczą tylko procesy z fork
+    workers = 2 if multiprocessing.get_start_method() == "fork" else 1
+    seen = []
+    stats = backend.analyze_many(files + [missing], workers=workers, batch_size=2,
+                                 on_result=lambda p, err, st: seen.append((p, bool(err))))
+    assert stats["processed"] == 6 and stats["analyzed"] == 5 and stats["errors"] == 1
+    assert sorted(seen) == sorted([(str(f), False) for f in files] + [(str(missing), True)])
+
+    ids = [cache.compute_audio_ids(f) for f in files]
+    got = cache.get_analyses(fh for fh, _ in ids)  # aliasy file_hash → audio_id zapisane przez writer
+    assert len(got) == 5 and all(v["source"] == "stub" for v in got.values())
+
+    again = backend.analyze_many(files, workers=1)
+    assert again["cached"] == 5 and again["analyzed"] == 0
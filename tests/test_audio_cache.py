@@ -0,0 +1,144 @@
+import djlib.audio.cache as cache
+from djlib.hashing import audio_ids, file_sha256
+
+
+def test_migrate_audio_ids_rekeys_and_aliases(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "db_path", lambda: tmp_path / "audio_analysis.sqlite")
+    track = tmp_path / "t.mp3"
+    track.write_bytes(b"ID3\x03\x00\x00\x00\x00\x00\x05hello" + b"\xff\xfb" * 100)
+    legacy = file_sha256(track)
+    cache.upsert_analysis(legacy, {"algo_version": 2, "bpm": 124.0})
+
+    stats = cache.migrate_audio_ids({legacy: track})
+    assert stats["rekeyed"] == 1
+
+    _, new_id = audio_ids(track)
+    assert new_id != legacy
+    assert cache.get_analysis(new_id)["bpm"] == 124.0
+    # stary file_hash z CSV/XLSX nadal trafia w ten sam wpis
+    assert cache.get_analysis(legacy)["audio_id"] == new_id
+
+
+def test_store_batches_and_reuses_connection(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "db_path", lambda: tmp_path / "audio_analysis.sqlite")
+    store = cache.get_store()
+    assert cache.get_store() is store
+    assert store._conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    n = store.upsert_many((f"id{i}", {"bpm": 100.0 + i, "tempo_stability": 0.5}) for i in range(1200))
+    assert n == 1200
+    store.record_aliases([("filehash7", "id7")])
+
+    got = store.get_many(["id0", "id1199", "filehash7", "missing"])
+    assert set(got) == {"id0", "id1199", "filehash7"}
+    assert got["id1199"]["bpm"] == 1299.0
+    assert got["filehash7"]["audio_id"] == "id7"
+    assert got["id0"]["tempo_stability"] == 0.5  # metryka spoza kolumn → extras
+    assert len(cache.get_analyses(f"id{i}" for i in range(1200))) == 1200
+
+
+def test_features_table_migration_and_matrix(tmp_path, monkeypatch):
+    import json
+    import sqlite3
+
+    import numpy as np
+
+    db = tmp_path / "audio_analysis.sqlite"
+    monkeypatch.setattr(cache, "db_path", lambda: db)
+    # baza w starym formacie: cechy w extras.features_ext, user_version=0
+    conn = sqlite3.connect(db)
+    conn.execute("CREATE TABLE audio_analysis (audio_id TEXT PRIMARY KEY, " + ", ".join(cache._COLUMNS) + ")")
+    extras = {"notes": "x", "features_ext": {"mfcc_0": -3.5, "mfcc_1": 2.0, "label": "abc"}}
+    conn.execute("INSERT INTO audio_analysis (audio_id, bpm, extras) VALUES ('old', 120.0, ?)", (json.dumps(extras),))
+    conn.commit()
+    conn.close()
+
+    store = cache.get_store()
+    assert store._conn.execute("PRAGMA user_version").fetchone()[0] == cache.SCHEMA_VERSION
+    raw = json.loads(store._conn.execute("SELECT extras FROM audio_analysis").fetchone()[0])
+    assert raw == {"notes": "x", "features_ext": {"label": "abc"}}
+    got = cache.get_analysis("old")
+    assert got["mfcc_0"] == -3.5 and got["label"] == "abc"
+
+    cache.upsert_analysis("new", {"bpm": 128.0, "mfcc_1": 1.0, "spectral_flux": 0.25})
+    store.record_aliases([("fh", "new")])
+    ids, names, mat = cache.feature_matrix(["fh", "missing", "old"])
+    assert ids == ["fh", "old"]
+    assert names == ["mfcc_0", "mfcc_1", "spectral_flux"]
+    assert mat.dtype == np.float32 and mat.shape == (2, 3)
+    assert np.isnan(mat[0, 0]) and mat[0, 2] == 0.25 and mat[1, 0] == -3.5
+
+    # ponowny zapis zastępuje cechy (bez starych wartości)
+    cache.upsert_analysis("new", {"bpm": 128.0, "mfcc_0": 9.0})
+    assert "spectral_flux" not in cache.get_analysis("new")
+    assert len(cache.feature_matrix()[0]) == 2
+
+
+def test_collect_garbage_evicts_orphans_and_reports(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "db_path", lambda: tmp_path / "audio_analysis.sqlite")
+    store = cache.get_store()
+    old = "2000-01-01T00:00:00"
+    store.upsert_many([
+        ("live", {"algo_version": 2, "analyzed_at": old, "mfcc_0": 1.0}),
+        ("via_alias", {"algo_version": 2, "analyzed_at": old}),
+        ("orphan", {"algo_version": 2, "analyzed_at": old, "mfcc_0": 2.0}),
+        ("fresh_orphan", {"algo_version": 2}),
+        ("outdated", {"algo_version": 1, "analyzed_at": old}),
+    ])
+    store.record_aliases([("fh_live", "via_alias"), ("fh_gone", "orphan")])
+    cache.get_analyses(["live", "nope"])
+
+    live = ["live", "fh_live", "outdated"]
+    dry = cache.collect_garbage(live, min_algo_version=2, dry_run=True)
+    assert dry["evicted"] == 2 and dry["rows_after"] == 5
+
+    stats = cache.collect_garbage(live, min_algo_version=2)
+    assert (stats["orphaned"], stats["outdated"], stats["aliases_removed"]) == (1, 1, 1)
+    assert set(cache.get_analyses(["live", "fh_live", "fresh_orphan", "orphan", "outdated"])) == {
+        "live", "fh_live", "fresh_orphan"
+    }
+    assert store._conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    assert store._conn.execute("SELECT COUNT(*) FROM audio_features").fetchone()[0] == 1
+    assert cache.cache_stats()["lookups"] >= 2
+
+
+def test_feature_keys_keep_first_appearance_order_for_large_extras(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "db_path", lambda: tmp_path / "audio_analysis.sqlite")
+    store = cache.get_store()
+    # od SQLite 3.45 id w json_each to offset w bajtach – tu przekracza 1e6
+    store.upsert_many([
+        ("a", {"config_hash": "c", "pad": "x" * 2_000_000, "late": "v"}),
+        ("b", {"config_hash": "c", "early": "v"}),
+    ])
+    keys = store.feature_keys(["a", "b"])
+    assert keys.index("pad") < keys.index("late") < keys.index("early")
+
+
+def test_mixed_case_feature_names_go_to_features_table(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "db_path", lambda: tmp_path / "audio_analysis.sqlite")
+    cache.upsert_analysis("a", {"config_hash": "c", "Spectral_Kurtosis": 1.5, "BPM": 3.0, "Label": "x"})
+    got = cache.get_analysis("a")
+    assert got["spectral_kurtosis"] == 1.5 and "spectral_kurtosis" in cache.get_store().feature_columns()
+    # nazwa kolumny tabeli i wartości nieliczbowe zostają w extras pod oryginalną nazwą
+    assert got["extras"]["features_ext"] == {"BPM": 3.0, "Label": "x"}
+
+
+def test_cache_gc_keeps_analysis_of_unsorted_row_without_file_hash(tmp_path, monkeypatch):
+    import argparse
+
+    import djlib.cli as cli
+
+    monkeypatch.setattr(cache, "db_path", lambda: tmp_path / "audio_analysis.sqlite")
+    track = tmp_path / "staged.mp3"
+    track.write_bytes(b"ID3" + b"\0" * 7 + b"audio-payload")
+    _, aid = audio_ids(track)
+    old = "2000-01-01T00:00:00"
+    cache.get_store().upsert_many([
+        (aid, {"algo_version": 2, "analyzed_at": old, "mfcc_0": 1.0}),
+        ("orphan", {"algo_version": 2, "analyzed_at": old}),
+    ])
+    monkeypatch.setattr(cli, "load_records", lambda _path: [])
+    monkeypatch.setattr(cli, "_load_unsorted", lambda: [{"file_path": str(track), "file_hash": ""}])
+
+    cli.cmd_cache_gc(argparse.Namespace(stats=False, keep_days=1, min_algo_version=0, dry_run=False))
+    assert set(cache.get_analyses([aid, "orphan"])) == {aid}
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+import djlib.audio.cache as cache
+from djlib.audio import beatgrid as bg
+
+
+def test_pack_roundtrip_and_constant_grid_is_tiny():
+    ticks = np.round(np.arange(0, 600, 60 / 128) * bg.RESOLUTION).astype(np.int64)
+    blob = bg.pack(ticks)
+    assert np.array_equal(bg.unpack(blob), ticks)
+    assert len(blob) < ticks.size  # delty prawie stałe → zlib ściska do ułamka bajtu na beat
+    assert bg.unpack(None).size == 0
+
+
+def test_drift_flags_variable_tempo_and_downbeat_phase():
+    steady = np.arange(0, 300, 60 / 124)
+    jitter = np.random.default_rng(1).normal(0, 0.004, steady.size)
+    grid = bg.build_grid(steady + jitter)
+    assert grid["tempo_drift"] < bg.VARIABLE_TEMPO_DRIFT
+    assert np.median(grid["tempo"]) / 100 == pytest.approx(124, abs=0.5)
+
+    # tempo rośnie 118 → 126 BPM (nagranie live)
+    bpm = np.linspace(118, 126, 600)
+    live = np.cumsum(60 / bpm)
+    assert bg.build_grid(live)["tempo_drift"] > bg.VARIABLE_TEMPO_DRIFT
+
+    strength = np.ones(steady.size)
+    strength[2::4] = 3.0  # najgłośniejszy co czwarty beat od indeksu 2
+    assert bg.build_grid(steady, strength)["downbeats"][:3].tolist() == [2, 6, 10]
+    strength[: steady.size // 2] = np.nan  # blok bez BeatsLoudness (tryb strumieniowy)
+    assert bg.build_grid(steady, strength)["downbeats"][:3].tolist() == [2, 6, 10]
+    assert bg.downbeat_phase(8, [np.nan] * 8) == 0
+    assert bg.build_grid([1.0]) is None
+
+
+def test_store_roundtrip_via_alias_and_gc(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "db_path", lambda: tmp_path / "audio_analysis.sqlite")
+    beats = np.arange(0.25, 120, 0.5)
+    grid = bg.build_grid(beats)
+    cache.upsert_analysis("aid", {"config_hash": "c", "bpm": 120.0, "tempo_drift": grid["tempo_drift"],
+                                  cache.BEATGRID_KEY: bg.encode(grid)})
+    cache.record_alias("fh", "aid")
+    got = cache.get_beatgrid("fh")
+    assert np.allclose(got["beats"], beats)
+    assert got["downbeats"][0] == pytest.approx(0.25) and got["bpm"] == pytest.approx(120.0)
+    assert got["variable_tempo"] is False
+    row = cache.get_analysis("aid")
+    assert cache.BEATGRID_KEY not in row and not row.get("extras")  # bloby tylko w tabeli beatgrids
+    assert row["tempo_drift"] == pytest.approx(grid["tempo_drift"])
+
+    # ponowny zapis bez siatki jej nie kasuje, gc usuwa ją razem z analizą
+    cache.upsert_analysis("aid", {"config_hash": "c", "bpm": 121.0, "analyzed_at": "2000-01-01T00:00:00"})
+    assert cache.get_beatgrid("aid") is not None
+    cache.collect_garbage([], keep_days=1)
+    assert cache.get_beatgrid("aid") is None
@@ -0,0 +1,30 @@
+import djlib.audio.cache as cache
+from djlib.audio import descriptors as d
+
+
+def test_stale_groups_and_merge_keep_fresh_groups(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "db_path", lambda: tmp_path / "audio_analysis.sqlite")
+    # wpis sprzed genre-features (algo_version 1): tonacja/głośność aktualne, rytm sprzed tempo_drift (v1)
+    cache.upsert_analysis("a", {"algo_version": 1, "config_hash": "c", "bpm": 124.0, "key_camelot": "8A", "lufs": -8.0})
+    cached = cache.get_analysis("a")
+    assert d.stale_groups(cached, "c") == {"rhythm", "mfcc", "chroma", "spectral"}
+    assert d.stale_groups(cached, "other") == set(d.GROUPS)
+    assert d.stale_groups(None, "c") == set(d.GROUPS)
+
+    fresh = {"algo_version": 2, "config_hash": "c", "bpm": 90.0, "key_camelot": "1B", "mfcc_0": 1.5,
+             "spec_centroid": 1000.0, "extras": {"notes": "x"}}
+    merged = d.merge_fresh(cached, fresh, d.stale_groups(cached, "c"))
+    assert merged["key_camelot"] == "8A" and merged["lufs"] == -8.0  # z cache
+    assert merged["bpm"] == 90.0 and merged["mfcc_0"] == 1.5 and merged["spec_centroid"] == 1000.0  # przeliczone
+    assert merged["extras"]["notes"] == "x"
+
+    cache.upsert_analysis("a", merged)
+    again = cache.get_analysis("a")
+    assert d.stale_groups(again, "c") == set()
+
+    # podbicie wersji jednej grupy unieważnia tylko ją
+    monkeypatch.setitem(d.DESCRIPTOR_VERSIONS, "chroma", 2)
+    assert d.stale_groups(again, "c") == {"chroma"}
+    counts = d.plan({"a": again, "b": None}, "c")
+    assert counts["tracks"] == 2 and counts["missing"] == 1
+    assert counts["chroma"] == 2 and counts["rhythm"] == 1
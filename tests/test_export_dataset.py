@@ -0,0 +1,53 @@
+import csv
+
+import djlib.audio.cache as cache
+import djlib.ml.export_dataset as export
+from djlib.csvdb import FIELDNAMES, save_records
+
+
+def _row(**kw):
+    row = {k: "" for k in FIELDNAMES}
+    row.update(kw)
+    return row
+
+
+def test_export_joins_cache_and_streams_rows(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "db_path", lambda: tmp_path / "audio_analysis.sqlite")
+    lib = tmp_path / "library.csv"
+    monkeypatch.setattr(export, "CSV_PATH", lib)
+
+    unhashed = tmp_path / "u.mp3"
+    unhashed.write_bytes(b"\xff\xfb" * 200)
+    store = cache.get_store()
+    store.upsert_many([
+        ("a1", {"bpm": 120.0, "tempo_stability": 0.9}),
+        ("a2", {"bpm": 128.0, "vocal_ratio": 0.1}),
+        (cache.compute_audio_id(unhashed), {"bpm": 90.0}),
+    ])
+    store.record_aliases([("fh2", "a2")])
+    save_records(lib, [
+        _row(track_id="t1", file_hash="a1", genre="house"),
+        _row(track_id="t2", file_hash="fh2", target_subfolder="READY"),
+        _row(track_id="t3", file_hash="nope", genre="techno"),
+        _row(track_id="t4", file_hash="a1"),
+        _row(track_id="t5", file_path=str(unhashed), genre="dnb"),
+        _row(track_id="t6", file_path=str(tmp_path / "gone.mp3")),
+    ])
+
+    out = tmp_path / "ds.csv"
+    stats = export.export_training_dataset(out, workers=2)
+    assert stats["rows_exported"] == 3
+    assert stats["missing_features"] == 1
+    assert stats["missing_labels"] == 1
+    assert stats["missing_audio_id"] == 1
+    assert stats["computed_hashes"] == 1
+
+    with out.open(newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        header = reader.fieldnames
+        got = list(reader)
+    assert header[-2:] == ["genre_label", "bucket_label"]
+    assert "extras" not in header and "tempo_stability" in header and "vocal_ratio" in header
+    assert [r["track_id"] for r in got] == ["t1", "t2", "t5"]
+    assert got[1]["audio_id"] == "a2" and got[1]["bucket_label"] == "READY"
+    assert got[0]["tempo_stability"] == "0.9" and got[0]["vocal_ratio"] == ""
@@ -0,0 +1,63 @@
+import os
+import sys
+import time
+
+import pytest
+
+import djlib.audio.cache as cache
+from djlib.audio import essentia_backend as backend
+from djlib.audio import extractor_cli
+
+pytestmark = pytest.mark.skipif(os.name != "posix", reason="fake extractor is a shell script")
+
+FAKE = """#!{python}
+import json, sys, time
+src, out = sys.argv[1], sys.argv[2]
+if "hang" in src:
+    time.sleep(60)
+if "bad" in src:
+    sys.stderr.write("cannot decode")
+    sys.exit(1)
+json.dump({{"rhythm": {{"bpm": 124.0, "onset_rate": 3.5}}, "tonal": {{"key_key": "A", "key_scale": "minor"}}}}, open(out, "w"))
+"""
+
+
+def test_run_extractor_kills_on_timeout(tmp_path):
+    t0 = time.monotonic()
+    run = extractor_cli.run_extractor([sys.executable, "-c", "import time; time.sleep(60)"], timeout=0.5)
+    assert run.timed_out and not run.ok
+    assert time.monotonic() - t0 < 10
+
+
+def test_analyze_many_cli_pool(tmp_path, monkeypatch):
+    fake = tmp_path / "fake_extractor"
+    fake.write_text(FAKE.format(python=sys.executable))
+    fake.chmod(0o755)
+    logs = tmp_path / "logs"
+    monkeypatch.setattr(cache, "db_path", lambda: tmp_path / "audio_analysis.sqlite")
+    monkeypatch.setattr(extractor_cli, "LOGS_DIR", logs)
+    monkeypatch.setattr(backend, "_try_import_essentia", lambda: (None, None))
+    monkeypatch.setattr(backend, "_find_extractor_binary", lambda: str(fake))
+    monkeypatch.setenv(extractor_cli.SCRATCH_ENV, str(tmp_path))
+
+    files = {}
+    for i, name in enumerate(("ok1", "ok2", "hang", "bad")):
+        f = tmp_path / f"{name}.mp3"
+        f.write_bytes(b"\xff\xfb" * (100 + i))
+        files[name] = f
+
+    stats = backend.analyze_many([files["ok1"], files["ok2"]], workers=2, cli_timeout=20)
+    assert stats["analyzed"] == 2 and stats["errors"] == 0
+    assert not logs.exists()  # sukces – nic w LOGS
+    got = cache.get_analysis(cache.compute_audio_ids(files["ok1"])[1])
+    assert got["bpm"] == 124.0 and got["key_camelot"] and got["source"] == "essentia-cli"
+    assert not list(tmp_path.glob("djlib-ess-*"))  # katalogi robocze sprzątnięte
+
+    t0 = time.monotonic()
+    stats = backend.analyze_many([files["hang"], files["bad"]], workers=2, cli_timeout=1)
+    assert time.monotonic() - t0 < 30
+    assert stats["errors"] == 1 and stats["analyzed"] == 1
+    failed = logs / "essentia_cli_failed"
+    bad_id = cache.compute_audio_ids(files["bad"])[1]
+    assert b"cannot decode" in (failed / f"{bad_id}.stderr").read_bytes()
+    assert (failed / f"{cache.compute_audio_ids(files['hang'])[1]}.stderr").exists()
@@ -0,0 +1,51 @@
+import numpy as np
+
+import djlib.audio.cache as cache
+from djlib.audio.snapshot import load_snapshot, snapshot_paths, write_snapshot
+
+
+def test_snapshot_full_then_incremental(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "db_path", lambda: tmp_path / "audio_analysis.sqlite")
+    store = cache.get_store()
+    store.upsert_many((f"id{i}", {"bpm": 120.0, "mfcc_0": float(i), "mfcc_1": 1.0}) for i in range(10))
+
+    assert write_snapshot()["mode"] == "full"
+    ids, names, mat = load_snapshot()
+    assert isinstance(mat, np.memmap) and mat.dtype == np.float32
+    assert names == ["mfcc_0", "mfcc_1"] and len(ids) == 10
+    assert write_snapshot()["mode"] == "up-to-date"
+
+    cache.upsert_analysis("id3", {"bpm": 120.0, "mfcc_0": 33.0, "mfcc_1": 2.0})
+    cache.upsert_analysis("id10", {"bpm": 120.0, "mfcc_0": 10.0, "mfcc_1": 1.0})
+    with store.transaction() as conn:
+        conn.execute("DELETE FROM audio_features WHERE audio_id='id5'")
+    stats = write_snapshot()
+    assert stats["mode"] == "incremental" and stats["changed"] == 3
+
+    ids, names, mat = load_snapshot(mmap_mode=None)
+    full_ids, _, full = cache.feature_matrix()
+    assert sorted(ids) == sorted(full_ids) and "id5" not in ids
+    order = [ids.index(a) for a in full_ids]
+    np.testing.assert_array_equal(mat[order], full)
+
+    # nowa kolumna cech → pełna przebudowa
+    cache.upsert_analysis("id0", {"mfcc_0": 0.0, "mfcc_1": 1.0, "chroma_0": 0.5})
+    assert write_snapshot()["mode"] == "full"
+    assert load_snapshot()[1] == ["mfcc_0", "mfcc_1", "chroma_0"]
+
+
+def test_snapshot_swaps_index_once_and_trims_change_log(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "db_path", lambda: tmp_path / "audio_analysis.sqlite")
+    store = cache.get_store()
+    store.upsert_many((f"id{i}", {"mfcc_0": float(i)}) for i in range(4))
+    (tmp_path / "audio_features.npy").write_bytes(b"legacy")
+    write_snapshot()
+    reader = load_snapshot()  # mmap starej macierzy
+    cache.upsert_analysis("id9", {"mfcc_0": 9.0})
+    write_snapshot()
+
+    assert len(reader[0]) == reader[2].shape[0] == 4  # stary widok nadal spójny
+    ids, _, mat = load_snapshot()
+    assert len(ids) == mat.shape[0] == 5
+    assert [p.name for p in tmp_path.glob("audio_features*.npy")] == [snapshot_paths()[0].name]
+    assert store._conn.execute("SELECT COUNT(*) FROM feature_changes").fetchone()[0] == 0
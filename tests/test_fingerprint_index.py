@@ -0,0 +1,78 @@
+import numpy as np
+
+from djlib.fingerprint_index import (
+    FingerprintIndex,
+    decode_fingerprint,
+    encode_fingerprint,
+    fingerprint_similarity,
+    similarity,
+)
+
+
+def _track(rng, n=600):
+    # sąsiednie sub-fingerprinty Chromaprint są skorelowane – kilka bitów różnicy
+    x = [int(rng.integers(0, 2**32))]
+    for _ in range(n - 1):
+        flips = rng.choice(32, 4, replace=False)
+        x.append(x[-1] ^ int(sum(1 << int(b) for b in flips)))
+    return np.array(x, dtype=np.uint64).astype(np.uint32)
+
+
+def _reencode(rng, arr, ber=0.05, shift=3):
+    flips = rng.random((arr.size, 32)) < ber
+    noise = (flips * (1 << np.arange(32, dtype=np.uint64))).sum(axis=1).astype(np.uint32)
+    noisy = arr ^ noise
+    return np.concatenate((noisy[shift:], _track(rng, shift)))
+
+
+def test_encode_decode_roundtrip():
+    rng = np.random.default_rng(1)
+    arr = _track(rng)
+    arr[10] = 0xFFFFFFFF  # wymusza wartości "wyjątkowe" (delty bitów >= 7)
+    fp = encode_fingerprint(arr)
+    assert np.array_equal(decode_fingerprint(fp), arr)
+    assert decode_fingerprint("").size == 0
+    assert decode_fingerprint("not-a-fingerprint!").size == 0
+    assert list(decode_fingerprint("1,2,3")) == [1, 2, 3]
+
+
+def test_similarity_tolerates_noise_and_offset():
+    rng = np.random.default_rng(2)
+    a = _track(rng)
+    b = _reencode(rng, a)
+    assert similarity(a, b) > 0.9
+    assert similarity(a, _track(rng)) < 0.65
+    assert fingerprint_similarity(encode_fingerprint(a), encode_fingerprint(a)) == 1.0
+
+
+def test_index_finds_near_duplicates_only():
+    rng = np.random.default_rng(3)
+    tracks = [_track(rng) for _ in range(40)]
+    index = FingerprintIndex(rebuild_every=8)
+    for i, t in enumerate(tracks):
+        index.add(i, encode_fingerprint(t))
+    dup = encode_fingerprint(_reencode(rng, tracks[7]))
+    index.add("dup", dup)
+    index.add("exact", encode_fingerprint(tracks[3]))
+
+    pairs = {(a, b) for a, b, _ in index.pairs()}
+    assert pairs == {(7, "dup"), (3, "exact")}
+    hits = index.query(dup)
+    assert [k for k, _ in hits] == ["dup", 7]
+    assert index.best_match(encode_fingerprint(_track(rng))) is None
+
+
+def test_bulk_build_matches_incremental_and_builds_once(monkeypatch):
+    rng = np.random.default_rng(4)
+    tracks = [_track(rng, 200) for _ in range(30)]
+    items = [(i, encode_fingerprint(t)) for i, t in enumerate(tracks)] + [("dup", encode_fingerprint(_reencode(rng, tracks[5])))]
+    incremental = FingerprintIndex(rebuild_every=4)
+    for key, fp in items:
+        incremental.add(key, fp)
+
+    builds = []
+    orig = FingerprintIndex._build
+    monkeypatch.setattr(FingerprintIndex, "_build", lambda self: builds.append(len(self.keys)) or orig(self))
+    bulk = FingerprintIndex.from_items(items, rebuild_every=4)
+    assert builds == [len(items)]
+    assert [k for k, _ in bulk.query(items[-1][1])] == [k for k, _ in incremental.query(items[-1][1])] == ["dup", 5]
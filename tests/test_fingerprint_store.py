@@ -0,0 +1,140 @@
+from mutagen.id3 import ID3, TIT2
+
+import djlib.fingerprint as fingerprint
+import djlib.fingerprint_store as store
+
+
+def test_fingerprint_info_runs_fpcalc_once_per_content(tmp_path, monkeypatch):
+    monkeypatch.setattr(store, "store_path", lambda: tmp_path / "fingerprints.sqlite")
+    calls = []
+
+    def fake_fpcalc(path):
+        calls.append(path)
+        return 183, "AQAAfake"
+
+    monkeypatch.setattr(fingerprint, "_compute_fingerprint_info", fake_fpcalc)
+
+    p = tmp_path / "a.mp3"
+    p.write_bytes(b"\xff\xfb\x90\x00" * 4000)
+    assert fingerprint.fingerprint_info(p) == (183, "AQAAfake")
+    assert fingerprint.audio_fingerprint(p) == "AQAAfake"
+
+    # przepisanie tagów nie zmienia payloadu audio → nadal z magazynu
+    tags = ID3()
+    tags.add(TIT2(encoding=3, text="Retagged"))
+    tags.save(p)
+    assert fingerprint.fingerprint_info(p) == (183, "AQAAfake")
+    assert len(calls) == 1
+
+
+def test_failed_fingerprint_is_not_stored(tmp_path, monkeypatch):
+    monkeypatch.setattr(store, "store_path", lambda: tmp_path / "fingerprints.sqlite")
+    store.put_fingerprint("abc", 10, "")
+    assert store.get_fingerprint("abc") is None
+    store.put_fingerprint("abc", 10, "AQAA")
+    assert store.get_fingerprint("abc") == (10, "AQAA")
+
+
+_FAKE_FPCALC = """#!{python}
+import json, sys, time, pathlib
+args = [a for a in sys.argv[1:] if a != "-json"]
+with open({log!r}, "a") as log:
+    log.write(" ".join(pathlib.Path(a).name for a in args) + "\\n")
+for a in args:
+    name = pathlib.Path(a).name
+    if "hang" in name:
+        time.sleep(30)
+    if "bad" in name:
+        sys.stderr.write("ERROR: unable to decode " + a + "\\n")
+        continue
+    print(json.dumps({{"duration": 61.4, "fingerprint": "FP-" + name}}))
+"""
+
+
+def test_fingerprint_many_batches_and_isolates_bad_files(tmp_path, monkeypatch):
+    import sys
+
+    monkeypatch.setattr(store, "store_path", lambda: tmp_path / "fingerprints.sqlite")
+    log = tmp_path / "calls.log"
+    fake = tmp_path / "fpcalc"
+    fake.write_text(_FAKE_FPCALC.format(python=sys.executable, log=str(log)))
+    fake.chmod(0o755)
+    monkeypatch.setattr(fingerprint, "ensure_fpcalc_in_env", lambda: fake)
+    timeouts = []
+    real_run = fingerprint.subprocess.run
+
+    def run(cmd, **kw):
+        timeouts.append(kw.get("timeout"))
+        return real_run(cmd, **kw)
+
+    monkeypatch.setattr(fingerprint.subprocess, "run", run)
+
+    names = ["a.mp3", "b.mp3", "c.mp3", "bad.mp3", "hang.mp3", "d.mp3"]
+    for i, n in enumerate(names):
+        (tmp_path / n).write_bytes(bytes([i]) * 500)
+    paths = [tmp_path / n for n in names]
+
+    res = fingerprint.fingerprint_many(paths, workers=2, group_size=3, timeout=1)
+    assert res[str(paths[0])] == (61, "FP-a.mp3", "")
+    assert res[str(paths[2])][1] == "FP-c.mp3"
+    assert res[str(paths[5])][1] == "FP-d.mp3"
+    assert res[str(paths[3])][1] == "" and res[str(paths[3])][2]
+    assert res[str(paths[4])][1] == "" and "limit" in res[str(paths[4])][2]
+
+    calls = log.read_text().splitlines()
+    assert "a.mp3 b.mp3 c.mp3" in calls  # pierwsza grupa w jednym wywołaniu
+    # uszkodzony/zawieszony plik: grupa + jedna ponowna próba, każda z limitem pliku
+    assert calls.count("bad.mp3") == 1 and calls.count("hang.mp3") == 1
+    assert sum("bad.mp3" in c for c in calls) == 2 and sum("hang.mp3" in c for c in calls) == 2
+    assert set(timeouts) == {1}
+
+    # drugi przebieg: udane pliki z magazynu, fpcalc tylko dla nieudanych
+    log.write_text("")
+    fingerprint.fingerprint_many(paths[:3], workers=2, group_size=3, timeout=1)
+    assert log.read_text() == ""
+
+
+def test_scan_content_ids_match_payload_hash_and_skip_rereading(tmp_path, monkeypatch):
+    from djlib.hashing import audio_payload_sha256, file_sha256
+    from djlib.scan_pipeline import content_ids_file
+
+    monkeypatch.setattr(store, "store_path", lambda: tmp_path / "fingerprints.sqlite")
+    p = tmp_path / "a.mp3"
+    p.write_bytes(b"\xff\xfb\x90\x00" * 4000)
+    tags = ID3()
+    tags.add(TIT2(encoding=3, text="Tagged"))
+    tags.save(p)
+    path, sha, aid, err = content_ids_file(str(p))
+    assert (sha, aid, err) == (file_sha256(p), audio_payload_sha256(p), "")
+
+    store.put_fingerprint(aid, 183, "AQAAfake")
+
+    def no_read(_path):
+        raise AssertionError("payload hash recomputed")
+
+    monkeypatch.setattr(fingerprint, "audio_payload_sha256", no_read)
+    assert fingerprint.fingerprint_many([p], content_ids={path: aid}) == {path: (183, "AQAAfake", "")}
+
+
+def test_rows_keep_digest_and_resolve_from_blobs(tmp_path, monkeypatch):
+    monkeypatch.setattr(store, "store_path", lambda: tmp_path / "fingerprints.sqlite")
+    chroma = "AQADtEmUJEkSJYmSJZGiJEmSJJEkSRIkSZIk"
+    raw = ",".join(str(v) for v in range(0, 4000000000, 7919 * 1000))
+    rows = [
+        {"fingerprint": chroma},
+        {"fingerprint": raw},
+        {"fingerprint": "not base64 :)"},
+        {"fingerprint": ""},
+    ]
+    assert store.compact_rows(rows) == 3
+    assert all(r["fingerprint"].startswith("fp1:") for r in rows[:3])
+    assert len(rows[1]["fingerprint"]) < 30
+    assert store.compact_rows(rows) == 0  # idempotentne
+
+    resolved = store.resolve_fingerprints(r["fingerprint"] for r in rows)
+    assert resolved[rows[0]["fingerprint"]] == chroma
+    assert resolved[rows[1]["fingerprint"]] == raw
+    assert store.resolve_fingerprint(rows[2]["fingerprint"]) == "not base64 :)"
+    assert store.resolve_fingerprint(chroma) == chroma  # stary wiersz z pełnym stringiem
+    assert store.resolve_fingerprint("fp1:unknown") == ""
+    assert store.fingerprint_digest(chroma) == rows[0]["fingerprint"]
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from djlib.audio.aggregate import aggregate_matrix, aggregate_series, matrix_names
+
+stats = pytest.importorskip("scipy.stats")
+
+
+def test_matrix_matches_per_column_scipy():
+    rng = np.random.default_rng(1)
+    m = rng.normal(size=(500, 14)).astype(np.float32)
+    out = aggregate_matrix("mfcc", m, 13)
+    assert list(out) == matrix_names("mfcc", 13)
+    ref = m[:, :13].astype(np.float64)
+    assert np.allclose([out[f"mfcc_{i}"] for i in range(13)], ref.mean(axis=0))
+    assert np.allclose([out[f"mfcc_std_{i}"] for i in range(13)], ref.std(axis=0))
+    assert out["mfcc_kurtosis_mean"] == pytest.approx(np.mean([stats.kurtosis(ref[:, i]) for i in range(13)]))
+    assert out["mfcc_skew_mean"] == pytest.approx(np.mean([stats.skew(ref[:, i]) for i in range(13)]))
+
+
+def test_matrix_edge_cases():
+    assert aggregate_matrix("chroma", np.zeros((10, 5)), 12) == {}
+    one = aggregate_matrix("chroma", np.ones((1, 12)), 12, skew=False)
+    assert "chroma_kurtosis_mean" not in one and one["chroma_std_0"] == 0.0
+
+
+def test_series_segments():
+    out = aggregate_series({"a": [1.0, 2.0, 3.0], "empty": [], "b": np.array([[1.0, 5.0], [3.0, 7.0]])})
+    assert set(out) == {"a_mean", "a_std", "b_mean", "b_std"}
+    assert out["a_mean"] == pytest.approx(2.0) and out["a_std"] == pytest.approx(np.std([1, 2, 3]))
+    assert out["b_mean"] == pytest.approx(4.0) and out["b_std"] == pytest.approx(np.std([1, 5, 3, 7]))
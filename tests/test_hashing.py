@@ -0,0 +1,103 @@
+import struct
+import wave
+
+from mutagen.id3 import ID3, TIT2
+
+import djlib.hashing as hashing
+from djlib.hashing import audio_ids, audio_payload_sha256, file_sha256
+
+
+def _fake_mp3(path, payload=b"\xff\xfb\x90\x00" * 4000):
+    path.write_bytes(payload)
+    return path
+
+
+def test_audio_ids_single_pass_matches_file_sha(tmp_path, monkeypatch):
+    monkeypatch.setattr(hashing, "CHUNK_SIZE", 1000)  # zakresy przecinają granice bloków
+    p = _fake_mp3(tmp_path / "a.mp3")
+    full, payload = audio_ids(p)
+    assert full == file_sha256(p)
+    assert payload == full  # brak tagów → cały plik to audio
+
+
+def test_payload_hash_survives_id3_and_trailing_tags(tmp_path):
+    p = _fake_mp3(tmp_path / "a.mp3")
+    before_full, before_payload = audio_ids(p)
+
+    tags = ID3()
+    tags.add(TIT2(encoding=3, text="New title"))
+    tags.save(p)
+    with p.open("ab") as f:
+        f.write(b"TAG" + b"\x00" * 125)  # ID3v1
+
+    after_full, after_payload = audio_ids(p)
+    assert after_full != before_full
+    assert after_payload == before_payload
+
+
+def test_payload_hash_wav_ignores_extra_chunks(tmp_path):
+    p = tmp_path / "a.wav"
+    with wave.open(str(p), "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(8000)
+        w.writeframes(bytes(range(256)) * 20)
+    before = audio_payload_sha256(p)
+
+    data = bytearray(p.read_bytes())
+    info = b"INFOINAM" + struct.pack("<I", 5) + b"Title\x00"
+    data += b"LIST" + struct.pack("<I", len(info)) + info
+    data[4:8] = struct.pack("<I", len(data) - 8)
+    p.write_bytes(bytes(data))
+    assert audio_payload_sha256(p) == before
+
+
+def _atom(kind, body):
+    return struct.pack(">I", 8 + len(body)) + kind + body
+
+
+def test_payload_hash_mp4_only_mdat(tmp_path):
+    p = tmp_path / "a.m4a"
+    mdat = _atom(b"mdat", b"\x01\x02\x03" * 500)
+    p.write_bytes(_atom(b"ftyp", b"M4A \x00\x00\x00\x00") + _atom(b"moov", b"x" * 10) + mdat)
+    before = audio_payload_sha256(p)
+    p.write_bytes(_atom(b"ftyp", b"M4A \x00\x00\x00\x00") + _atom(b"moov", b"y" * 300) + mdat)
+    assert audio_payload_sha256(p) == before
+
+
+def test_sampled_sha256_reads_only_samples(tmp_path):
+    block = 1024
+    p = tmp_path / "big.mp3"
+    data = bytearray(b"\x00" * (block * 10))
+    p.write_bytes(bytes(data))
+    base = hashing.sampled_sha256(p, block=block)
+
+    data[block * 2] = 1  # poza próbkowanymi blokami
+    p.write_bytes(bytes(data))
+    assert hashing.sampled_sha256(p, block=block) == base
+
+    data[-1] = 1  # w bloku końcowym
+    p.write_bytes(bytes(data))
+    assert hashing.sampled_sha256(p, block=block) != base
+
+    (tmp_path / "longer.mp3").write_bytes(bytes(data) + b"\x00")
+    assert hashing.sampled_sha256(tmp_path / "longer.mp3", block=block) != base
+
+
+def test_file_sha256_mmap_and_fallback_match(tmp_path, monkeypatch):
+    import hashlib
+
+    p = tmp_path / "master.wav"
+    data = bytes(range(256)) * 5000
+    p.write_bytes(data)
+    expected = hashlib.sha256(data).hexdigest()
+
+    monkeypatch.setattr(hashing, "MMAP_MIN_SIZE", 1)
+    assert file_sha256(p, block=4096) == expected  # mmap
+    assert audio_ids(p)[0] == expected
+
+    def no_mmap(*a, **k):
+        raise OSError("mmap not supported")
+
+    monkeypatch.setattr(hashing.mmap, "mmap", no_mmap)
+    assert file_sha256(p, block=4096) == expected  # readinto fallback
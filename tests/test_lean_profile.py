@@ -0,0 +1,51 @@
+import numpy as np
+
+from djlib.audio.features import analysis_config, config_hash
+from djlib.audio.lean import extract_lean
+
+
+class _FakeEs:
+    """Minimalny zamiennik essentia.standard dla grup bez pętli po ramkach."""
+
+    def __init__(self):
+        self.loads = 0
+
+    def MonoLoader(self, filename, sampleRate):
+        def run():
+            self.loads += 1
+            return np.zeros(sampleRate, dtype=np.float32)
+        return run
+
+    def RhythmExtractor2013(self, method):
+        return lambda audio: (127.9, [], 0.0, [], [])
+
+    def OnsetRate(self):
+        return lambda audio: ([], 3.5)
+
+    def Danceability(self, sampleRate):
+        return lambda audio: (1.2, [])
+
+    def KeyExtractor(self, profileType, sampleRate):
+        assert profileType == "edma"
+        return lambda audio: ("A", "minor", 0.8)
+
+    def StereoMuxer(self):
+        return lambda left, right: np.stack([left, right], axis=1)
+
+    def LoudnessEBUR128(self, sampleRate):
+        return lambda stereo: ([], [], -7.5, 4.0)
+
+    def DynamicComplexity(self, sampleRate):
+        return lambda audio: (3.1, -9.0)
+
+
+def test_lean_profile_is_part_of_config_hash():
+    assert analysis_config((80, 180)) == {"target_bpm": [80, 180]}
+    assert config_hash(analysis_config((80, 180), "lean")) != config_hash(analysis_config((80, 180)))
+
+
+def test_extract_lean_decodes_once_and_only_requested_groups():
+    es = _FakeEs()
+    out = extract_lean("x.mp3", es, {"rhythm"})
+    assert es.loads == 1
+    assert out == {"bpm": 127.9, "onset_rate": 3.5, "danceability": 1.2, "beats": [], "beat_strength": None}
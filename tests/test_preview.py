@@ -0,0 +1,65 @@
+import argparse
+
+import numpy as np
+
+import djlib.audio.cache as cache
+import djlib.audio.lean as lean
+import djlib.cli as cli
+from djlib.audio import descriptors as d
+
+
+def test_preview_windows():
+    assert lean.preview_windows(0) == [(0.0, 0.0)]
+    assert lean.preview_windows(60) == [(0.0, 60)]
+    assert lean.preview_windows(400) == [(85.0, 30.0), (185.0, 30.0), (285.0, 30.0)]
+
+
+def test_extract_preview_without_ffmpeg_decodes_file_once(monkeypatch):
+    monkeypatch.setattr(lean.shutil, "which", lambda _name: None)
+    monkeypatch.setattr(lean, "_duration", lambda _p: 400.0)
+    loaded = []
+    lengths = []
+
+    class Es:
+        def MonoLoader(self, filename, sampleRate):
+            loaded.append(filename)
+            return lambda: np.zeros(400 * sampleRate, dtype=np.float32)
+
+        def RhythmExtractor2013(self, method):
+            bpms = iter([124.0, 126.0, 174.0])
+
+            def run(audio):
+                lengths.append(audio.size)
+                return next(bpms), [], 0, [], []
+            return run
+
+        def KeyExtractor(self, profileType, sampleRate):
+            return lambda audio: ("F", "minor", 0.7)
+
+    out = lean.extract_preview("x.mp3", Es())
+    assert loaded == ["x.mp3"] and lengths == [30 * lean.SAMPLE_RATE] * 3
+    assert out["bpm"] == 126.0 and out["key_raw"] == "F minor"
+
+
+def test_full_analysis_upgrades_preview_in_sheet(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "db_path", lambda: tmp_path / "audio_analysis.sqlite")
+    cache.upsert_analysis("aid", {"config_hash": "c", "bpm": 87.0, "key_camelot": "4A",
+                                  "extras": {d.PROVISIONAL_KEY: True}})
+    provisional = cache.get_analysis("aid")
+    assert d.is_provisional(provisional) and d.stale_groups(provisional, "c") == set(d.GROUPS)
+
+    rows = [{"file_hash": "aid", "bpm": "", "key_camelot": "", "energy_hint": ""}]
+    saved = []
+    monkeypatch.setattr(cli, "_load_unsorted", lambda: rows)
+    monkeypatch.setattr(cli, "_save_unsorted", lambda r: saved.append([dict(x) for x in r]))
+    args = argparse.Namespace(force=False, write_tags=False, skip_provisional=False)
+    cli.cmd_sync_audio_metrics(args)
+    assert rows[0]["bpm"] == "87" and rows[0]["key_camelot"] == "4A"
+
+    full = d.merge_fresh(provisional, {"config_hash": "c", "bpm": 128.0, "key_camelot": "8A", "energy": 0.5},
+                         d.GROUPS)
+    cache.upsert_analysis("aid", full)
+    assert not d.is_provisional(cache.get_analysis("aid"))
+    rows[0]["key_camelot"] = "5A"  # ręczna poprawka – zostaje
+    cli.cmd_sync_audio_metrics(args)
+    assert rows[0]["bpm"] == "128" and rows[0]["key_camelot"] == "5A" and rows[0]["energy_hint"] == "50"
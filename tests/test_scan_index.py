@@ -0,0 +1,40 @@
+import os
+
+from djlib.scan_index import ScanIndex
+
+
+def test_scan_index_hit_and_invalidation(tmp_path):
+    f = tmp_path / "INBOX" / "a.mp3"
+    f.parent.mkdir()
+    f.write_bytes(b"abc")
+    st = f.stat()
+
+    with ScanIndex(tmp_path / "idx.sqlite") as idx:
+        assert idx.lookup(f, st) is None
+        idx.record(f, st, "deadbeef", "FP", 181)
+
+    with ScanIndex(tmp_path / "idx.sqlite") as idx:
+        hit = idx.lookup(f, f.stat())
+        assert hit is not None
+        assert (hit.sha256, hit.fingerprint, hit.duration) == ("deadbeef", "FP", 181)
+
+        # zmiana mtime → brak trafienia
+        os.utime(f, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+        assert idx.lookup(f, f.stat()) is None
+
+
+def test_scan_index_prune_only_under_root(tmp_path):
+    inbox = tmp_path / "INBOX"
+    inbox.mkdir()
+    a = inbox / "a.mp3"
+    b = inbox / "b.mp3"
+    other = tmp_path / "other.mp3"
+    for p in (a, b, other):
+        p.write_bytes(b"x")
+    with ScanIndex(tmp_path / "idx.sqlite") as idx:
+        for p in (a, b, other):
+            idx.record(p, p.stat(), "h")
+        assert idx.prune(inbox, [str(a)]) == 1
+        assert idx.get(b) is None
+        assert idx.get(a) is not None
+        assert idx.get(other) is not None
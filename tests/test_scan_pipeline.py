@@ -0,0 +1,56 @@
+from pathlib import Path
+
+from djlib.fingerprint import file_sha256
+from djlib.scan_pipeline import hash_file, list_inbox, run_io_stage, run_stage
+
+
+def test_run_stage_keeps_input_order(tmp_path):
+    paths = []
+    for i in range(6):
+        p = tmp_path / f"t{i}.mp3"
+        p.write_bytes(bytes([i]) * (1000 + i))
+        paths.append(str(p))
+
+    items = [(p, True) for p in paths]
+    serial = list(run_stage(hash_file, items, workers=1))
+    parallel = list(run_stage(hash_file, items, workers=3))
+    assert serial == parallel
+    assert [r[0] for r in parallel] == paths
+    assert parallel[2][2] == file_sha256(Path(paths[2]))
+
+
+def test_run_io_stage_keeps_input_order():
+    out = list(run_io_stage(lambda x: x * 2, range(10), workers=4))
+    assert out == [x * 2 for x in range(10)]
+
+
+def test_list_inbox_sorted_and_filtered(tmp_path):
+    (tmp_path / "b").mkdir()
+    (tmp_path / "b" / "z.mp3").write_bytes(b"x")
+    (tmp_path / "a.FLAC").write_bytes(b"x")
+    (tmp_path / "notes.txt").write_text("x")
+    files = list_inbox(tmp_path, {".mp3", ".flac"})
+    assert files == sorted(files)
+    assert {p.name for p in files} == {"z.mp3", "a.FLAC"}
+
+
+def test_known_files_full_hash_only_on_quick_collision(tmp_path):
+    from djlib.hashing import file_sha256, sampled_sha256
+    from djlib.scan_pipeline import KnownFiles
+
+    lib = tmp_path / "lib.mp3"
+    lib.write_bytes(b"a" * 5000)
+    same = tmp_path / "same.mp3"
+    same.write_bytes(b"a" * 5000)
+    other = tmp_path / "other.mp3"
+    other.write_bytes(b"b" * 5000)
+
+    known = KnownFiles(set())
+    known.add(sampled_sha256(lib), "", str(lib))
+
+    assert known.check(sampled_sha256(other), "", str(other)) == (False, "")
+    assert known.full_hashed == 0
+
+    is_known, sha = known.check(sampled_sha256(same), "", str(same))
+    assert is_known and sha == file_sha256(same)
+    assert known.full_hashed == 2  # kandydat + leniwie plik biblioteki
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from djlib.audio import streaming
+from djlib.audio.aggregate import aggregate_matrix
+
+pytest.importorskip("scipy.signal")
+
+
+def test_running_moments_match_full_matrix():
+    rng = np.random.default_rng(3)
+    m = rng.gamma(2.0, size=(2000, 13))
+    rm = streaming.RunningMoments(13)
+    for i in range(0, len(m), 137):  # nierówne bloki
+        rm.update(m[i:i + 137])
+    full = aggregate_matrix("mfcc", m, 13)
+    got = rm.matrix_stats("mfcc")
+    assert set(got) == set(full)
+    assert all(got[k] == pytest.approx(full[k], rel=1e-9, abs=1e-12) for k in full)
+
+
+def test_streaming_loudness_is_block_size_independent():
+    sr = 48000
+    t = np.arange(sr * 8) / sr
+    x = 0.1 * np.sin(2 * np.pi * 997 * t)  # -20 dBFS w obu kanałach ≈ -20 LUFS
+    stereo = np.column_stack([x, x])
+    results = []
+    for chunk in (len(stereo), 4800, 7919):
+        meter = streaming.LoudnessR128(sr)
+        for i in range(0, len(stereo), chunk):
+            meter.update(stereo[i:i + chunk])
+        results.append(meter.integrated())
+    assert results[0] == pytest.approx(-20.0, abs=0.1)
+    assert results[1] == pytest.approx(results[0], abs=1e-9) and results[2] == pytest.approx(results[0], abs=1e-9)
+    # cisza poniżej bramki bezwzględnej nie zaniża wyniku (bez bramkowania byłoby ~-23 LUFS)
+    meter = streaming.LoudnessR128(sr)
+    meter.update(stereo)
+    meter.update(np.zeros((sr * 8, 2)))
+    assert meter.integrated() == pytest.approx(results[0], abs=0.2)
+
+
+def test_streaming_selected_above_threshold(monkeypatch):
+    monkeypatch.setattr(streaming, "_duration", lambda _p: 3600.0)
+    monkeypatch.setattr(streaming.shutil, "which", lambda _name: "/usr/bin/ffmpeg")
+    assert streaming.should_stream("mix.mp3", 1200)
+    assert not streaming.should_stream("mix.mp3", 0)
+    monkeypatch.setenv(streaming.STREAM_MIN_SECONDS_ENV, "7200")
+    assert not streaming.should_stream("mix.mp3")
+
+
+def test_streaming_requires_ffmpeg(monkeypatch):
+    monkeypatch.setattr(streaming, "_duration", lambda _p: 3600.0)
+    monkeypatch.setattr(streaming.shutil, "which", lambda _name: None)
+    assert not streaming.should_stream("mix.mp3", 1200)  # bez ffmpeg: zwykła ścieżka, nie dekodowanie zakresami
+    with pytest.raises(RuntimeError, match="ffmpeg"):
+        next(streaming.decode_blocks("mix.mp3"))
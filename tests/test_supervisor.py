@@ -0,0 +1,55 @@
+import multiprocessing
+import os
+import signal
+from pathlib import Path
+
+import pytest
+
+import djlib.audio.cache as cache
+from djlib.audio import essentia_backend as backend
+from djlib.audio import supervisor
+
+pytestmark = pytest.mark.skipif(
+    os.name != "posix" or multiprocessing.get_start_method() != "fork",
+    reason="monkeypatche dziedziczą tylko procesy z fork",
+)
+
+
+def _fake_analyze(p, **_kwargs):
+    name = Path(p).stem
+    if name.startswith("crash"):
+        os.kill(os.getpid(), signal.SIGSEGV)
+    if name.startswith("oom"):
+        _ = bytearray(1024 * 1024 * 1024)  # > RLIMIT_AS → MemoryError
+    fh, aid = cache.compute_audio_ids(p)
+    return fh, aid, {"algo_version": 2, "config_hash": "x", "bpm": 120.0, "source": "fake"}, False
+
+
+def test_crashes_are_isolated_and_quarantined(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "db_path", lambda: tmp_path / "audio_analysis.sqlite")
+    monkeypatch.setattr(supervisor, "LOGS_DIR", tmp_path)
+    monkeypatch.setattr(backend, "_try_import_essentia", lambda: (None, None))
+    monkeypatch.setattr(backend, "_find_extractor_binary", lambda: None)
+    monkeypatch.setattr(backend, "_analyze_file", _fake_analyze)
+    files = []
+    for name in ("a", "crash1", "b", "oom", "c", "d"):
+        f = tmp_path / f"{name}.mp3"
+        f.write_bytes(b"\xff\xfb" * (100 + len(files)))
+        files.append(f)
+
+    stats = backend.analyze_many(files, workers=2, isolate=True, mem_limit_mb=512, max_crashes=2)
+    assert stats["processed"] == 6 and stats["analyzed"] == 4
+    assert stats["errors"] == 2 and stats["crashed"] == 1
+    assert len(cache.get_analyses(cache.compute_audio_ids(f)[1] for f in files)) == 4
+
+    crash = str(files[1])
+    again = backend.analyze_many([files[1], files[0]], workers=1, isolate=True, max_crashes=2)
+    assert again["crashed"] == 1 and again["quarantined"] == 1 and again["restarts"] == 1
+    assert again["cached"] + again["analyzed"] == 1
+    assert supervisor.Quarantine(max_crashes=2).quarantined() == [crash]
+
+    skipped = backend.analyze_many([files[1], files[0]], workers=1, isolate=True, max_crashes=2)
+    assert skipped["skipped"] == 1 and skipped["processed"] == 1 and skipped["crashed"] == 0
+
+    os.utime(crash, (1, 1))  # zmieniony plik wychodzi z kwarantanny
+    assert not supervisor.Quarantine(max_crashes=2).is_quarantined(crash)
@@ -0,0 +1,112 @@
+from djlib.watch import InboxWatcher
+
+
+def _watcher(tmp_path, batches):
+    return InboxWatcher(
+        tmp_path, {".mp3"}, batches.append,
+        settle=2.0, batch_interval=5.0, poll_interval=1.0, use_events=False, clock=lambda: 0.0,
+    )
+
+
+def test_waits_for_stable_size_and_batches(tmp_path):
+    batches = []
+    w = _watcher(tmp_path, batches)
+    a = tmp_path / "a.mp3"
+    a.write_bytes(b"x" * 10)
+    (tmp_path / "notes.txt").write_text("ignored")
+
+    assert w.step(now=10.0) == []  # zgłoszony, pierwszy stat
+    with a.open("ab") as f:
+        f.write(b"y" * 10)  # nadal się kopiuje
+    assert w.step(now=11.5) == []
+    assert w.step(now=13.0) == []  # stabilny dopiero 1.5 s
+    first = w.step(now=14.0)  # stabilny 2.5 s → gotowy
+    assert [p.name for p in first] == ["a.mp3"]
+
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "b.mp3").write_bytes(b"z")
+    (tmp_path / "sub" / "c.mp3").write_bytes(b"z")
+    w.step(now=15.0)
+    assert w.step(now=17.5) == []  # gotowe, ale partia najwyżej co 5 s
+    second = w.step(now=20.0)
+    assert [p.name for p in second] == ["b.mp3", "c.mp3"]
+    assert batches == [first, second]
+
+    # bez zmian → nic nowego
+    assert w.step(now=30.0) == []
+    assert w.step(now=40.0) == []
+
+
+def test_seeded_files_are_not_reingested(tmp_path):
+    batches = []
+    old = tmp_path / "old.mp3"
+    old.write_bytes(b"o" * 5)
+    w = _watcher(tmp_path, batches)
+    w.seed([old])
+    for t in range(0, 20, 2):
+        w.step(now=float(t))
+    assert batches == []
+
+    old.unlink()  # usunięty w trakcie kopiowania/przed zgłoszeniem
+    new = tmp_path / "new.mp3"
+    new.write_bytes(b"n")
+    w.notify(str(new))
+    new.unlink()
+    w.step(now=30.0)
+    w.stop()
+    assert batches == []
+
+
+def test_start_is_idempotent(tmp_path, monkeypatch):
+    import threading
+
+    import djlib.watch as watch
+
+    observers = []
+
+    class _FakeObserver:
+        def __init__(self):
+            self.stopped = False
+            observers.append(self)
+
+        def schedule(self, handler, path, recursive):
+            pass
+
+        def start(self):
+            pass
+
+        def stop(self):
+            self.stopped = True
+
+        def join(self, timeout=None):
+            pass
+
+    monkeypatch.setattr(watch, "Observer", _FakeObserver)
+    w = InboxWatcher(tmp_path, {".mp3"}, lambda batch: None, use_events=True)
+    assert w.start() == "events"
+    stop = threading.Event()
+    stop.set()
+    w.run(stop=stop)  # cmd_watch: start() i potem run()
+    assert len(observers) == 1 and observers[0].stopped
+
+
+def test_failed_batch_is_retried_and_watcher_keeps_running(tmp_path):
+    batches = []
+
+    def flaky(batch):
+        if not batches:
+            batches.append(None)
+            raise PermissionError("unsorted.xlsx is locked")
+        batches.append(batch)
+
+    w = _watcher(tmp_path, batches)
+    w.on_batch = flaky
+    (tmp_path / "a.mp3").write_bytes(b"x")
+    w.step(now=10.0)
+    assert w.step(now=13.0) == []  # callback rzucił – partia wraca do kolejki
+    (tmp_path / "b.mp3").write_bytes(b"y")
+    w.step(now=14.0)
+    w.step(now=17.0)
+    assert [p.name for p in w.step(now=18.5)] == ["a.mp3", "b.mp3"]
+    assert [p.name for p in batches[1]] == ["a.mp3", "b.mp3"]
+    w.stop()  # nic nie zostało, stop nie rzuca
@@ -0,0 +1,91 @@
+import os
+import shlex
+import sys
+from pathlib import Path
+
+import pytest
+
+import djlib.audio.cache as cache
+from djlib.audio import essentia_backend as backend
+from djlib.audio import extractor_cli, worker_client
+
+pytestmark = pytest.mark.skipif(os.name != "posix", reason="fake extractor is a shell script")
+
+WORKER = Path(__file__).resolve().parents[1] / "docker" / "analysis_worker.py"
+
+FAKE = """#!{python}
+import json, os, sys, time
+src, out = sys.argv[1], sys.argv[2]
+with open({pids!r}, "a") as f:
+    f.write("%d\\n" % os.getppid())
+if "hang" in src:
+    time.sleep(60)
+json.dump({{"rhythm": {{"bpm": 128.0}}, "tonal": {{"key_key": "C", "key_scale": "major"}}}}, open(out, "w"))
+"""
+
+
+@pytest.fixture
+def local_worker(tmp_path, monkeypatch):
+    pids = tmp_path / "pids.txt"
+    fake = tmp_path / "fake_extractor"
+    fake.write_text(FAKE.format(python=sys.executable, pids=str(pids)))
+    fake.chmod(0o755)
+    cmd = f"{shlex.quote(sys.executable)} {shlex.quote(str(WORKER))} --extractor {shlex.quote(str(fake))}"
+    monkeypatch.setenv(worker_client.WORKER_CMD_ENV, cmd + f" --scratch {shlex.quote(str(tmp_path))}")
+    monkeypatch.setattr(cache, "db_path", lambda: tmp_path / "audio_analysis.sqlite")
+    monkeypatch.setattr(extractor_cli, "LOGS_DIR", tmp_path / "logs")
+    monkeypatch.setattr(backend, "_try_import_essentia", lambda: (None, None))
+    monkeypatch.setattr(backend, "_find_extractor_binary", lambda: None)
+    monkeypatch.setattr(backend.shutil, "which", lambda _name: None)
+    worker_client.close_worker()
+    yield pids
+    worker_client.close_worker()
+
+
+def test_persistent_worker_serves_all_files(tmp_path, local_worker):
+    files = []
+    for i in range(4):
+        f = tmp_path / f"t{i}.mp3"
+        f.write_bytes(b"\xff\xfb" * (100 + i))
+        files.append(f)
+    hang = tmp_path / "hang.mp3"
+    hang.write_bytes(b"\xff\xfb" * 50)
+
+    stats = backend.analyze_many(files + [hang], workers=2, cli_timeout=1)
+    assert stats["analyzed"] == 4 and stats["errors"] == 1
+    # jeden proces workera obsłużył wszystkie pliki
+    assert len(set(local_worker.read_text().split())) == 1
+    got = cache.get_analysis(cache.compute_audio_ids(files[0])[1])
+    assert got["bpm"] == 128.0 and got["key_camelot"] and got["source"] == "essentia-cli"
+    assert not list(tmp_path.glob("job-*"))
+
+
+def test_worker_restarts_after_exit(tmp_path, local_worker):
+    f = tmp_path / "a.mp3"
+    f.write_bytes(b"\xff\xfb" * 100)
+    w = worker_client.get_worker()
+    assert w.run(f, timeout=20)["ok"]
+    w._session.proc.kill()
+    w._session.proc.wait()
+    assert w.run(f, timeout=20)["ok"]
+
+
+def test_worker_that_cannot_start_falls_back_to_per_file_runs(tmp_path, local_worker, monkeypatch):
+    starts = tmp_path / "starts.txt"
+    exits = f"open({str(starts)!r}, 'a').write('x')"
+    monkeypatch.setenv(worker_client.WORKER_CMD_ENV, f"{shlex.quote(sys.executable)} -c {shlex.quote(exits)}")
+    fake = tmp_path / "fake_extractor"
+    monkeypatch.setattr(backend, "_find_extractor_binary", lambda: str(fake))
+    files = []
+    for i in range(3):
+        f = tmp_path / f"t{i}.mp3"
+        f.write_bytes(b"\xff\xfb" * (100 + i))
+        files.append(f)
+
+    stats = backend.analyze_many(files, workers=2, cli_timeout=20)
+    assert stats["analyzed"] == 3 and stats["errors"] == 0
+    assert starts.read_text() == "x"  # jedna próba startu, potem tylko uruchomienia per plik
+    assert len(local_worker.read_text().split()) == 3
+    assert worker_client.get_worker() is None
+    got = cache.get_analysis(cache.compute_audio_ids(files[0])[1])
+    assert got["bpm"] == 128.0 and got["source"] == "essentia-cli"